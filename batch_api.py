@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import llm_service
+import metrics
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+BATCHES_FILE = "batches.json"
+
+# Requests a collector waits for before submitting, and the largest batch it sends
+DEFAULT_GATHER_SECONDS = 2.0
+MAX_BATCH_REQUESTS = 50000
+DEFAULT_POLL_INTERVAL = 30.0
+
+# Upper bound on generate_batch's max_in_flight in bulk mode: every waiting call holds
+# a thread, and all of them are gathered into the same batch.
+BULK_MAX_IN_FLIGHT = 2000
+
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# --------------------------------------------------------------------------
+# Batch Files
+# --------------------------------------------------------------------------
+def request_id(body):
+    """
+    Deterministic custom_id for a request body, so a restarted run writes the same file.
+    """
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def write_batch_file(path, bodies):
+    """
+    Writes {custom_id: chat completion body} as a Batch API input file.
+    Returns the SHA-256 of the file, which identifies the batch on resume.
+    """
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}) + "\n"
+        for custom_id, body in sorted(bodies.items())
+    ]
+    content = "".join(lines).encode("utf-8")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def parse_result_line(line):
+    """
+    (custom_id, content) for one line of a batch output or error file; content is the
+    completion text, or an "Error: ..." string like llm_service returns.
+    """
+    record = json.loads(line)
+    custom_id = record.get("custom_id")
+    response = record.get("response") or {}
+    body = response.get("body") or {}
+
+    if record.get("error"):
+        return custom_id, f"Error: {record['error'].get('message', record['error'])}"
+    if response.get("status_code") != 200:
+        message = (body.get("error") or {}).get("message", f"HTTP {response.get('status_code')}")
+        return custom_id, f"Error: {message}"
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return custom_id, "Error: Batch result has no completion."
+    llm_service.record_usage(body.get("usage"))
+    return custom_id, content
+
+
+# --------------------------------------------------------------------------
+# Submit / Poll / Collect
+# --------------------------------------------------------------------------
+def submit_batch(client, path, description=""):
+    """
+    Uploads an input file and creates a batch for it. Returns the batch id.
+    """
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=COMPLETION_WINDOW,
+        metadata={"description": description} if description else None
+    )
+    metrics.increment("batch_api.batches")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_interval=DEFAULT_POLL_INTERVAL, log=None):
+    """
+    Polls a batch until it reaches a finished status. Returns the final batch object.
+    """
+    last_status = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status != last_status and log:
+            counts = batch.request_counts
+            done = f" ({counts.completed}/{counts.total} done)" if counts else ""
+            log(f"Batch {batch_id}: {batch.status}{done}")
+        last_status = batch.status
+        if batch.status in FINISHED_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client, batch):
+    """
+    {custom_id: content} from a finished batch's output and error files. An expired
+    or cancelled batch still returns the requests it completed.
+    """
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if line.strip():
+                custom_id, content = parse_result_line(line)
+                results.setdefault(custom_id, content)
+    return results
+
+
+# --------------------------------------------------------------------------
+# Bulk Mode Collector
+# --------------------------------------------------------------------------
+class _PendingCall:
+    def __init__(self, body):
+        self.body = body
+        self.done = threading.Event()
+        self.content = None
+
+
+class BatchCollector:
+    """
+    LLM callable (same signature as llm_service.call_llm) that answers through the
+    OpenAI Batch API instead of chat completions, for overnight bulk generation.
+
+    Calls block. Requests arriving together (every chunk's Stage 1, then every Stage 2,
+    ...) are gathered until none has arrived for gather_seconds, written to one JSONL
+    input file under workdir, submitted, polled, and each caller gets its own result
+    back by custom_id. Pass it as llm= to pipeline.generate_batch with a large
+    max_in_flight, so checkpointing, repairs, validation and assembly all work as usual.
+
+    Submitted batches are recorded in workdir/batches.json by input-file hash: a
+    restarted run that writes the same file re-attaches to the batch already in flight
+    instead of paying for it twice.
+    """
+
+    def __init__(self, client, workdir, model=llm_service.DEFAULT_MODEL, gather_seconds=DEFAULT_GATHER_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, log=None):
+        self.client = client
+        self.workdir = workdir
+        self.model = model
+        self.gather_seconds = gather_seconds
+        self.poll_interval = poll_interval
+        self.log = log or (lambda line: None)
+        self._pending = []
+        self._last_arrival = 0.0
+        self._dispatcher = None
+        self._condition = threading.Condition()
+        self._batches = self._load_batches()
+        self._sent = set()
+
+    def __call__(self, messages, api_key=None, model=None, max_tokens=4096, on_delta=None, stage=None, **kwargs):
+        model = model or self.model
+        router = llm_service.get_router()
+        if router is not None:
+            model = router.models_for(stage, model)[0]
+
+        call = _PendingCall(llm_service.build_request(messages, model, max_tokens))
+        with self._condition:
+            self._pending.append(call)
+            self._last_arrival = time.monotonic()
+            if self._dispatcher is None or not self._dispatcher.is_alive():
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self._condition.notify_all()
+
+        call.done.wait()
+        if on_delta and call.content and not call.content.startswith("Error:"):
+            on_delta(call.content)
+        return call.content
+
+    # ----------------------------------------------------------------------
+    # Dispatching
+    # ----------------------------------------------------------------------
+    def _take_batch(self):
+        """
+        Waits for a quiet period, then takes up to MAX_BATCH_REQUESTS pending calls.
+        """
+        with self._condition:
+            while self._pending and len(self._pending) < MAX_BATCH_REQUESTS:
+                quiet = time.monotonic() - self._last_arrival
+                if quiet >= self.gather_seconds:
+                    break
+                self._condition.wait(self.gather_seconds - quiet)
+            calls = self._pending[:MAX_BATCH_REQUESTS]
+            del self._pending[:MAX_BATCH_REQUESTS]
+            if not calls:
+                self._dispatcher = None
+            return calls
+
+    def _dispatch(self):
+        while True:
+            calls = self._take_batch()
+            if not calls:
+                return
+            try:
+                results = self._run_batch({request_id(call.body): call.body for call in calls})
+            except Exception as e:
+                results = {}
+                self.log(f"Batch submission failed: {e}")
+                error = f"Error: Batch API: {e}"
+            else:
+                error = "Error: Batch finished without a result for this request."
+            for call in calls:
+                call.content = results.get(request_id(call.body), error)
+                call.done.set()
+
+    def _run_batch(self, bodies):
+        number = len(self._batches) + 1
+        path = os.path.join(self.workdir, f"batch_input_{number:03d}.jsonl")
+        digest = write_batch_file(path, bodies)
+
+        # Only batches from an earlier process are re-attached; the same requests sent
+        # again in this one (e.g. regenerating duplicates) need fresh samples.
+        batch_id = self._batches.get(digest) if digest not in self._sent else None
+        self._sent.add(digest)
+        if batch_id:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in ("failed", "expired", "cancelled"):
+                batch_id = None
+            else:
+                self.log(f"Re-attaching to batch {batch_id} ({len(bodies)} requests)")
+        if not batch_id:
+            batch_id = submit_batch(self.client, path, f"{os.path.basename(self.workdir)} #{number}")
+            self._batches[digest] = batch_id
+            self._save_batches()
+            self.log(f"Submitted batch {batch_id}: {len(bodies)} requests from {path}")
+
+        batch = wait_for_batch(self.client, batch_id, self.poll_interval, self.log)
+        results = read_batch_results(self.client, batch)
+        metrics.increment("batch_api.requests", len(bodies))
+        metrics.increment("batch_api.failed_requests",
+                          sum(1 for c in results.values() if c.startswith("Error:")) + len(set(bodies) - set(results)))
+        if batch.status != "completed":
+            self.log(f"Batch {batch_id} ended {batch.status}; {len(results)} of {len(bodies)} results returned")
+        return results
+
+    def _load_batches(self):
+        path = os.path.join(self.workdir, BATCHES_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_batches(self):
+        os.makedirs(self.workdir, exist_ok=True)
+        path = os.path.join(self.workdir, BATCHES_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._batches, f, indent=2)
+        os.replace(tmp_path, path)
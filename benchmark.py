@@ -0,0 +1,300 @@
+"""
+Offline benchmark for the concurrent job executor and the staged Sequential Batch pipeline.
+
+Runs each strategy against mock_llm.FakeLLM, first serially and then concurrently,
+and prints wall-clock time per run. With --prompts it instead times prompt building
+alone, per 1,000 jobs, for every prompt builder.
+
+With --suite it runs all three strategies at each of --sizes jobs and reports
+items/sec, p50/p95 latency of every stage's LLM calls and peak traced memory, so
+regressions show up as numbers (--output saves them as JSON for comparison). With
+--server the calls go through llm_service's real client, retry and streaming code
+to a local mock_llm.MockOpenAIServer instead of the in-process FakeLLM.
+
+Usage:
+    python benchmark.py --jobs 50 --latency 0.5 --max-in-flight 8 --chunk-size 10
+    python benchmark.py --prompts --jobs 1000
+    python benchmark.py --suite --sizes 1,10,50,100,500 --latency 0.05 --output bench.json
+    python benchmark.py --suite --server --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import numpy as np
+import example_bank
+import llm_service
+import test_planner
+import job_runner
+import mock_llm
+import pipeline
+import prompt_engineer
+
+STRATEGIES = ("Holistic (1-Call)", "Segmented (2-Call)", "Sequential Batch (3-Call)")
+DEFAULT_SIZES = (1, 10, 50, 100, 500)
+
+
+def _job_list(total_jobs, strategy):
+    return test_planner.create_job_list(
+        total_questions=total_jobs,
+        q_type="Grammar",
+        cefr_target="A2",
+        selected_focus_list=["Past Simple (regular/irregular)", "Present Continuous"],
+        context_topic="",
+        generation_strategy=strategy
+    )
+
+
+def bench_executor(strategy, total_jobs, latency, jitter, max_in_flight, example_banks):
+    job_list = _job_list(total_jobs, strategy)
+    fake = mock_llm.FakeLLM(latency=latency, jitter=jitter, seed=0)
+    job_fn = job_runner.get_job_fn(strategy, example_banks, "offline", llm=fake)
+
+    start = time.perf_counter()
+    results = job_runner.run_jobs_concurrently(job_list, job_fn, max_in_flight=max_in_flight)
+    elapsed = time.perf_counter() - start
+
+    failures = sum(1 for _, error in results if error)
+    return elapsed, fake.calls, failures
+
+
+def bench_sequential(total_jobs, latency, jitter, max_in_flight, chunk_size, example_banks):
+    job_list = _job_list(total_jobs, "Sequential Batch (3-Call)")
+    fake = mock_llm.FakeLLM(latency=latency, jitter=jitter, seed=0)
+
+    start = time.perf_counter()
+    result = job_runner.run_sequential_batch(
+        job_list, example_banks, "offline", llm=fake, max_in_flight=max_in_flight, chunk_size=chunk_size
+    )
+    elapsed = time.perf_counter() - start
+
+    failures = total_jobs - len(result["questions"])
+    return elapsed, fake.calls, failures
+
+
+def _stage_outputs(job):
+    stage1 = {
+        "Item Number": job["job_id"], "Assessment Focus": job["focus"],
+        "Complete Sentence": "She has lived here since 2010.", "Correct Answer": "has lived",
+        "Context Clue Location": "since 2010", "CEFR rating": job["cefr"], "Category": job["type"]
+    }
+    stage2 = {"Item Number": job["job_id"], "Distractor A": "lived", "Distractor B": "is living", "Distractor C": "lives"}
+    return stage1, stage2
+
+
+def bench_prompts(total_jobs, chunk_size, example_banks, repeats=3):
+    """
+    Seconds per 1,000 jobs spent building each kind of prompt: on the first pass with
+    empty context and example caches, and the best of the repeats after it.
+    """
+    job_list = test_planner.create_job_list(
+        total_questions=total_jobs,
+        q_type="Grammar",
+        cefr_target="A2",
+        selected_focus_list=["Past Simple (regular/irregular)", "Present Continuous", "Past Simple vs Present Perfect"],
+        context_topic="",
+        generation_strategy="Holistic (1-Call)"
+    )
+    outputs = [_stage_outputs(job) for job in job_list]
+    chunks = [(job_list[i:i + chunk_size], outputs[i:i + chunk_size]) for i in range(0, len(job_list), chunk_size)]
+    index = example_bank.get_index(example_banks)
+
+    builders = {
+        "holistic": lambda: [prompt_engineer.create_holistic_prompt(job, example_banks) for job in job_list],
+        "options": lambda: [prompt_engineer.create_options_prompt(job, example_banks) for job in job_list],
+        "stem": lambda: [prompt_engineer.create_stem_prompt(job, '{"Answer A": "..."}') for job in job_list],
+        "sequential stage 1": lambda: [prompt_engineer.create_sequential_stage1_prompt(job, example_banks)
+                                       for job in job_list],
+        "sequential stage 2": lambda: [prompt_engineer.create_sequential_stage2_prompt(job, s1)
+                                       for job, (s1, _) in zip(job_list, outputs)],
+        "sequential stage 3": lambda: [prompt_engineer.create_sequential_stage3_prompt(job, s1, s2)
+                                       for job, (s1, s2) in zip(job_list, outputs)],
+        "batch stage 1": lambda: [prompt_engineer.create_sequential_batch_stage1_prompt(jobs, example_banks)
+                                  for jobs, _ in chunks],
+        "batch stage 2": lambda: [prompt_engineer.create_sequential_batch_stage2_grammar_prompt(
+                                      jobs, [s1 for s1, _ in out]) for jobs, out in chunks],
+        "batch stage 3": lambda: [prompt_engineer.create_sequential_batch_stage3_prompt(
+                                      jobs, [s1 for s1, _ in out], [s2 for _, s2 in out]) for jobs, out in chunks]
+    }
+
+    timings = {}
+    for name, build in builders.items():
+        prompt_engineer._parse_context.cache_clear()
+        index.clear_cache()
+        runs = []
+        for _ in range(1 + repeats):
+            start = time.perf_counter()
+            build()
+            runs.append((time.perf_counter() - start) * 1000 / total_jobs)
+        timings[name] = (runs[0], min(runs[1:]))
+    return timings
+
+
+# --------------------------------------------------------------------------
+# Suite: items/sec, Stage Latency and Peak Memory
+# --------------------------------------------------------------------------
+class StageTimer:
+    """
+    Wraps an LLM callable and records each call's duration under its stage name.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, api_key, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.llm(messages, api_key, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.durations.setdefault(kwargs.get("stage") or "llm", []).append(elapsed)
+
+    def summary(self):
+        """
+        {stage: {"calls", "p50", "p95"}}, latencies in seconds.
+        """
+        with self._lock:
+            durations = {stage: list(values) for stage, values in self.durations.items()}
+        return {
+            stage: {"calls": len(values), "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95))}
+            for stage, values in durations.items()
+        }
+
+
+def run_strategy(strategy, job_list, example_banks, llm, max_in_flight, chunk_size=None):
+    """
+    Runs one strategy over the jobs and returns the number of questions it produced.
+    """
+    if strategy == "Sequential Batch (3-Call)":
+        result = job_runner.run_sequential_batch(
+            job_list, example_banks, "offline", llm=llm, max_in_flight=max_in_flight, chunk_size=chunk_size
+        )
+        return len(result["questions"])
+    job_fn = job_runner.get_job_fn(strategy, example_banks, "offline", llm=llm)
+    results = job_runner.run_jobs_concurrently(job_list, job_fn, max_in_flight=max_in_flight)
+    return sum(1 for _, error in results if not error)
+
+
+def bench_suite(sizes, make_llm, example_banks, max_in_flight, chunk_size=None, strategies=STRATEGIES):
+    """
+    Runs every strategy at every batch size with a fresh LLM from make_llm().
+    Returns one result dict per run. Peak memory is what tracemalloc saw allocated at
+    once during the run, in bytes; tracing slows Python code, so CPU-bound numbers
+    are pessimistic but comparable between runs.
+    """
+    # Untimed warm-up, so one-off costs (example index, HTTP clients) stay out of the numbers
+    run_strategy(strategies[0], _job_list(1, strategies[0]), example_banks, make_llm(), max_in_flight, chunk_size)
+
+    rows = []
+    for strategy in strategies:
+        for size in sizes:
+            job_list = _job_list(size, strategy)
+            timer = StageTimer(make_llm())
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                items = run_strategy(strategy, job_list, example_banks, timer, max_in_flight, chunk_size)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            rows.append({
+                "strategy": strategy,
+                "jobs": size,
+                "items": items,
+                "seconds": elapsed,
+                "items_per_sec": items / elapsed if elapsed else 0.0,
+                "peak_bytes": peak,
+                "stages": timer.summary()
+            })
+    return rows
+
+
+def format_suite_row(row):
+    stages = "  ".join(
+        f"{stage} p50={s['p50'] * 1000:.0f}ms p95={s['p95'] * 1000:.0f}ms" for stage, s in row["stages"].items()
+    )
+    return (
+        f"{row['strategy']:<26} jobs={row['jobs']:<4} items={row['items']:<4} wall={row['seconds']:7.2f}s "
+        f"items/sec={row['items_per_sec']:8.2f} peak={row['peak_bytes'] / 2 ** 20:6.1f}MiB  {stages}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent job executor offline.")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--max-in-flight", type=int, default=job_runner.DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--chunk-size", type=int, default=None, help="Sequential Batch chunk size (default: planned)")
+    parser.add_argument("--prompts", action="store_true", help="Only time prompt building, per 1,000 jobs")
+    parser.add_argument("--suite", action="store_true", help="All strategies at every --sizes batch size")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated job counts")
+    parser.add_argument("--server", action="store_true", help="Suite calls go over HTTP to a local mock server")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of simulated LLM calls that fail")
+    parser.add_argument("--output", help="Write the suite results to this JSON file")
+    args = parser.parse_args()
+
+    example_banks = pipeline.load_example_banks()
+
+    if args.prompts:
+        timings = bench_prompts(args.jobs, args.chunk_size or 10, example_banks)
+        for name, (first, best) in timings.items():
+            print(f"{name:<20} jobs={args.jobs:<5} first={first * 1000:8.2f}ms  warm={best * 1000:8.2f}ms  per 1,000 jobs")
+        return
+
+    if args.suite:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+        server = None
+        if args.server:
+            server = mock_llm.MockOpenAIServer(
+                latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=0
+            ).start()
+            os.environ["OPENAI_BASE_URL"] = server.url
+            make_llm = lambda: functools.partial(llm_service.call_llm, use_cache=False)
+        else:
+            make_llm = lambda: mock_llm.FakeLLM(args.latency, args.jitter, seed=0, error_rate=args.error_rate)
+        try:
+            rows = bench_suite(sizes, make_llm, example_banks, args.max_in_flight, args.chunk_size)
+        finally:
+            if server:
+                server.stop()
+        for row in rows:
+            print(format_suite_row(row))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return
+
+    for strategy in ("Holistic (1-Call)", "Segmented (2-Call)"):
+        for label, limit in (("serial", 1), ("concurrent", args.max_in_flight)):
+            elapsed, calls, failures = bench_executor(
+                strategy, args.jobs, args.latency, args.jitter, limit, example_banks
+            )
+            print(
+                f"{strategy:<20} {label:<11} max_in_flight={limit:<3} "
+                f"jobs={args.jobs:<4} calls={calls:<4} failures={failures:<3} "
+                f"wall={elapsed:7.2f}s  items/sec={args.jobs / elapsed:7.2f}"
+            )
+
+    for label, limit in (("serial", 1), ("pipelined", args.max_in_flight)):
+        elapsed, calls, failures = bench_sequential(
+            args.jobs, args.latency, args.jitter, limit, args.chunk_size, example_banks
+        )
+        print(
+            f"{'Sequential Batch':<20} {label:<11} max_in_flight={limit:<3} "
+            f"jobs={args.jobs:<4} calls={calls:<4} failures={failures:<3} "
+            f"wall={elapsed:7.2f}s  items/sec={args.jobs / elapsed:7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+import time
+
+DEFAULT_RUNS_DIR = "runs"
+MANIFEST_FILE = "manifest.json"
+RESULTS_FILE = "results.jsonl"
+
+
+def new_run_dir(base_dir=DEFAULT_RUNS_DIR, label="run"):
+    """
+    Returns a fresh, timestamped run directory path under base_dir (not yet created).
+    """
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(base_dir, f"{label}_{stamp}")
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(base_dir, f"{label}_{stamp}_{suffix}")
+    return path
+
+
+def list_runs(base_dir=DEFAULT_RUNS_DIR):
+    """
+    Returns the manifests of every run under base_dir, newest first.
+    """
+    if not os.path.isdir(base_dir):
+        return []
+
+    runs = []
+    for name in os.listdir(base_dir):
+        manifest_path = os.path.join(base_dir, name, MANIFEST_FILE)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            manifest["run_dir"] = os.path.join(base_dir, name)
+            runs.append(manifest)
+    runs.sort(key=lambda m: m.get("created_at", 0), reverse=True)
+    return runs
+
+
+class RunStore:
+    """
+    Checkpoint store for one batch run.
+
+    The run directory holds:
+        manifest.json   the job list, strategy, settings and run status
+        results.jsonl   one line per finished unit of work (a stage of a chunk, or a
+                        call for a single job), with the raw response or the error
+
+    A unit is only skipped on resume if its latest record is "ok", so failed and
+    missing stages are re-issued and paid-for responses are never requested twice.
+    """
+
+    def __init__(self, run_dir, manifest, records):
+        self.run_dir = run_dir
+        self.manifest = manifest
+        self._records = records
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, run_dir, job_list, strategy, settings=None):
+        os.makedirs(run_dir, exist_ok=True)
+        manifest = {
+            "strategy": strategy,
+            "job_list": job_list,
+            "settings": settings or {},
+            "status": "running",
+            "created_at": time.time(),
+            "updated_at": time.time()
+        }
+        store = cls(run_dir, manifest, {})
+        store._write_manifest()
+        return store
+
+    @classmethod
+    def open(cls, run_dir):
+        with open(os.path.join(run_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        records = {}
+        results_path = os.path.join(run_dir, RESULTS_FILE)
+        if os.path.exists(results_path):
+            with open(results_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; that unit simply runs again
+                        continue
+                    records[record["unit"]] = record
+        return cls(run_dir, manifest, records)
+
+    def completed(self, unit):
+        """
+        Returns the saved raw response for a unit that finished successfully, else None.
+        """
+        record = self._records.get(unit)
+        if record and record["status"] == "ok":
+            return record["raw"]
+        return None
+
+    def record(self, unit, raw, error=None):
+        entry = {
+            "unit": unit,
+            "status": "failed" if error else "ok",
+            "raw": raw,
+            "error": error,
+            "time": time.time()
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(os.path.join(self.run_dir, RESULTS_FILE), "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._records[unit] = entry
+
+    def records(self):
+        """
+        The latest record of every unit, in the order the units first finished.
+        """
+        with self._lock:
+            return list(self._records.values())
+
+    def summary(self):
+        ok = sum(1 for r in self._records.values() if r["status"] == "ok")
+        return {"completed_units": ok, "failed_units": len(self._records) - ok}
+
+    def finish(self, question_count, error_count):
+        self.manifest["status"] = "complete" if error_count == 0 else "incomplete"
+        self.manifest["questions"] = question_count
+        self.manifest["errors"] = error_count
+        self._write_manifest()
+
+    def _write_manifest(self):
+        self.manifest["updated_at"] = time.time()
+        path = os.path.join(self.run_dir, MANIFEST_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
@@ -0,0 +1,228 @@
+import collections
+import os
+import shutil
+import threading
+import time
+import uuid
+
+DEFAULT_PAYLOAD_DIR = os.path.join(".llm_cache", "debug_payloads")
+
+# Entries a log keeps; the oldest are dropped first, together with their payload files
+DEFAULT_MAX_ENTRIES = 2000
+
+# Messages longer than this are kept on disk, with only their first line in memory
+INLINE_LIMIT = 500
+
+# Bytes of a payload shown per page
+PAYLOAD_PAGE_BYTES = 16 * 1024
+
+# Payload directories of logs untouched for this long (ended sessions) are deleted
+PAYLOAD_TTL_SECONDS = 24 * 3600
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# Level given to a plain log(line) call by the words in it, checked in order
+LEVEL_KEYWORDS = (
+    ("ERROR", ("ERROR", "FAILED", "EXCEPTION", "Traceback")),
+    ("WARNING", ("missing", "repair attempt", "gave up", "near-duplicate", "Near-duplicates"))
+)
+
+
+def guess_level(message):
+    """
+    >>> guess_level("Job J3 FAILED: timeout")
+    'ERROR'
+    >>> guess_level("Stage 2 repair attempt 1: bad JSON")
+    'WARNING'
+    >>> guess_level("Stage 1 raw response: 812 chars")
+    'INFO'
+    """
+    for level, keywords in LEVEL_KEYWORDS:
+        if any(keyword in message for keyword in keywords):
+            return level
+    return "INFO"
+
+
+def _char_boundary(data, offset):
+    """
+    First offset at or after offset that does not split a UTF-8 character.
+    """
+    while offset < len(data) and (data[offset] & 0xC0) == 0x80:
+        offset += 1
+    return offset
+
+
+class DebugLog:
+    """
+    Bounded debug log for one session or run: a ring buffer of the newest max_entries
+    entries, each {"time", "level", "message", "payload"}.
+
+    Large text (raw LLM responses, stage data, tracebacks) is written to its own file
+    under payload_dir and kept by reference ({"label", "path", "bytes", "pages"}), so
+    memory holds only short lines; read_payload() loads one page of it on demand.
+
+    The log is callable like the log(line) functions the pipeline takes.
+    Thread-safe.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, min_level="DEBUG", payload_dir=DEFAULT_PAYLOAD_DIR):
+        self.max_entries = max_entries
+        self.min_level = min_level
+        self.dropped = 0
+        self._entries = collections.deque()
+        self._lock = threading.Lock()
+        self._payload_dir = os.path.join(payload_dir, uuid.uuid4().hex) if payload_dir else None
+        if payload_dir:
+            prune_payload_dirs(payload_dir)
+
+    def __call__(self, message, level=None, payload=None, label=None):
+        self.log(message, level, payload, label)
+
+    def log(self, message, level=None, payload=None, label=None):
+        """
+        Adds an entry at level (guessed from the message when None); entries below
+        min_level are ignored. payload is stored on disk; a message over INLINE_LIMIT
+        characters is stored the same way, with its first line kept as the message.
+        """
+        message = str(message)
+        level = level or guess_level(message)
+        if LEVELS.index(level) < LEVELS.index(self.min_level):
+            return
+
+        if payload is None and len(message) > INLINE_LIMIT:
+            payload = message
+            message = message.strip().split("\n", 1)[0][:INLINE_LIMIT]
+        entry = {
+            "time": time.time(),
+            "level": level,
+            "message": message,
+            "payload": self._store_payload(label or message, payload) if payload is not None else None
+        }
+
+        with self._lock:
+            self._entries.append(entry)
+            while len(self._entries) > self.max_entries:
+                self._discard(self._entries.popleft())
+                self.dropped += 1
+
+    def debug(self, message, **kwargs):
+        self.log(message, "DEBUG", **kwargs)
+
+    def info(self, message, **kwargs):
+        self.log(message, "INFO", **kwargs)
+
+    def warning(self, message, **kwargs):
+        self.log(message, "WARNING", **kwargs)
+
+    def error(self, message, **kwargs):
+        self.log(message, "ERROR", **kwargs)
+
+    def attach(self, label, text, level="DEBUG"):
+        """
+        Logs a one-line note for a large piece of text and keeps the text on disk.
+        """
+        text = str(text)
+        self.log(f"{label}: {len(text)} chars", level, payload=text, label=label)
+
+    # ----------------------------------------------------------------------
+    # Reading
+    # ----------------------------------------------------------------------
+    def count(self, min_level="DEBUG"):
+        return len(self.entries(min_level))
+
+    def entries(self, min_level="DEBUG", offset=0, limit=None):
+        """
+        Entries at or above min_level, oldest first, from offset for up to limit entries.
+        """
+        threshold = LEVELS.index(min_level)
+        with self._lock:
+            entries = [e for e in self._entries if LEVELS.index(e["level"]) >= threshold]
+        return entries[offset:offset + limit if limit is not None else None]
+
+    def payloads(self, min_level="DEBUG"):
+        return [e["payload"] for e in self.entries(min_level) if e["payload"]]
+
+    def to_text(self, min_level="DEBUG"):
+        """
+        The entries as plain text lines, payloads by reference.
+        """
+        lines = []
+        for e in self.entries(min_level):
+            stamp = time.strftime("%H:%M:%S", time.localtime(e["time"]))
+            line = f"{stamp} {e['level']:<7} {e['message']}"
+            if e["payload"]:
+                line += f" [payload: {e['payload']['path']}, {e['payload']['bytes']} bytes]"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+            self.dropped = 0
+        for entry in entries:
+            self._discard(entry)
+
+    # ----------------------------------------------------------------------
+    # Payload Files
+    # ----------------------------------------------------------------------
+    def _store_payload(self, label, text):
+        data = str(text).encode("utf-8")
+        reference = {"label": label, "path": None, "bytes": len(data), "pages": max(1, -(-len(data) // PAYLOAD_PAGE_BYTES))}
+        if self._payload_dir is None:
+            # Nowhere to spill to: keep it in memory, the log is still bounded by entry count
+            reference["text"] = data.decode("utf-8")
+            return reference
+
+        os.makedirs(self._payload_dir, exist_ok=True)
+        path = os.path.join(self._payload_dir, f"{uuid.uuid4().hex}.txt")
+        with open(path, "wb") as f:
+            f.write(data)
+        reference["path"] = path
+        return reference
+
+    def _discard(self, entry):
+        payload = entry["payload"]
+        if payload and payload["path"]:
+            try:
+                os.remove(payload["path"])
+            except OSError:
+                pass
+
+
+def read_payload(reference, page=0, page_bytes=PAYLOAD_PAGE_BYTES):
+    """
+    One page (0-based) of a payload as text, read from disk without loading the rest.
+    Page boundaries never split a character. Returns "" past the end, or if the file
+    is gone.
+    """
+    offset = page * page_bytes
+    # A few extra bytes finish the page's last character; its leading partial one
+    # was finished by the page before
+    if reference.get("text") is not None:
+        data = reference["text"].encode("utf-8")[offset:offset + page_bytes + 4]
+    else:
+        try:
+            with open(reference["path"], "rb") as f:
+                f.seek(offset)
+                data = f.read(page_bytes + 4)
+        except OSError:
+            return ""
+    start = _char_boundary(data, 0) if page else 0
+    return data[start:_char_boundary(data, page_bytes)].decode("utf-8", errors="replace")
+
+
+def prune_payload_dirs(payload_dir=DEFAULT_PAYLOAD_DIR, max_age=PAYLOAD_TTL_SECONDS):
+    """
+    Deletes the payload directories of logs not written to for max_age seconds.
+    """
+    if not os.path.isdir(payload_dir):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(payload_dir):
+        path = os.path.join(payload_dir, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
@@ -0,0 +1,194 @@
+import os
+import re
+import zlib
+import numpy as np
+import item_store
+
+DEFAULT_INDEX_PATH = os.path.join(".llm_cache", "dedup_signatures.npz")
+
+# Estimated Jaccard similarity of word 1-2 gram shingles at which two items count as
+# duplicates; changing one word in a twelve-word sentence leaves them at about 0.77.
+DEFAULT_THRESHOLD = 0.6
+NUM_PERM = 64
+BANDS = 16
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20240611)
+_A = _rng.randint(1, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)[:, None]
+_B = _rng.randint(0, 2 ** 31 - 1, NUM_PERM).astype(np.uint64)[:, None]
+
+BLANK_PATTERN = re.compile(r"_{2,}")
+
+
+def item_text(item):
+    """
+    The sentence an item tests, with its correct answer in place: a Stage 1 item's
+    "Complete Sentence", or a question's "Question Prompt" with the blank filled by
+    the text of the lettered correct answer.
+    """
+    if item.get("Complete Sentence"):
+        text = item["Complete Sentence"]
+    else:
+        answer = str(item.get("Correct Answer", "")).strip()
+        answer = item.get(f"Answer {answer}", answer) if len(answer) == 1 else answer
+        text = BLANK_PATTERN.sub(str(answer), str(item.get("Question Prompt", "")))
+    return " ".join(re.sub(r"[^\w\s']", " ", str(text).lower()).split())
+
+
+def signature(text):
+    """
+    MinHash signature (NUM_PERM values) of the text's word unigrams and bigrams.
+    """
+    words = text.split() or [""]
+    shingles = set(words)
+    shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A * hashes + _B) % _MERSENNE).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of item sentences. Each signature is cut into BANDS bands; items
+    sharing any whole band are candidates, and candidates whose estimated similarity
+    reaches the threshold are duplicates. A lookup touches only the matching buckets,
+    so it stays under a millisecond however many items are indexed.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.keys = []
+        self._positions = {}
+        self._matrix = np.zeros((1024, NUM_PERM), dtype=np.uint64)
+        self._rows = NUM_PERM // BANDS
+        self._buckets = [{} for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def _bands(self, sig):
+        return [sig[b * self._rows:(b + 1) * self._rows].tobytes() for b in range(BANDS)]
+
+    def add(self, key, sig):
+        if key in self._positions:
+            return
+        position = len(self.keys)
+        if position == len(self._matrix):
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[position] = sig
+        self._positions[key] = position
+        self.keys.append(key)
+        for bucket, band in zip(self._buckets, self._bands(sig)):
+            bucket.setdefault(band, []).append(position)
+
+    def query(self, sig):
+        """
+        Returns [(key, similarity)] for indexed items at or above the threshold, best first.
+        Candidates from the LSH buckets are scored together in one vectorised comparison.
+        """
+        candidates = set()
+        for bucket, band in zip(self._buckets, self._bands(sig)):
+            candidates.update(bucket.get(band, ()))
+        if not candidates:
+            return []
+
+        positions = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        scores = (self._matrix[positions] == sig).mean(axis=1)
+        keep = np.flatnonzero(scores >= self.threshold)
+        order = keep[np.argsort(-scores[keep], kind="stable")]
+        return [(self.keys[positions[i]], float(scores[i])) for i in order]
+
+    # ----------------------------------------------------------------------
+    # Item Bank
+    # ----------------------------------------------------------------------
+    def update_from_store(self, store, path=DEFAULT_INDEX_PATH, **filters):
+        """
+        Adds the items of an item_store.ItemStore not yet indexed, under their content
+        hashes. Signatures are cached at path, so each stored item is hashed only once.
+        Returns the number of items added.
+        """
+        new_keys = {key for key in store.hashes(**filters) if key not in self._positions}
+        if not new_keys:
+            return 0
+
+        cached = _load_signatures(path) if path else {}
+        missing = set()
+        for key in new_keys:
+            if key in cached:
+                self.add(key, cached[key])
+            else:
+                missing.add(key)
+
+        if missing:
+            for item in store.iter_items(**filters):
+                key = item_store.content_hash(item)
+                if key in missing:
+                    cached[key] = signature(item_text(item))
+                    self.add(key, cached[key])
+            if path:
+                _save_signatures(path, cached)
+        return len(new_keys)
+
+
+_bank_indexes = {}
+
+
+def get_bank_index(store, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns the process-wide index of an item bank, brought up to date with any
+    items stored since the last call.
+    """
+    key = (store.path, threshold)
+    index = _bank_indexes.get(key)
+    if index is None:
+        index = _bank_indexes[key] = NearDuplicateIndex(threshold)
+    index.update_from_store(store)
+    return index
+
+
+def _load_signatures(path):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            return dict(zip(data["keys"].tolist(), data["signatures"]))
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def _save_signatures(path, signatures):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    keys = list(signatures)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, keys=np.array(keys), signatures=np.array([signatures[k] for k in keys], dtype=np.uint64))
+    os.replace(tmp_path, path)
+
+
+def find_duplicates(items, bank_index=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Flags near-duplicates in a batch, in order: an item is a duplicate if it matches
+    an earlier item of the batch or anything in bank_index.
+    Returns {item position: (what it duplicates, similarity)}, where "what" is
+    ("batch", earlier Item Number) or ("bank", content hash).
+    """
+    batch_index = NearDuplicateIndex(threshold)
+    duplicates = {}
+
+    for position, item in enumerate(items):
+        sig = signature(item_text(item))
+
+        matches = batch_index.query(sig)
+        if matches:
+            duplicates[position] = (("batch", matches[0][0]), matches[0][1])
+        elif bank_index is not None:
+            matches = bank_index.query(sig)
+            if matches:
+                duplicates[position] = (("bank", matches[0][0]), matches[0][1])
+
+        if position not in duplicates:
+            batch_index.add(str(item.get("Item Number", position)), sig)
+    return duplicates
@@ -0,0 +1,175 @@
+import json
+import random
+import threading
+import pandas as pd
+import example_retrieval
+
+# Fields copied into each few-shot example, in prompt order
+EXAMPLE_FIELDS = ("Question Prompt", "Answer A", "Answer B", "Answer C", "Answer D", "Correct Answer")
+
+# Bank keys as loaded by pipeline.load_example_banks -> question type
+BANK_TYPES = {"grammar": "grammar", "vocab": "vocabulary", "vocabulary": "vocabulary"}
+
+DEFAULT_SEED = 0
+EXAMPLES_PER_PROMPT = 2
+
+# Distinct (type, CEFR, focus, topic) lookups remembered per index before it starts over
+NEAREST_CACHE_SIZE = 4096
+
+
+def normalise_column(name):
+    """
+    Canonical column name: the CSVs use "CEFR_rating" / "Question_Prompt" (sometimes
+    with a BOM or stray spaces) while the prompts use "CEFR rating" / "Question Prompt".
+    """
+    return " ".join(str(name).replace("\ufeff", "").replace("_", " ").split())
+
+
+def _clean(value):
+    return "" if pd.isna(value) else str(value).strip()
+
+
+def format_example(example):
+    return "### EXAMPLE:\n" + json.dumps(example) + "\n\n"
+
+
+class ExampleIndex:
+    """
+    Read-only index over the few-shot example banks, built once per load.
+
+    Every row is serialised to its prompt snippet up front. Examples are chosen by
+    TF-IDF similarity to the job's focus and topic (example_retrieval); when too few
+    rows share any terms with the job, the rest are a seeded draw from the rows
+    grouped by (type, CEFR, focus), (type, CEFR) or (type,).
+    """
+
+    def __init__(self, records, index_path=example_retrieval.DEFAULT_INDEX_PATH):
+        self.records = tuple(records)
+        self.retriever = example_retrieval.load_or_build(self.records, index_path)
+        self.snippets = tuple(format_example({f: r.get(f, "N/A") for f in EXAMPLE_FIELDS}) for r in self.records)
+
+        groups = {}
+        for position, record in enumerate(self.records):
+            q_type, cefr, focus = record["type"], record["CEFR rating"], record["Assessment Focus"].lower()
+            for key in ((q_type, cefr, focus), (q_type, cefr), (q_type,)):
+                groups.setdefault(key, []).append(position)
+        self.groups = {key: tuple(positions) for key, positions in groups.items()}
+        self._nearest = {}
+        self._nearest_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Pickled with the banks (st.cache_data): the lock cannot be, and the memo need not be
+        state = dict(self.__dict__)
+        del state["_nearest"], state["_nearest_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._nearest = {}
+        self._nearest_lock = threading.Lock()
+
+    @classmethod
+    def from_banks(cls, example_banks, index_path=example_retrieval.DEFAULT_INDEX_PATH):
+        """
+        Builds the index from {"grammar": DataFrame, "vocab": DataFrame}.
+        """
+        records = []
+        for bank_key, bank in example_banks.items():
+            q_type = BANK_TYPES.get(bank_key)
+            if q_type is None or not isinstance(bank, pd.DataFrame):
+                continue
+            bank = bank.rename(columns=normalise_column)
+            for row in bank.to_dict("records"):
+                record = {column: _clean(value) for column, value in row.items()}
+                record["type"] = q_type
+                record.setdefault("CEFR rating", "")
+                record.setdefault("Assessment Focus", "")
+                records.append(record)
+        return cls(records, index_path)
+
+    def candidates(self, job):
+        """
+        Positions of the rows best matching the job: same focus and CEFR, else same
+        CEFR, else the whole bank for the question type.
+        """
+        q_type = str(job["type"]).strip().lower()
+        cefr = str(job["cefr"]).strip()
+        focus = str(job.get("focus", "")).strip().lower()
+        for key in ((q_type, cefr, focus), (q_type, cefr), (q_type,)):
+            positions = self.groups.get(key, ())
+            if len(positions) >= EXAMPLES_PER_PROMPT:
+                return positions
+        return ()
+
+    def _fill(self, chosen, job, k, seed):
+        """
+        Tops chosen up to k positions with a draw seeded by (seed, job_id).
+        """
+        rest = [p for p in self.candidates(job) if p not in chosen]
+        if len(chosen) < k and rest:
+            rng = random.Random(f"{seed}:{job.get('job_id', '')}")
+            chosen = chosen + rng.sample(rest, min(k - len(chosen), len(rest)))
+        return "".join(self.snippets[p] for p in chosen)
+
+    def nearest(self, job, k=EXAMPLES_PER_PROMPT):
+        """
+        The retriever's k nearest positions for the job, memoised by everything they
+        depend on: jobs of a batch share a handful of focus/topic pairs, so most prompts
+        skip the TF-IDF lookup. Safe to call from the executor's worker threads.
+        """
+        key = (str(job["type"]).strip().lower(), str(job["cefr"]).strip(),
+               job.get("focus", ""), job.get("context", ""), k)
+        with self._nearest_lock:
+            positions = self._nearest.get(key)
+        if positions is None:
+            # Looked up outside the lock; two threads missing the same key both compute it
+            positions = tuple(self.retriever.nearest([job], k)[0])
+            with self._nearest_lock:
+                if len(self._nearest) >= NEAREST_CACHE_SIZE:
+                    self._nearest.clear()
+                self._nearest[key] = positions
+        return list(positions)
+
+    def clear_cache(self):
+        """
+        Forgets the memoised nearest-example lookups.
+        """
+        with self._nearest_lock:
+            self._nearest.clear()
+
+    def examples_for(self, job, k=EXAMPLES_PER_PROMPT, seed=DEFAULT_SEED):
+        """
+        Returns k example snippets for the job as one prompt string ("" if the bank is too small):
+        the nearest examples to its focus and topic, topped up with a seeded draw.
+        """
+        return self._fill(self.nearest(job, k), job, k, seed)
+
+    def examples_for_batch(self, jobs, k=EXAMPLES_PER_PROMPT, seed=DEFAULT_SEED):
+        """
+        Returns k example snippets closest to a batch of jobs as a whole.
+        """
+        if not jobs:
+            return ""
+        return self._fill(self.retriever.nearest_for_batch(jobs, k), jobs[0], k, seed)
+
+
+_built = {}
+
+
+def get_index(example_banks):
+    """
+    Returns the index for a banks dict: the one pipeline.load_example_banks stored
+    under "index", else one built on first use and reused for the same dict.
+    """
+    index = example_banks.get("index")
+    if isinstance(index, ExampleIndex):
+        return index
+
+    key = id(example_banks)
+    entry = _built.get(key)
+    if entry is None or entry[0] is not example_banks:
+        if len(_built) > 8:
+            _built.clear()
+        entry = (example_banks, ExampleIndex.from_banks(example_banks))
+        _built[key] = entry
+    return entry[1]
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.path.join(".llm_cache", "example_vectors.npz")
+
+# A same-level example beats a slightly closer one from another CEFR level
+CEFR_BONUS = 0.2
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it its of on or the to with".split()
+)
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    return [t.strip("'") for t in TOKEN_PATTERN.findall(str(text).lower()) if t.strip("'") not in STOPWORDS]
+
+
+def document_text(record):
+    return f"{record.get('Assessment Focus', '')} {record.get('Question Prompt', '')}"
+
+
+def _row_hash(record):
+    return hashlib.sha1(f"{record['type']}|{document_text(record)}".encode("utf-8")).hexdigest()
+
+
+class TfidfRetriever:
+    """
+    TF-IDF vectors over each example's Assessment Focus and Question Prompt, held as
+    one L2-normalised NumPy matrix so a whole batch of jobs is scored with a single
+    matrix product.
+
+    Raw term counts are persisted per row (keyed by a hash of the row's text), so when
+    the CSVs change only new or edited rows are tokenised again; IDF weights are then
+    recomputed over the full matrix.
+    """
+
+    def __init__(self, records, vocabulary, counts, row_hashes):
+        self.records = records
+        self.vocabulary = vocabulary
+        self.counts = counts
+        self.row_hashes = row_hashes
+        self._terms = {term: i for i, term in enumerate(vocabulary)}
+        self.types = np.array([r["type"] for r in records])
+        self.levels = np.array([r["CEFR rating"] for r in records])
+
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = np.log((1 + len(records)) / (1 + document_frequency)) + 1
+        self.matrix = self._normalise(np.log1p(counts) * self.idf)
+
+    @staticmethod
+    def _normalise(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def build(cls, records, previous=None):
+        """
+        Builds the index, reusing the term counts of rows `previous` already holds.
+        """
+        reusable = {}
+        vocabulary = []
+        if previous is not None:
+            vocabulary = list(previous.vocabulary)
+            reusable = {h: previous.counts[i] for i, h in enumerate(previous.row_hashes)}
+        terms = {term: i for i, term in enumerate(vocabulary)}
+
+        row_hashes = [_row_hash(r) for r in records]
+        new_rows = {}
+        for position, (record, row_hash) in enumerate(zip(records, row_hashes)):
+            if row_hash in reusable:
+                continue
+            row = {}
+            for token in tokenize(document_text(record)):
+                if token not in terms:
+                    terms[token] = len(vocabulary)
+                    vocabulary.append(token)
+                row[terms[token]] = row.get(terms[token], 0) + 1
+            new_rows[position] = row
+
+        counts = np.zeros((len(records), len(vocabulary)), dtype=np.float32)
+        for position, row_hash in enumerate(row_hashes):
+            if position in new_rows:
+                for column, count in new_rows[position].items():
+                    counts[position, column] = count
+            else:
+                old = reusable[row_hash]
+                counts[position, :len(old)] = old
+        return cls(records, vocabulary, counts, row_hashes)
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            counts=self.counts,
+            vocabulary=np.array(json.dumps(self.vocabulary)),
+            row_hashes=np.array(json.dumps(self.row_hashes))
+        )
+        os.replace(tmp_path, path)
+
+    def query_matrix(self, texts):
+        counts = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                column = self._terms.get(token)
+                if column is not None:
+                    counts[row, column] += 1
+        return self._normalise(np.log1p(counts) * self.idf)
+
+    def _scores(self, jobs):
+        queries = self.query_matrix([f"{job.get('focus', '')} {job.get('context', '')}" for job in jobs])
+        similarity = queries @ self.matrix.T
+
+        job_types = np.array([str(job["type"]).strip().lower() for job in jobs])[:, None]
+        job_levels = np.array([str(job["cefr"]).strip() for job in jobs])[:, None]
+        scores = similarity + CEFR_BONUS * (self.levels[None, :] == job_levels)
+        scores = np.where(self.types[None, :] == job_types, scores, -np.inf)
+        return scores, similarity
+
+    def scores(self, jobs):
+        """
+        (len(jobs), len(records)) similarity of each job's focus and topic to every
+        example. Examples of another question type score -inf; same-CEFR ones get CEFR_BONUS.
+        """
+        return self._scores(jobs)[0]
+
+    def nearest(self, jobs, k=2):
+        """
+        Positions of up to k best examples for each job, best first. Only examples that
+        share at least one term with the job are returned.
+        """
+        if not jobs or not self.records:
+            return [[] for _ in jobs]
+        scores, similarity = self._scores(jobs)
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return [
+            [int(p) for p in row if np.isfinite(scores[i, p]) and similarity[i, p] > 0]
+            for i, row in enumerate(top)
+        ]
+
+    def nearest_for_batch(self, jobs, k=2):
+        """
+        Positions of up to k examples closest to the batch as a whole (summed job scores).
+        """
+        if not jobs or not self.records:
+            return []
+        scores, similarity = self._scores(jobs)
+        scores, similarity = scores.sum(axis=0), similarity.sum(axis=0)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [int(p) for p in top if np.isfinite(scores[p]) and similarity[p] > 0]
+
+
+class _SavedCounts:
+    """
+    What save() wrote: enough to rebuild without re-tokenising unchanged rows.
+    """
+
+    def __init__(self, vocabulary, counts, row_hashes):
+        self.vocabulary = vocabulary
+        self.counts = counts
+        self.row_hashes = row_hashes
+
+
+def _load_saved(path):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return _SavedCounts(
+                json.loads(str(data["vocabulary"])),
+                data["counts"],
+                json.loads(str(data["row_hashes"]))
+            )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_or_build(records, path=DEFAULT_INDEX_PATH):
+    """
+    Returns a retriever for records, reusing the term counts saved at path and
+    saving again whenever the bank rows have changed.
+    """
+    saved = _load_saved(path)
+    retriever = TfidfRetriever.build(records, saved)
+    if path and (saved is None or saved.row_hashes != retriever.row_hashes):
+        try:
+            retriever.save(path)
+        except OSError:
+            pass
+    return retriever
@@ -0,0 +1,280 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_STORE_PATH = os.path.join("item_bank", "items.sqlite3")
+
+# Question fields stored in their own columns; anything else rides along in the payload
+QUESTION_FIELDS = (
+    "Item Number", "Assessment Focus", "Question Prompt",
+    "Answer A", "Answer B", "Answer C", "Answer D", "Correct Answer",
+    "CEFR rating", "Category"
+)
+COLUMNS = (
+    "item_number", "focus", "question_prompt",
+    "answer_a", "answer_b", "answer_c", "answer_d", "correct_answer",
+    "cefr", "category"
+)
+FILTERS = ("type", "cefr", "focus", "topic", "source", "status", "run_id")
+FETCH_SIZE = 1000
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def content_hash(question):
+    """
+    Identity of an item's content: the prompt and its answer set, ignoring case,
+    spacing and option order. Re-ingesting the same item is a no-op.
+    """
+    prompt = " ".join(str(question.get("Question Prompt", "")).lower().split())
+    answers = sorted(" ".join(str(question.get(f"Answer {l}", "")).lower().split()) for l in "ABCD")
+    return hashlib.sha256(json.dumps([prompt, answers]).encode("utf-8")).hexdigest()
+
+
+class ItemStore:
+    """
+    Embedded SQLite item bank for accepted questions from the generator and the
+    Refinement Workshop.
+
+    Each item keeps its question fields plus where it came from (type, CEFR, focus,
+    topic, source, run); the filter columns are indexed, so filtered queries and
+    exports stay fast with hundreds of thousands of rows. Items are unique by
+    content_hash().
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                content_hash TEXT NOT NULL UNIQUE,
+                item_number TEXT,
+                type TEXT NOT NULL,
+                cefr TEXT,
+                focus TEXT,
+                topic TEXT,
+                question_prompt TEXT,
+                answer_a TEXT,
+                answer_b TEXT,
+                answer_c TEXT,
+                answer_d TEXT,
+                correct_answer TEXT,
+                category TEXT,
+                source TEXT NOT NULL,
+                status TEXT,
+                strategy TEXT,
+                run_id TEXT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_type_cefr_focus ON items(type, cefr, focus)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_type_cefr_topic ON items(type, cefr, topic)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_source_created ON items(source, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_run ON items(run_id)")
+
+    # ----------------------------------------------------------------------
+    # Writes
+    # ----------------------------------------------------------------------
+    def ingest(self, questions, source, jobs=None, strategy=None, run_id=None, statuses=None, update_existing=False):
+        """
+        Adds questions to the bank in one transaction, skipping ones already stored
+        (or, with update_existing, taking over their source, status and payload).
+        jobs supplies type/CEFR/focus/topic by Item Number where the question lacks them;
+        statuses maps Item Number -> validation outcome.
+        Returns (stored, skipped).
+        """
+        jobs_by_id = {job["job_id"]: job for job in jobs or []}
+        statuses = statuses or {}
+        now = time.time()
+
+        rows = []
+        for question in questions:
+            item_number = str(question.get("Item Number", ""))
+            job = jobs_by_id.get(item_number, {})
+            q_type = question.get("Category") or job.get("type") or ""
+            values = [question.get(field, "") for field in QUESTION_FIELDS]
+            values[COLUMNS.index("focus")] = values[COLUMNS.index("focus")] or job.get("focus", "")
+            values[COLUMNS.index("cefr")] = values[COLUMNS.index("cefr")] or job.get("cefr", "")
+            rows.append(
+                [content_hash(question)]
+                + ["" if v is None else str(v) for v in values]
+                + [
+                    str(q_type).strip().lower(),
+                    job.get("context", question.get("Topic", "")),
+                    source,
+                    statuses.get(item_number, question.get("Status", "")),
+                    strategy,
+                    run_id,
+                    json.dumps(question, ensure_ascii=False, default=str),
+                    now
+                ]
+            )
+
+        columns = ("content_hash",) + COLUMNS + ("type", "topic", "source", "status", "strategy", "run_id",
+                                                  "payload", "created_at")
+        sql = f"INSERT INTO items ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        if update_existing:
+            sql += (" ON CONFLICT(content_hash) DO UPDATE SET source = excluded.source, "
+                    "status = excluded.status, payload = excluded.payload")
+        else:
+            sql += " ON CONFLICT(content_hash) DO NOTHING"
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany(sql, rows)
+            self._conn.execute("COMMIT")
+            inserted = self._conn.total_changes - before
+        return inserted, len(rows) - inserted
+
+    def delete(self, **filters):
+        where, params = self._where(filters)
+        with self._lock:
+            return self._conn.execute(f"DELETE FROM items{where}", params).rowcount
+
+    # ----------------------------------------------------------------------
+    # Reads
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _where(filters):
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown item filters: {sorted(unknown)}")
+
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                if name == "type":
+                    value = [str(v).strip().lower() for v in value]
+                clauses.append(f"{name} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                if name == "type":
+                    value = str(value).strip().lower()
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _to_question(row):
+        question = json.loads(row["payload"])
+        for field, column in zip(QUESTION_FIELDS, COLUMNS):
+            question[field] = row[column]
+        return question
+
+    def count(self, **filters):
+        where, params = self._where(filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM items{where}", params).fetchone()[0]
+
+    def query(self, limit=100, offset=0, newest_first=True, **filters):
+        """
+        Returns matching items as question dicts (the stored payload with its current fields).
+        """
+        where, params = self._where(filters)
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM items{where} ORDER BY id {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [self._to_question(row) for row in rows]
+
+    def iter_items(self, **filters):
+        """
+        Yields every matching item in insertion order, FETCH_SIZE rows at a time.
+        """
+        where, params = self._where(filters)
+        last_id = 0
+        while True:
+            clause = f"{where} AND id > ?" if where else " WHERE id > ?"
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM items{clause} ORDER BY id LIMIT ?", params + [last_id, FETCH_SIZE]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_question(row)
+            last_id = rows[-1]["id"]
+
+    def hashes(self, **filters):
+        """
+        Content hashes of the matching items, for deduplication against the bank.
+        """
+        where, params = self._where(filters)
+        with self._lock:
+            return {row[0] for row in self._conn.execute(f"SELECT content_hash FROM items{where}", params)}
+
+    def summary(self):
+        """
+        Item counts grouped by type, CEFR level and source.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT type, cefr, source, COUNT(*) FROM items GROUP BY type, cefr, source ORDER BY type, cefr, source"
+            ).fetchall()
+        return [{"type": r[0], "cefr": r[1], "source": r[2], "items": r[3]} for r in rows]
+
+    def export(self, path, **filters):
+        """
+        Streams matching items to CSV, or to JSONL when the path ends in .jsonl.
+        Returns the number of items written.
+        """
+        written = 0
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.lower().endswith(".jsonl"):
+                for question in self.iter_items(**filters):
+                    f.write(json.dumps(question, ensure_ascii=False) + "\n")
+                    written += 1
+            else:
+                writer = csv.DictWriter(f, fieldnames=QUESTION_FIELDS, extrasaction="ignore")
+                writer.writeheader()
+                for question in self.iter_items(**filters):
+                    writer.writerow(question)
+                    written += 1
+        return written
+
+    def example_rows(self, limit_per_type=500):
+        """
+        The newest workshop-accepted items per type, as extra few-shot examples.
+        """
+        rows = []
+        with self._lock:
+            types = [r[0] for r in self._conn.execute("SELECT DISTINCT type FROM items WHERE status = 'accepted'")]
+        for q_type in types:
+            rows.extend(self.query(limit=limit_per_type, type=q_type, status="accepted"))
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_store():
+    """
+    Returns the process-wide item bank, opening it on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ItemStore()
+    return _store
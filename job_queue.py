@@ -0,0 +1,586 @@
+"""
+Shared job queue and worker pool for serving several users at once.
+
+Sessions submit planned batches to a SQLite queue and poll it for status; a pool of
+worker processes (or threads inside the app) claims queued jobs and runs them through
+pipeline.generate_batch with checkpointing, so any session's work runs on any worker
+and throughput grows with the number of workers.
+
+Usage:
+    python job_queue.py serve --workers 4 --per-user 1 --rpm 500 --tpm 150000
+    python job_queue.py submit spec.json --user alice
+    python job_queue.py status --user alice
+    python job_queue.py cancel 12
+
+Workers enforce:
+    per-user concurrency  a user's queued jobs wait while --per-user of theirs are
+                          running; among waiting jobs, users with fewer running go first
+    global rate limits    --rpm/--tpm are the whole pool's budget per key and model;
+                          each worker process routes its calls under an equal share
+    in-flight requests    each job sends at most --max-in-flight requests at once
+
+A job whose worker stops heart-beating is put back in the queue and resumes from its
+checkpoint on another worker.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import item_store
+import job_runner
+import llm_service
+import pipeline
+import telemetry
+
+DEFAULT_QUEUE_PATH = os.path.join("runs", "job_queue.sqlite3")
+DEFAULT_RUNS_DIR = os.path.join("runs", "queue")
+DEFAULT_WORKERS = 2
+DEFAULT_PER_USER = 1
+POLL_INTERVAL = 1.0
+
+# Workers report liveness this often; a running job unreported for STALE_SECONDS is requeued
+HEARTBEAT_SECONDS = 5.0
+STALE_SECONDS = 60.0
+MAX_ATTEMPTS = 3
+
+QUESTIONS_FILE = "questions.jsonl"
+RESULT_FILE = "result.json"
+LOG_FILE = "debug.log"
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+_queue = None
+_queue_lock = threading.Lock()
+_local_workers = []
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of generation jobs, shared by every session and worker on the
+    machine (WAL mode, so readers never wait for a worker's writes).
+
+    A job row holds its job list, strategy and settings, its status and progress, and
+    the run directory its checkpoint and results are written to.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, runs_dir=DEFAULT_RUNS_DIR):
+        self.path = path
+        self.runs_dir = runs_dir
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                user TEXT NOT NULL,
+                status TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                job_list TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                run_dir TEXT,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                questions INTEGER,
+                errors TEXT,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat REAL,
+                finished_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, user)")
+        # Finished questions of running jobs, in the order they were done, for live views
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                job_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                item TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                job_id INTEGER,
+                heartbeat REAL NOT NULL
+            )"""
+        )
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["job_list"] = json.loads(job["job_list"])
+        job["settings"] = json.loads(job["settings"])
+        job["errors"] = json.loads(job["errors"]) if job["errors"] else []
+        return job
+
+    # ----------------------------------------------------------------------
+    # Sessions
+    # ----------------------------------------------------------------------
+    def submit(self, job_list, strategy, user="anonymous", **settings):
+        """
+        Queues a planned batch. settings are generate_batch keyword arguments
+        (chunk_size, use_cache, max_in_flight). Returns the job id.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (user, status, strategy, job_list, settings, total, message, submitted_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, 'Waiting for a worker', ?)",
+                (user, strategy, json.dumps(job_list, ensure_ascii=False), json.dumps(settings),
+                 len(job_list), time.time())
+            )
+            job_id = cursor.lastrowid
+            run_dir = os.path.join(self.runs_dir, f"job_{job_id:06d}")
+            self._conn.execute("UPDATE jobs SET run_dir = ? WHERE id = ?", (run_dir, job_id))
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def jobs(self, user=None, limit=50):
+        """
+        The newest jobs, all users' or one user's, without their job lists.
+        """
+        query = "SELECT * FROM jobs" + (" WHERE user = ?" if user is not None else "") + " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, ((user,) if user is not None else ()) + (limit,)).fetchall()
+        jobs = [self._row(row) for row in rows]
+        for job in jobs:
+            job["jobs"] = len(job.pop("job_list"))
+        return jobs
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job at once; a running one stops sending requests at its next
+        heartbeat and keeps the questions it finished. Returns False if already finished.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, message = 'Cancelled before it started' "
+                "WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            if cursor.rowcount:
+                return True
+            cursor = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+            )
+            return bool(cursor.rowcount)
+
+    def items(self, job_id, after=0):
+        """
+        [(seq, question)] a job has finished so far, after seq `after`: poll with the
+        last seq seen to get only the new ones. seq keeps increasing when a stale job is
+        requeued; the resumed run emits its restored questions again, under new seqs.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, item FROM items WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(seq, json.loads(item)) for seq, item in rows]
+
+    def results(self, job_id):
+        """
+        A finished (or cancelled) job's result, shaped like generate_batch's: questions
+        in job order, the Sequential Batch stage items, errors and duplicates.
+        Empty if the job produced none.
+        """
+        job = self.get(job_id)
+        path = os.path.join(job["run_dir"], RESULT_FILE) if job and job["run_dir"] else None
+        if not path or not os.path.exists(path):
+            return {"questions": [], "stage1": [], "stage2": [], "stage3": [], "errors": [], "duplicates": []}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def stats(self):
+        """
+        {status: job count} plus the number of live workers.
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        stats = {status: counts.get(status, 0) for status in STATUSES}
+        stats["workers"] = self.active_workers()
+        return stats
+
+    # ----------------------------------------------------------------------
+    # Workers
+    # ----------------------------------------------------------------------
+    def claim(self, worker_id, max_per_user=DEFAULT_PER_USER):
+        """
+        Atomically takes the next job for a worker: the oldest queued job of a user with
+        fewer than max_per_user running, preferring users with the fewest running.
+        Returns the job, or None.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    """SELECT j.* FROM jobs j
+                       LEFT JOIN (SELECT user, COUNT(*) AS n FROM jobs WHERE status = 'running' GROUP BY user) r
+                       ON r.user = j.user
+                       WHERE j.status = 'queued' AND COALESCE(r.n, 0) < ?
+                       ORDER BY COALESCE(r.n, 0), j.id LIMIT 1""",
+                    (max_per_user,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                        "started_at = COALESCE(started_at, ?), heartbeat = ?, message = 'Started' WHERE id = ?",
+                        (worker_id, now, now, row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def heartbeat(self, worker_id, job_id=None):
+        """
+        Records that a worker is alive (and still on job_id). Returns True if that job
+        has been asked to cancel, or is no longer the worker's (it was requeued while
+        the worker was unresponsive) and the worker should stop.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (id, job_id, heartbeat) VALUES (?, ?, ?)", (worker_id, job_id, now)
+            )
+            if job_id is None:
+                return False
+            self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ?", (now, job_id, worker_id))
+            row = self._conn.execute("SELECT cancel_requested, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return not row or bool(row["cancel_requested"]) or row["worker"] != worker_id
+
+    def owns(self, worker_id, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = 'running'", (job_id, worker_id)
+            ).fetchone()
+        return row is not None
+
+    # A worker's writes below only apply while it still runs the job: once a job is
+    # requeued (or failed) behind a stalled worker, the worker's late updates are dropped.
+    def add_item(self, job_id, question, worker_id):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO items (job_id, seq, item) "
+                "SELECT id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM items WHERE job_id = ?), ? FROM jobs "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, json.dumps(question, ensure_ascii=False), job_id, worker_id)
+            )
+
+    def progress(self, job_id, completed, total, message, worker_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET completed = ?, total = ?, message = ?, heartbeat = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (completed, total, message, time.time(), job_id, worker_id)
+            )
+
+    def finish(self, job_id, status, worker_id, questions=0, errors=(), message=""):
+        """
+        Records a job's outcome. Returns False, changing nothing, if worker_id no longer
+        runs the job.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, questions = ?, errors = ?, message = ?, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, questions, json.dumps(list(errors), ensure_ascii=False), message, time.time(),
+                 job_id, worker_id)
+            )
+            if not cursor.rowcount:
+                return False
+            # Live items are only for polling a running job; the result file has them all
+            self._conn.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+        return True
+
+    def retire(self, worker_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def active_workers(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - STALE_SECONDS,)
+            ).fetchone()[0]
+
+    def requeue_stale(self):
+        """
+        Puts running jobs whose worker went quiet back in the queue (they resume from
+        their checkpoint), or fails them after MAX_ATTEMPTS. Returns the number requeued.
+        """
+        cutoff = time.time() - STALE_SECONDS
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, message = 'Worker lost too many times' "
+                "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (time.time(), cutoff, MAX_ATTEMPTS)
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, message = 'Requeued after its worker stopped' "
+                "WHERE status = 'running' AND heartbeat < ?",
+                (cutoff,)
+            )
+            self._conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+        return cursor.rowcount
+
+
+def get_queue(path=DEFAULT_QUEUE_PATH):
+    """
+    Returns the process-wide JobQueue, opening it on first use.
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(path)
+    return _queue
+
+
+# --------------------------------------------------------------------------
+# Running Jobs
+# --------------------------------------------------------------------------
+def run_job(queue, job, worker_id, example_banks, api_key, store=None, max_in_flight=job_runner.DEFAULT_MAX_IN_FLIGHT):
+    """
+    Runs one claimed job through generate_batch, checkpointed in the job's run
+    directory, and records the outcome. A heartbeat thread keeps the job claimed and
+    relays cancellation. example_banks may be a callable returning the banks, called
+    here so each job uses the current ones.
+    """
+    cancel = threading.Event()
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(HEARTBEAT_SECONDS):
+            if queue.heartbeat(worker_id, job["id"]):
+                cancel.set()
+
+    heart = threading.Thread(target=beat, daemon=True)
+    heart.start()
+
+    settings = dict(job["settings"])
+    settings["max_in_flight"] = min(int(settings.get("max_in_flight") or max_in_flight), max_in_flight)
+    os.makedirs(job["run_dir"], exist_ok=True)
+    try:
+        banks = example_banks() if callable(example_banks) else example_banks
+        if banks is None:
+            raise RuntimeError("The example banks could not be loaded")
+        with open(os.path.join(job["run_dir"], LOG_FILE), "a", encoding="utf-8") as log_file, telemetry.collect():
+            result = pipeline.generate_batch(
+                job["job_list"],
+                job["strategy"],
+                banks,
+                api_key,
+                on_progress=lambda completed, total, message: queue.progress(job["id"], completed, total, message, worker_id),
+                on_question=lambda question: queue.add_item(job["id"], question, worker_id),
+                log=lambda line: log_file.write(f"{line}\n"),
+                run_dir=job["run_dir"],
+                store=store,
+                cancel=cancel,
+                **settings
+            )
+        if not queue.owns(worker_id, job["id"]):
+            # Requeued while this worker stalled: the run directory is the new owner's now
+            return
+        pipeline.write_questions(result["questions"], os.path.join(job["run_dir"], QUESTIONS_FILE))
+        _write_result(job["run_dir"], result)
+    except Exception as e:
+        queue.finish(job["id"], "failed", worker_id, errors=[{"scope": "Job", "error": str(e)}], message=f"Failed: {e}")
+        return
+    finally:
+        stopped.set()
+
+    status = "cancelled" if cancel.is_set() else "done"
+    queue.finish(
+        job["id"], status, worker_id, len(result["questions"]), result["errors"],
+        f"{len(result['questions'])} questions, {len(result['errors'])} errors" + (" (cancelled)" if cancel.is_set() else "")
+    )
+
+
+def _write_result(run_dir, result):
+    path = os.path.join(run_dir, RESULT_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({key: result[key] for key in ("questions", "stage1", "stage2", "stage3", "errors", "duplicates")},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def run_worker(queue, example_banks, api_key, store=None, max_per_user=DEFAULT_PER_USER,
+               max_in_flight=job_runner.DEFAULT_MAX_IN_FLIGHT, stop=None, worker_id=None):
+    """
+    Claims and runs jobs until the threading.Event stop is set (forever without one).
+    """
+    worker_id = worker_id or uuid.uuid4().hex[:12]
+    stop = stop or threading.Event()
+    try:
+        while not stop.is_set():
+            queue.requeue_stale()
+            job = queue.claim(worker_id, max_per_user)
+            if job is None:
+                queue.heartbeat(worker_id)
+                stop.wait(POLL_INTERVAL)
+                continue
+            queue.heartbeat(worker_id, job["id"])
+            run_job(queue, job, worker_id, example_banks, api_key, store, max_in_flight)
+            queue.heartbeat(worker_id)
+    finally:
+        queue.retire(worker_id)
+
+
+def start_workers(queue, example_banks, api_key, count=DEFAULT_WORKERS, rpm=None, tpm=None, **options):
+    """
+    Starts count worker threads in this process, once: for an app with no separate
+    `serve` pool. Later calls return the threads already running.
+    The threads share this process's llm_service router, so its buckets hold the whole
+    pool to rpm/tpm per key and model; when no router is configured, one is set up for
+    api_key (keeping the requested models). Pass example_banks as a callable for the
+    workers to pick up changed banks (see run_job).
+    """
+    with _queue_lock:
+        if llm_service.get_router() is None:
+            llm_service.configure_router([api_key], {}, rpm, tpm)
+        if not any(thread.is_alive() for thread in _local_workers):
+            _local_workers[:] = [
+                threading.Thread(target=run_worker, args=(queue, example_banks, api_key), kwargs=options, daemon=True)
+                for _ in range(count)
+            ]
+            for thread in _local_workers:
+                thread.start()
+    return list(_local_workers)
+
+
+def _worker_process(path, runs_dir, api_keys, stage_models, rpm, tpm, item_bank, max_per_user, max_in_flight):
+    if len(set(api_keys)) > 1 or stage_models or rpm or tpm:
+        llm_service.configure_router(api_keys, stage_models, rpm, tpm)
+    store = item_store.ItemStore(item_bank) if item_bank else None
+    queue = JobQueue(path, runs_dir)
+    try:
+        run_worker(queue, pipeline.load_example_banks(store=store), api_keys[0], store, max_per_user, max_in_flight)
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(path=DEFAULT_QUEUE_PATH, runs_dir=DEFAULT_RUNS_DIR, api_keys=(), workers=DEFAULT_WORKERS,
+          max_per_user=DEFAULT_PER_USER, max_in_flight=job_runner.DEFAULT_MAX_IN_FLIGHT, rpm=None, tpm=None,
+          stage_models=None, item_bank=None):
+    """
+    Runs a pool of worker processes until interrupted. rpm/tpm are split evenly
+    between the processes, so together they stay under the limits.
+    """
+    share_rpm = max(1, rpm // workers) if rpm else None
+    share_tpm = max(1, tpm // workers) if tpm else None
+    processes = [
+        multiprocessing.Process(
+            target=_worker_process,
+            args=(path, runs_dir, list(api_keys), stage_models, share_rpm, share_tpm, item_bank, max_per_user,
+                  max_in_flight),
+            daemon=True
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+# --------------------------------------------------------------------------
+# Command Line
+# --------------------------------------------------------------------------
+def format_job(job):
+    return (f"#{job['id']:<5} {job['user']:<12} {job['status']:<9} {job['completed']}/{job['total']:<4} "
+            f"{job['strategy']:<26} {job['message'] or ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared generation job queue and worker pool.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Queue database path")
+    parser.add_argument("--runs-dir", default=DEFAULT_RUNS_DIR, help="Where job checkpoints and results go")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run a pool of worker processes")
+    serve_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    serve_parser.add_argument("--per-user", type=int, default=DEFAULT_PER_USER, help="Running jobs per user")
+    serve_parser.add_argument("--max-in-flight", type=int, default=job_runner.DEFAULT_MAX_IN_FLIGHT,
+                              help="Requests in flight per job")
+    serve_parser.add_argument("--rpm", type=int, help="Requests per minute for the whole pool, per key and model")
+    serve_parser.add_argument("--tpm", type=int, help="Tokens per minute for the whole pool, per key and model")
+    serve_parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                              help="Defaults to the OPENAI_API_KEY environment variable")
+    serve_parser.add_argument("--api-keys", default=os.environ.get("OPENAI_API_KEYS"),
+                              help="Comma-separated keys to route requests across (defaults to OPENAI_API_KEYS)")
+    serve_parser.add_argument("--item-bank", nargs="?", const=item_store.DEFAULT_STORE_PATH,
+                              help="Add accepted questions to this item bank (default path if no value)")
+
+    submit_parser = commands.add_parser("submit", help="Queue the batches of a pipeline spec file")
+    submit_parser.add_argument("spec", help="JSON job spec file, as for pipeline.py")
+    submit_parser.add_argument("--user", default=os.environ.get("USER", "anonymous"))
+    submit_parser.add_argument("--chunk-size", type=int, default=None)
+    submit_parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+
+    status_parser = commands.add_parser("status", help="List jobs")
+    status_parser.add_argument("--user")
+    status_parser.add_argument("--limit", type=int, default=50)
+
+    cancel_parser = commands.add_parser("cancel", help="Cancel a job")
+    cancel_parser.add_argument("job_id", type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        if not args.api_key:
+            parser.error("No API key: pass --api-key or set OPENAI_API_KEY.")
+        api_keys = [args.api_key] + [k.strip() for k in (args.api_keys or "").split(",") if k.strip()]
+        print(f"Serving {args.queue} with {args.workers} workers", file=sys.stderr)
+        serve(args.queue, args.runs_dir, api_keys, args.workers, args.per_user, args.max_in_flight, args.rpm,
+              args.tpm, item_bank=args.item_bank)
+        return 0
+
+    queue = JobQueue(args.queue, args.runs_dir)
+    if args.command == "submit":
+        with open(args.spec, encoding="utf-8") as f:
+            specs = json.load(f)
+        for spec in specs if isinstance(specs, list) else [specs]:
+            job_list, strategy = pipeline.jobs_from_spec(spec)
+            job_id = queue.submit(job_list, strategy, args.user, chunk_size=args.chunk_size,
+                                  use_cache=not args.no_cache)
+            print(f"Queued job #{job_id}: {len(job_list)} jobs, {strategy}", file=sys.stderr)
+    elif args.command == "status":
+        stats = queue.stats()
+        print(", ".join(f"{name} {value}" for name, value in stats.items()))
+        for job in queue.jobs(args.user, args.limit):
+            print(format_job(job))
+    elif args.command == "cancel":
+        if not queue.cancel(args.job_id):
+            print(f"Job #{args.job_id} is not queued or running", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
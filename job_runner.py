@@ -0,0 +1,656 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import queue
+import threading
+import time
+import prompt_engineer
+import llm_service
+import metrics
+import output_formatter
+import telemetry
+import test_planner
+import token_budget
+import validator
+
+DEFAULT_MAX_IN_FLIGHT = 8
+
+# How many times the jobs missing from a malformed or incomplete response are re-requested
+MAX_REPAIR_ATTEMPTS = 2
+
+
+# --------------------------------------------------------------------------
+# Bounded-Concurrency Executor
+# --------------------------------------------------------------------------
+def run_jobs_concurrently(job_list, job_fn, max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_progress=None):
+    """
+    Runs job_fn(job) for every job with at most max_in_flight calls in flight.
+    Results are returned in job order, whatever order the jobs finish in.
+    on_progress(completed, total, job, result) is called from the calling thread
+    as each job finishes, so it is safe to update Streamlit widgets from it.
+    Each job is a telemetry "job" span carrying how long it queued for a worker.
+    """
+    total = len(job_list)
+    results = [None] * total
+    if total == 0:
+        return results
+
+    workers = max(1, min(int(max_in_flight), total))
+    completed = 0
+
+    def run(job, submitted):
+        with telemetry.span("job", job_id=job.get("job_id"), queue_wait=time.perf_counter() - submitted):
+            return job_fn(job)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(telemetry.bind(run), job, time.perf_counter()): index for index, job in enumerate(job_list)
+        }
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (None, f"Unexpected error: {str(e)}")
+
+            results[index] = result
+            completed += 1
+
+            if on_progress:
+                on_progress(completed, total, job_list[index], result)
+
+    return results
+
+
+# --------------------------------------------------------------------------
+# Staged Pipeline Scheduler
+# --------------------------------------------------------------------------
+_STOP = object()
+
+
+def run_staged_pipeline(items, stages, queue_size=2, on_result=None, on_event=None):
+    """
+    Streams items through a chain of stages connected by bounded queues, so an item
+    moves on to stage N+1 as soon as stage N is done with it while later items are
+    still in stage N.
+
+    stages is a list of (name, fn, workers); fn(state, emit) returns the updated state.
+    A state whose "error" is set skips the remaining stages.
+    Returns the final states in input order. on_result(completed, total, state) is
+    called from the calling thread as each item leaves the pipeline, and so is
+    on_event(payload) for every emit(payload) a stage makes while it is running.
+    If either callback raises, the pipeline is stopped (stages still running finish
+    their current item, the rest are dropped) before the exception propagates.
+    """
+    total = len(items)
+    results = [None] * total
+    if total == 0:
+        return results
+
+    stage_queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    done_queue = queue.Queue()
+    stopping = threading.Event()
+
+    def emit(payload):
+        done_queue.put(("event", payload))
+
+    def forward(stage_index, index, state):
+        if stopping.is_set():
+            return
+        if state.get("error") or stage_index + 1 == len(stages):
+            done_queue.put(("done", (index, state)))
+        else:
+            stage_queues[stage_index + 1].put((index, state))
+
+    def worker(stage_index):
+        _, fn, _ = stages[stage_index]
+        while True:
+            entry = stage_queues[stage_index].get()
+            if entry is _STOP or stopping.is_set():
+                return
+            index, state = entry
+            try:
+                state = fn(state, emit)
+            except Exception as e:
+                state["error"] = f"Unexpected error in {stages[stage_index][0]}: {str(e)}"
+            forward(stage_index, index, state)
+
+    def feeder():
+        for index, item in enumerate(items):
+            if stopping.is_set():
+                return
+            stage_queues[0].put((index, item))
+
+    def stop_workers():
+        # Drains the queues while the threads wind down, so none stays blocked on put();
+        # a stage's queue only gets _STOP while that stage still has a worker to take it
+        stopping.set()
+        while any(thread.is_alive() for thread in threads):
+            for stage_queue, workers in zip(stage_queues, stage_threads):
+                try:
+                    while True:
+                        stage_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                if any(thread.is_alive() for thread in workers):
+                    try:
+                        stage_queue.put_nowait(_STOP)
+                    except queue.Full:
+                        pass
+            for thread in threads:
+                thread.join(timeout=0.01)
+
+    stage_threads = [
+        [threading.Thread(target=telemetry.bind(worker), args=(stage_index,), daemon=True)
+         for _ in range(max(1, int(workers)))]
+        for stage_index, (_, _, workers) in enumerate(stages)
+    ]
+    threads = [threading.Thread(target=feeder, daemon=True)] + [t for workers in stage_threads for t in workers]
+    for thread in threads:
+        thread.start()
+
+    completed = 0
+    try:
+        while completed < total:
+            kind, payload = done_queue.get()
+            if kind == "event":
+                if on_event:
+                    on_event(payload)
+                continue
+
+            index, state = payload
+            results[index] = state
+            completed += 1
+            if on_result:
+                on_result(completed, total, state)
+    finally:
+        if completed < total:
+            stop_workers()
+
+    # Every item has left the pipeline, so the stage queues are empty; stop the workers.
+    for stage_index, (_, _, workers) in enumerate(stages):
+        for _ in range(max(1, int(workers))):
+            stage_queues[stage_index].put(_STOP)
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def limit_in_flight(llm, max_in_flight):
+    """
+    Wraps an LLM callable so that at most max_in_flight calls run at once,
+    however many stage workers share it. Time spent waiting for a slot is added to
+    the current span's queue_wait.
+    """
+    semaphore = threading.BoundedSemaphore(max(1, int(max_in_flight)))
+
+    def limited(*args, **kwargs):
+        waiting = time.perf_counter()
+        with semaphore:
+            telemetry.add("queue_wait", time.perf_counter() - waiting)
+            return llm(*args, **kwargs)
+    return limited
+
+
+def cancellable(llm, cancel):
+    """
+    Wraps an LLM callable so that, once the threading.Event cancel is set, calls not yet
+    sent return "Error: Cancelled." instead of reaching the API. Calls already in flight
+    finish normally, so their results are kept.
+    """
+    def guarded(*args, **kwargs):
+        if cancel.is_set():
+            metrics.increment("llm.cancelled")
+            return "Error: Cancelled."
+        return llm(*args, **kwargs)
+    return guarded
+
+
+# --------------------------------------------------------------------------
+# Checkpointed LLM Calls
+# --------------------------------------------------------------------------
+def _call_stage(llm, messages, api_key, on_item=None, max_tokens=None, stage=None):
+    """
+    Calls the LLM for one batch stage. With on_item, the completion is streamed and
+    on_item(item) fires for each array item as soon as its closing brace arrives.
+    The stage name lets llm_service route the call to that stage's keys and models.
+    The call is a telemetry "llm" span; streamed calls also record their time to
+    first token, not counting any queue wait.
+    """
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    if stage:
+        kwargs["stage"] = stage
+
+    with telemetry.span("llm", stage=stage, max_tokens=max_tokens) as call:
+        if on_item is None:
+            raw = llm(messages, api_key, **kwargs)
+        else:
+            parser = output_formatter.IncrementalArrayParser()
+
+            def on_delta(text):
+                if "ttft" not in call.attributes:
+                    call.set(ttft=call.elapsed() - call.attributes.get("queue_wait", 0))
+                for item in parser.feed(text):
+                    on_item(item)
+
+            raw = llm(messages, api_key, on_delta=on_delta, **kwargs)
+
+        if isinstance(raw, str) and raw.startswith("Error:"):
+            call.fail(raw)
+        return raw
+
+
+def _run_unit(llm, messages, api_key, parse, checkpoint=None, unit=None, on_item=None, budget=None):
+    """
+    Makes one LLM call, or reuses the response a checkpoint already holds for this unit,
+    and parses it with parse(raw) -> (data, error). New outcomes are checkpointed, so a
+    resumed run only re-issues units that failed or never ran.
+    With budget=(stage, item_count), max_tokens is sized from the observed output of
+    that stage, and the new response is added to that history.
+    Returns (raw_response, data, error).
+    """
+    raw = checkpoint.completed(unit) if checkpoint else None
+    restored = raw is not None
+
+    if not restored:
+        max_tokens = token_budget.plan_max_tokens(messages, *budget) if budget else None
+        raw = _call_stage(llm, messages, api_key, on_item, max_tokens, budget[0] if budget else None)
+
+    with telemetry.span("parse", stage=budget[0] if budget else None, restored=restored) as parsing:
+        data, error = parse(raw)
+        if error:
+            parsing.fail(error)
+
+    if restored:
+        if on_item and isinstance(data, list):
+            for item in data:
+                on_item(item)
+    else:
+        if checkpoint:
+            checkpoint.record(unit, raw, error)
+        if budget and not error:
+            token_budget.record_output(budget[0], len(data) if isinstance(data, list) else 1, raw)
+
+    return raw, data, error
+
+
+def _is_malformed(raw, error):
+    """
+    True when the model answered but its output could not be used; API errors
+    ("Error: ...") were already retried with backoff by llm_service.
+    """
+    return bool(error) and bool(raw) and not raw.startswith("Error:")
+
+
+def _run_job_unit(llm, messages, api_key, checkpoint, unit, stage):
+    """
+    _run_unit for a single-job call, re-requesting the job when its output is malformed.
+    Returns (data, error).
+    """
+    budget = (stage, 1)
+    raw, data, error = _run_unit(
+        llm, messages, api_key, output_formatter.parse_response, checkpoint, unit, budget=budget
+    )
+
+    for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+        if not _is_malformed(raw, error):
+            break
+        metrics.increment("repair.requests")
+        raw, data, error = _run_unit(
+            llm, messages, api_key, output_formatter.parse_response, checkpoint, f"{unit}/repair-{attempt}",
+            budget=budget
+        )
+        if not error:
+            metrics.increment("repair.refetched_items")
+
+    return data, error
+
+
+# --------------------------------------------------------------------------
+# Per-Job Strategies (Holistic / Segmented)
+# --------------------------------------------------------------------------
+def run_holistic_job(job, example_banks, api_key, llm=None, checkpoint=None):
+    """
+    Generates one complete question in a single call.
+    Returns (question_data, error_message).
+    """
+    llm = llm or llm_service.call_llm
+
+    with telemetry.span("prompt", stage="holistic"):
+        sys_msg, user_msg = prompt_engineer.create_holistic_prompt(job, example_banks)
+    return _run_job_unit(llm, [sys_msg, user_msg], api_key, checkpoint, f"job-{job['job_id']}/holistic", "holistic")
+
+
+def run_segmented_job(job, example_banks, api_key, llm=None, checkpoint=None):
+    """
+    Generates the options first, then a stem written around them (2 calls).
+    Returns (question_data, error_message).
+    """
+    llm = llm or llm_service.call_llm
+
+    with telemetry.span("prompt", stage="options"):
+        sys_msg_1, user_msg_1 = prompt_engineer.create_options_prompt(job, example_banks)
+    options_data, options_error = _run_job_unit(
+        llm, [sys_msg_1, user_msg_1], api_key, checkpoint, f"job-{job['job_id']}/options", "options"
+    )
+
+    if options_error:
+        return None, f"Failed at Options stage: {options_error}"
+
+    options_json_string = json.dumps(options_data)
+    with telemetry.span("prompt", stage="stem"):
+        sys_msg_2, user_msg_2 = prompt_engineer.create_stem_prompt(job, options_json_string)
+    return _run_job_unit(llm, [sys_msg_2, user_msg_2], api_key, checkpoint, f"job-{job['job_id']}/stem", "stem")
+
+
+def get_job_fn(strategy, example_banks, api_key, llm=None, checkpoint=None):
+    """
+    Returns a single-argument callable (job -> (data, error)) for the per-job strategies.
+    """
+    if strategy == "Segmented (2-Call)":
+        return lambda job: run_segmented_job(job, example_banks, api_key, llm, checkpoint)
+    return lambda job: run_holistic_job(job, example_banks, api_key, llm, checkpoint)
+
+
+# --------------------------------------------------------------------------
+# Sequential Batch (3-Call), Chunked
+# --------------------------------------------------------------------------
+def _stage_parser(wrapper_key, expected=None):
+    """
+    Returns parse(raw) -> (items, error) for one stage response. Output that is not
+    valid JSON (typically cut off at max_tokens) is salvaged item by item. With
+    expected, an error is also reported when fewer items than that came back; the
+    items that did arrive are still returned alongside it.
+    """
+    def parse(raw):
+        items, error = output_formatter.parse_stage_items(raw, wrapper_key)
+        if _is_malformed(raw, error):
+            salvaged = output_formatter.salvage_array_items(raw)
+            if salvaged:
+                metrics.increment("repair.salvaged_items", len(salvaged))
+                items, error = salvaged, None
+        if not error and expected is not None and len(items) < expected:
+            error = f"Expected {expected} items, got {len(items)}"
+        return items, error
+    return parse
+
+
+def _request_stage_items(state, stage_key, wrapper_key, build_messages, positions, api_key, llm,
+                         on_item=None, checkpoint=None):
+    """
+    Requests one stage's items for the jobs at the given chunk positions and stores
+    them, aligned, in state[stage_key]. Jobs still missing afterwards (dropped by the
+    model, or lost in a malformed response) are re-requested on their own, up to
+    MAX_REPAIR_ATTEMPTS times; build_messages(positions) -> (system, user) builds the
+    prompt for any subset. A malformed response nothing could be salvaged from counts
+    as every job missing. Returns the error that stopped the stage, or None.
+    """
+    chunk = state["jobs"]
+    log = state["logs"].append
+    label = f"Stage {stage_key[-1]}"
+    unit = f"chunk-{state['chunk_index']}/{stage_key}"
+    job_ids = [job['job_id'] for job in chunk]
+
+    if not positions:
+        log(f"{label} skipped: no items ready")
+        return None
+
+    with telemetry.span("prompt", stage=stage_key, items=len(positions)):
+        sys_msg, user_msg = build_messages(positions)
+    log(f"{label} prompt: system {len(sys_msg)} chars, user {len(user_msg)} chars")
+    raw, items, error = _run_unit(
+        llm, [sys_msg, user_msg], api_key, _stage_parser(wrapper_key), checkpoint, unit, on_item,
+        (stage_key, len(positions))
+    )
+    state["raw"][stage_key] = raw
+    log(f"{label} raw response: {len(raw)} chars")
+
+    if error and not _is_malformed(raw, error):
+        return error
+    if error:
+        log(f"{label} unreadable response ({error}); re-requesting every item")
+        items = []
+    first_error = error
+
+    with telemetry.span("extract", stage=stage_key, items=len(items)):
+        aligned = output_formatter.align_by_item_number([job_ids[i] for i in positions], items)
+        for position, item in zip(positions, aligned):
+            state[stage_key][position] = item
+    log(f"{label} extracted {len(items)} items for {len(positions)} jobs")
+
+    for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+        missing = [i for i in positions if state[stage_key][i] is None]
+        if not missing:
+            break
+
+        log(f"{label} missing {', '.join(job_ids[i] for i in missing)}; re-requesting (attempt {attempt})")
+        metrics.increment("repair.requests")
+        with telemetry.span("prompt", stage=stage_key, items=len(missing), repair=attempt):
+            sys_msg, user_msg = build_messages(missing)
+        raw, items, error = _run_unit(
+            llm, [sys_msg, user_msg], api_key, _stage_parser(wrapper_key, len(missing)),
+            checkpoint, f"{unit}/repair-{attempt}", on_item, (stage_key, len(missing))
+        )
+        state["raw"][f"{stage_key}_repair{attempt}"] = raw
+
+        with telemetry.span("extract", stage=stage_key, items=len(items or []), repair=attempt):
+            aligned = output_formatter.align_by_item_number([job_ids[i] for i in missing], items or [])
+            refetched = 0
+            for position, item in zip(missing, aligned):
+                if item is not None:
+                    state[stage_key][position] = item
+                    refetched += 1
+        metrics.increment("repair.refetched_items", refetched)
+        if error:
+            log(f"{label} repair attempt {attempt}: {error}")
+
+    unrecovered = [job_ids[i] for i in positions if state[stage_key][i] is None]
+    if unrecovered:
+        metrics.increment("repair.unrecovered_items", len(unrecovered))
+        log(f"{label} gave up on {', '.join(unrecovered)} after {MAX_REPAIR_ATTEMPTS} repair attempts")
+        if first_error and len(unrecovered) == len(positions):
+            return first_error
+    return None
+
+
+def new_chunk_state(chunk, chunk_index=0, batch_overview=""):
+    """
+    Working state for one chunk as it moves through the three stages: the stage
+    items aligned to the chunk's jobs (None where an item is missing), the raw
+    responses, log lines, the first error hit, and the questions assembled once the
+    chunk is done.
+    """
+    return {
+        "chunk_index": chunk_index,
+        "jobs": chunk,
+        "overview": batch_overview,
+        "stage1": [None] * len(chunk),
+        "stage2": [None] * len(chunk),
+        "stage3": [None] * len(chunk),
+        "raw": {},
+        "logs": [],
+        "error": None,
+        "questions": []
+    }
+
+
+def run_chunk_stage1(state, example_banks, api_key, llm=None, on_item=None, checkpoint=None):
+    """
+    Stage 1: complete sentences, correct answers and context clues.
+    """
+    llm = llm or llm_service.call_llm
+    chunk = state["jobs"]
+
+    def build_messages(positions):
+        return prompt_engineer.create_sequential_batch_stage1_prompt(
+            [chunk[i] for i in positions], example_banks, state["overview"]
+        )
+
+    error = _request_stage_items(
+        state, "stage1", "questions", build_messages, list(range(len(chunk))), api_key, llm, on_item, checkpoint
+    )
+    if error:
+        state["error"] = f"Stage 1 failed: {error}"
+    return state
+
+
+def run_chunk_stage2(state, api_key, llm=None, on_item=None, checkpoint=None):
+    """
+    Stage 2: distractors, routed by question type (batch is homogeneous).
+    """
+    llm = llm or llm_service.call_llm
+    chunk = state["jobs"]
+
+    question_type = chunk[0]['type']
+    if question_type == 'Grammar':
+        build_prompt = prompt_engineer.create_sequential_batch_stage2_grammar_prompt
+    elif question_type == 'Vocabulary':
+        build_prompt = prompt_engineer.create_sequential_batch_stage2_vocabulary_prompt
+    else:
+        state["error"] = f"Unknown question type: {question_type}"
+        return state
+
+    def build_messages(positions):
+        return build_prompt([chunk[i] for i in positions], [state["stage1"][i] for i in positions])
+
+    ready = [i for i, s1 in enumerate(state["stage1"]) if s1 is not None]
+    error = _request_stage_items(
+        state, "stage2", "distractors", build_messages, ready, api_key, llm, on_item, checkpoint
+    )
+    if error:
+        state["error"] = f"Stage 2 failed: {error}"
+    return state
+
+
+def run_chunk_stage3(state, api_key, llm=None, on_item=None, checkpoint=None):
+    """
+    Stage 3: quality validation of the complete items.
+    The rule-based checks in validator run first: items they reject get a local
+    "Requires Revision" report, and only the rest go to the LLM validator.
+    A failure here keeps the Stage 1/2 items so the questions can still be assembled.
+    """
+    llm = llm or llm_service.call_llm
+    chunk = state["jobs"]
+
+    def build_messages(positions):
+        return prompt_engineer.create_sequential_batch_stage3_prompt(
+            [chunk[i] for i in positions],
+            [state["stage1"][i] for i in positions],
+            [state["stage2"][i] for i in positions]
+        )
+
+    complete = [
+        i for i, (s1, s2) in enumerate(zip(state["stage1"], state["stage2"]))
+        if s1 is not None and s2 is not None
+    ]
+    outcomes = dict(zip(complete, validator.pre_validate(
+        [state["stage1"][i] for i in complete], [state["stage2"][i] for i in complete]
+    )))
+    rejected = [i for i in complete if outcomes[i][0]]
+    for i in rejected:
+        state["stage3"][i] = validator.rejection_report(chunk[i]['job_id'], *outcomes[i])
+        if on_item:
+            on_item(state["stage3"][i])
+    metrics.increment("validator.rejected", len(rejected))
+    metrics.increment("validator.sent_to_llm", len(complete) - len(rejected))
+    if rejected:
+        state["logs"].append(
+            f"Stage 3 pre-validation rejected {', '.join(chunk[i]['job_id'] for i in rejected)}"
+        )
+
+    error = _request_stage_items(
+        state, "stage3", "validations", build_messages, [i for i in complete if i not in rejected],
+        api_key, llm, on_item, checkpoint
+    )
+    for i in complete:
+        if i not in rejected and state["stage3"][i] is not None:
+            state["stage3"][i] = validator.add_notes(state["stage3"][i], outcomes[i][1])
+    if error:
+        state["error"] = f"Stage 3 failed: {error}"
+    return state
+
+
+def run_sequential_chunk(chunk, example_banks, api_key, llm=None, batch_overview=""):
+    """
+    Runs Stage 1 -> Stage 2 -> Stage 3 for one chunk of jobs, stopping at the first error.
+    """
+    state = new_chunk_state(chunk, batch_overview=batch_overview)
+    state = run_chunk_stage1(state, example_banks, api_key, llm)
+    if not state["error"]:
+        state = run_chunk_stage2(state, api_key, llm)
+    if not state["error"]:
+        state = run_chunk_stage3(state, api_key, llm)
+    return state
+
+
+def run_sequential_batch(job_list, example_banks, api_key, llm=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                         chunk_size=None, queue_size=2, on_progress=None, on_item=None, checkpoint=None,
+                         batch_overview=None):
+    """
+    Splits the batch into chunks small enough for one call's output budget and streams
+    them through a three-stage pipeline: a chunk's Stage 1 output goes straight on to
+    Stage 2 and then Stage 3 while later chunks are still in Stage 1. Results are merged
+    back in job order.
+
+    Each chunk's Stage 1 prompt carries a summary of the other chunks' topics and focuses,
+    so splitting keeps the cross-question anti-repetition of a single-call batch.
+    batch_overview replaces that summary when the jobs are part of a larger batch.
+    max_in_flight bounds the LLM calls across all stages; queue_size bounds how many
+    finished chunks can wait between two stages.
+    on_progress(completed, total, jobs, chunk_result) is called as each chunk finishes,
+    with the chunk's final questions already in chunk_result["questions"].
+    With on_item, every stage streams its completion and on_item(stage_name, item) is
+    called for each item as soon as it has been generated; both run on the calling thread.
+    With a checkpoint.RunStore, every stage of every chunk is checkpointed and stages
+    that already succeeded in an earlier attempt are restored instead of re-requested.
+    """
+    llm = limit_in_flight(llm or llm_service.call_llm, max_in_flight)
+    chunk_size = chunk_size or token_budget.plan_chunk_size()
+    chunks = test_planner.chunk_job_list(job_list, chunk_size)
+
+    states = [
+        new_chunk_state(chunk, i, test_planner.describe_other_chunks(chunks, i) if batch_overview is None else batch_overview)
+        for i, chunk in enumerate(chunks)
+    ]
+
+    def streamer(stage_name, emit):
+        if on_item is None:
+            return None
+        return lambda item: emit((stage_name, item))
+
+    stages = [
+        ("Stage 1", lambda state, emit: run_chunk_stage1(
+            state, example_banks, api_key, llm, streamer("Stage 1", emit), checkpoint), max_in_flight),
+        ("Stage 2", lambda state, emit: run_chunk_stage2(
+            state, api_key, llm, streamer("Stage 2", emit), checkpoint), max_in_flight),
+        ("Stage 3", lambda state, emit: run_chunk_stage3(
+            state, api_key, llm, streamer("Stage 3", emit), checkpoint), max_in_flight)
+    ]
+
+    def report(completed, total, state):
+        # Assembled once, as the chunk finishes, so callers can show its questions straight away
+        with telemetry.span("assemble", stage="sequential", chunk=state["chunk_index"]):
+            state["questions"] = output_formatter.assemble_sequential_questions(state["stage1"], state["stage2"])
+        if on_progress:
+            on_progress(completed, total, state["jobs"], state)
+
+    def relay_item(payload):
+        on_item(*payload)
+
+    chunk_results = run_staged_pipeline(
+        states, stages, queue_size=queue_size, on_result=report, on_event=relay_item if on_item else None
+    )
+
+    merged = {
+        "stage1": [],
+        "stage2": [],
+        "stage3": [],
+        "questions": [],
+        "chunks": chunk_results
+    }
+    for chunk_result in chunk_results:
+        for stage in ("stage1", "stage2", "stage3"):
+            merged[stage].extend(item for item in chunk_result[stage] if item is not None)
+        merged["questions"].extend(chunk_result["questions"])
+    return merged
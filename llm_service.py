@@ -1,28 +1,686 @@
-from openai import OpenAI
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+import response_cache
+import metrics
+import telemetry
 
-def call_llm(messages, api_key, model="gpt-4-turbo-preview", max_tokens=4096):
+DEFAULT_MODEL = "gpt-4-turbo-preview"
+
+# Connection pool settings shared by every client created below.
+# Change them with configure_pool() before the first call.
+POOL_SETTINGS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 60.0,
+    "connect_timeout": 10.0,
+    "read_timeout": 120.0
+}
+
+# Exponential backoff for rate limits and transient failures (timeouts, dropped
+# connections, 5xx). Delays double from base_delay up to max_delay, with jitter,
+# and a Retry-After header from the API takes precedence.
+RETRY_SETTINGS = {
+    "max_attempts": 5,
+    "base_delay": 1.0,
+    "max_delay": 30.0
+}
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError
+)
+
+# Client-side limits per (key, model) until the API's x-ratelimit-* headers report
+# the real ones: requests and tokens per minute.
+DEFAULT_RATE_LIMITS = {
+    "rpm": 500,
+    "tpm": 150000
+}
+
+# Models per pipeline stage when routing, in order of preference; later models are
+# failovers. Stages not listed use the model the caller asked for.
+DEFAULT_STAGE_MODELS = {
+    "stage2": ("gpt-4o-mini", DEFAULT_MODEL)
+}
+
+# Streamed responses end with a usage chunk, so cached-token counts are reported for them too
+STREAM_OPTIONS = {"include_usage": True}
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+_router = None
+_router_lock = threading.Lock()
+
+
+# --------------------------------------------------------------------------
+# Client Pool
+# --------------------------------------------------------------------------
+def configure_pool(**settings):
+    """
+    Updates the connection pool size / keep-alive / timeout settings.
+    Existing clients are closed so the next call picks up the new settings.
+    """
+    unknown = set(settings) - set(POOL_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown pool settings: {sorted(unknown)}")
+
+    with _clients_lock:
+        POOL_SETTINGS.update(settings)
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        # Async clients belong to their event loop; drop them and let them be rebuilt.
+        _async_clients.clear()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=POOL_SETTINGS["max_connections"],
+        max_keepalive_connections=POOL_SETTINGS["max_keepalive_connections"],
+        keepalive_expiry=POOL_SETTINGS["keepalive_expiry"]
+    )
+
+
+def _timeout():
+    return httpx.Timeout(POOL_SETTINGS["read_timeout"], connect=POOL_SETTINGS["connect_timeout"])
+
+
+def get_client(api_key, model=DEFAULT_MODEL):
+    """
+    Returns a long-lived OpenAI client for (api_key, model).
+    The underlying httpx pool keeps connections alive, so repeated calls skip
+    client construction and the TCP/TLS handshake.
+    """
+    key = (api_key, model)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                timeout=_timeout(),
+                max_retries=0,
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout())
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_client(api_key, model=DEFAULT_MODEL):
+    """
+    Async counterpart of get_client(). httpx async pools are tied to the event loop
+    that created them, so clients are cached per running loop as well.
+    """
+    loop = asyncio.get_running_loop()
+    key = (api_key, model, id(loop))
+    client = _async_clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                timeout=_timeout(),
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            )
+            _async_clients[key] = client
+        return client
+
+
+# --------------------------------------------------------------------------
+# Response Cache
+# --------------------------------------------------------------------------
+def get_cache():
+    """
+    Returns the process-wide on-disk response cache, opening it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = response_cache.ResponseCache()
+    return _cache
+
+
+def _cache_key(request):
+    # max_tokens is left out: only complete JSON is cached, and a complete response
+    # is just as valid whatever output budget it was requested with.
+    messages = request["messages"]
+    return response_cache.make_key(
+        messages[0]["content"],
+        messages[1]["content"],
+        request["model"],
+        None,
+        temperature=request["temperature"],
+        response_format=request["response_format"]
+    )
+
+
+def _stream_completion(client, request, on_delta):
+    """
+    Runs a streaming completion, passing each text delta to on_delta as it arrives.
+    Returns the full text.
+    """
+    return _collect_stream(
+        lambda: client.chat.completions.create(stream=True, stream_options=STREAM_OPTIONS, **request), on_delta
+    )
+
+
+def _collect_stream(open_stream, on_delta):
+    parts = []
+    try:
+        for event in open_stream():
+            if getattr(event, "usage", None):
+                record_usage(event.usage)
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    except Exception as e:
+        if parts:
+            raise _StreamStarted(e)
+        raise
+    return "".join(parts)
+
+
+def _cacheable(content):
+    """
+    Only well-formed JSON is cached (every request asks for a JSON object), so a
+    truncated or malformed completion is never replayed when the job is re-requested.
+    """
+    if not content:
+        return False
+    try:
+        json.loads(content)
+    except ValueError:
+        return False
+    return True
+
+
+def _field(value, name):
+    return value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+
+
+def record_usage(usage):
+    """
+    Adds a response's token usage to the metrics. llm.cached_prompt_tokens counts the
+    prompt tokens the provider served from its prefix cache (billed at a discount and
+    faster to first token); compare it with llm.prompt_tokens for the hit rate.
+    Accepts the SDK's usage object or its dict form (Batch API results).
+    The counts are also added to the current telemetry span.
+    """
+    if not usage:
+        return
+    prompt_tokens = _field(usage, "prompt_tokens") or 0
+    completion_tokens = _field(usage, "completion_tokens") or 0
+    details = _field(usage, "prompt_tokens_details")
+    cached_tokens = (_field(details, "cached_tokens") if details else 0) or 0
+    metrics.increment("llm.prompt_tokens", prompt_tokens)
+    metrics.increment("llm.completion_tokens", completion_tokens)
+    metrics.increment("llm.cached_prompt_tokens", cached_tokens)
+    telemetry.add("prompt_tokens", prompt_tokens)
+    telemetry.add("completion_tokens", completion_tokens)
+    telemetry.add("cached_tokens", cached_tokens)
+
+
+def _content(response):
+    record_usage(getattr(response, "usage", None))
+    return response.choices[0].message.content
+
+
+def build_request(messages, model, max_tokens):
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": messages[0]},
+            {"role": "user", "content": messages[1]}
+        ],
+        "temperature": 0.9,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"}
+    }
+
+
+# --------------------------------------------------------------------------
+# Request Router
+# --------------------------------------------------------------------------
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_duration(text):
+    """
+    Seconds in an x-ratelimit-reset-* value such as "20ms", "1s" or "6m0s".
+    """
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_PART.findall(str(text or "")))
+
+
+class TokenBucket:
+    """
+    Client-side limiter refilling `per_minute` units a minute up to that capacity.
+    reserve() always takes its units and returns how long the caller must wait
+    before using them, so concurrent callers queue up in order.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def delay(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) * 60.0 / self.capacity)
+
+    def reserve(self, amount, now):
+        wait = self.delay(amount, now)
+        self.available -= min(amount, self.capacity)
+        return wait
+
+    def sync(self, limit, remaining, now):
+        """
+        Adopts the server's view: its per-minute limit, and no more headroom than it reports.
+        """
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.available = min(self.available, float(remaining))
+
+
+class Endpoint:
+    """
+    One (API key, model) pair with its request and token buckets.
+    """
+
+    def __init__(self, api_key, model, rpm, tpm):
+        self.api_key = api_key
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+
+    def delay(self, tokens, now):
+        return max(self.blocked_until - now, self.requests.delay(1, now), self.tokens.delay(tokens, now))
+
+    def reserve(self, tokens, now):
+        return max(self.blocked_until - now, self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+
+class Router:
+    """
+    Spreads requests over several API keys and models.
+
+    Each stage maps to a list of models (stage_models, else the requested model); a
+    request goes to whichever key/model endpoint for its stage can take it soonest
+    under its client-side RPM/TPM buckets. The buckets follow the x-ratelimit-*
+    headers of every response, and a 429 blocks its endpoint for the Retry-After
+    period so the retry fails over to another key or model.
+    """
+
+    def __init__(self, api_keys, stage_models=None, rpm=None, tpm=None):
+        self.api_keys = [key for key in dict.fromkeys(api_keys) if key]
+        if not self.api_keys:
+            raise ValueError("The router needs at least one API key")
+        self.stage_models = dict(DEFAULT_STAGE_MODELS if stage_models is None else stage_models)
+        self.rpm = rpm or DEFAULT_RATE_LIMITS["rpm"]
+        self.tpm = tpm or DEFAULT_RATE_LIMITS["tpm"]
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def models_for(self, stage, model=DEFAULT_MODEL):
+        return tuple(self.stage_models.get(stage) or (model,))
+
+    def _candidates(self, stage, model):
+        """
+        [(model preference, endpoint)] for every key of every model the stage may use.
+        """
+        candidates = []
+        for rank, candidate_model in enumerate(self.models_for(stage, model)):
+            for api_key in self.api_keys:
+                endpoint = self.endpoints.get((api_key, candidate_model))
+                if endpoint is None:
+                    endpoint = Endpoint(api_key, candidate_model, self.rpm, self.tpm)
+                    self.endpoints[(api_key, candidate_model)] = endpoint
+                candidates.append((rank, endpoint))
+        return candidates
+
+    def acquire(self, stage, model, tokens):
+        """
+        Picks the endpoint that can take a request of about `tokens` soonest (ties go to
+        the preferred model, then to the key with the most token headroom) and reserves
+        capacity on it. Returns (endpoint, seconds to wait).
+        """
+        with self._lock:
+            now = time.monotonic()
+            _, endpoint = min(
+                self._candidates(stage, model),
+                key=lambda c: (c[1].delay(tokens, now), c[0], -c[1].tokens.available / c[1].tokens.capacity)
+            )
+            return endpoint, endpoint.reserve(tokens, now)
+
+    def has_ready(self, stage, model):
+        """
+        True if some endpoint for the stage is not blocked by a 429.
+        """
+        with self._lock:
+            now = time.monotonic()
+            return any(e.blocked_until <= now for _, e in self._candidates(stage, model))
+
+    def observe(self, endpoint, headers):
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((endpoint.requests, "requests"), (endpoint.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                try:
+                    bucket.sync(float(limit) if limit else None, float(remaining) if remaining else None, now)
+                except ValueError:
+                    continue
+
+    def throttle(self, endpoint, error):
+        """
+        Blocks an endpoint after a 429 for as long as the API asked (or the reset headers say).
+        """
+        response = getattr(error, "response", None)
+        headers = response.headers if response is not None else {}
+        wait = _retry_delay(error, 1)
+        for kind in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                wait = max(wait, _parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+        with self._lock:
+            endpoint.blocked_until = max(endpoint.blocked_until, time.monotonic() + wait)
+        metrics.increment("router.throttled")
+
+
+def configure_router(api_keys, stage_models=None, rpm=None, tpm=None):
+    """
+    Routes every call_llm / call_llm_async request through a Router over api_keys;
+    stage_models maps stage -> models (DEFAULT_STAGE_MODELS when None).
+    Pass no keys to switch routing off again.
+    """
+    global _router
+    with _router_lock:
+        _router = Router(api_keys, stage_models, rpm, tpm) if api_keys else None
+    return _router
+
+
+def get_router():
+    """
+    Returns the configured Router, or None when requests go straight to the caller's key.
+    """
+    return _router
+
+
+def _request_tokens(request):
+    """
+    Rough TPM cost of a request: ~4 characters per prompt token plus its output allowance,
+    which the API also counts against the limit.
+    """
+    chars = sum(len(message["content"]) for message in request["messages"])
+    return chars // 4 + (request.get("max_tokens") or 0)
+
+
+def _route(router, stage, request):
+    """
+    Acquires an endpoint for the request. Returns (endpoint, request for its model, wait).
+    """
+    endpoint, wait = router.acquire(stage, request["model"], _request_tokens(request))
+    if wait > 0:
+        metrics.increment("router.waits")
+    return endpoint, dict(request, model=endpoint.model), wait
+
+
+def _routed_completion(router, stage, request, on_delta=None):
+    """
+    Sends the request to the endpoint the router picks. Returns (content, model that
+    answered), which is a failover model rather than request["model"] at times.
+    """
+    endpoint, routed, wait = _route(router, stage, request)
+    telemetry.annotate(model=endpoint.model)
+    if wait > 0:
+        telemetry.add("queue_wait", wait)
+        time.sleep(wait)
+
+    completions = get_client(endpoint.api_key, endpoint.model).chat.completions.with_raw_response
+    try:
+        if on_delta:
+            def open_stream():
+                raw = completions.create(stream=True, stream_options=STREAM_OPTIONS, **routed)
+                router.observe(endpoint, raw.headers)
+                return raw.parse()
+            return _collect_stream(open_stream, on_delta), endpoint.model
+
+        raw = completions.create(**routed)
+        router.observe(endpoint, raw.headers)
+        return _content(raw.parse()), endpoint.model
+    except openai.RateLimitError as e:
+        router.throttle(endpoint, e)
+        raise
+
+
+async def _routed_completion_async(router, stage, request):
+    endpoint, routed, wait = _route(router, stage, request)
+    telemetry.annotate(model=endpoint.model)
+    if wait > 0:
+        telemetry.add("queue_wait", wait)
+        await asyncio.sleep(wait)
+
+    completions = get_async_client(endpoint.api_key, endpoint.model).chat.completions.with_raw_response
+    try:
+        raw = await completions.create(**routed)
+        router.observe(endpoint, raw.headers)
+        return _content(raw.parse()), endpoint.model
+    except openai.RateLimitError as e:
+        router.throttle(endpoint, e)
+        raise
+
+
+def _failover(router, stage, model):
+    """
+    Returns failover(error) for the backoff loop: a rate-limited request is retried
+    at once when another endpoint for its stage is still open.
+    """
+    def failover(error):
+        if router is None or not isinstance(error, openai.RateLimitError):
+            return False
+        if router.has_ready(stage, model):
+            metrics.increment("router.failovers")
+            return True
+        return False
+    return failover
+
+
+# --------------------------------------------------------------------------
+# Retries
+# --------------------------------------------------------------------------
+class _StreamStarted(Exception):
+    """
+    Wraps an error raised after some deltas were already passed on; retrying would
+    replay them, so the error is surfaced instead.
+    """
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+def _retry_delay(error, attempt):
+    """
+    Seconds to wait before retry number `attempt` (1-based).
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_SETTINGS["max_delay"])
+        except ValueError:
+            pass
+
+    delay = min(RETRY_SETTINGS["base_delay"] * 2 ** (attempt - 1), RETRY_SETTINGS["max_delay"])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _should_retry(error, attempt):
+    if not isinstance(error, RETRYABLE_ERRORS) or attempt >= RETRY_SETTINGS["max_attempts"]:
+        return False
+    metrics.increment("llm.retries")
+    if isinstance(error, openai.RateLimitError):
+        metrics.increment("llm.rate_limited")
+    return True
+
+
+def _with_backoff(fn, failover=None):
+    """
+    Calls fn(), retrying retryable API errors with exponential backoff.
+    fn() may raise _StreamStarted to stop retries once output has been delivered.
+    When failover(error) is true the retry goes out at once (another endpoint is free).
+    """
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except _StreamStarted as e:
+            raise e.error
+        except Exception as e:
+            if not _should_retry(e, attempt):
+                raise
+            if not (failover and failover(e)):
+                time.sleep(_retry_delay(e, attempt))
+            attempt += 1
+
+
+async def _with_backoff_async(fn, failover=None):
+    attempt = 1
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            if not _should_retry(e, attempt):
+                raise
+            if not (failover and failover(e)):
+                await asyncio.sleep(_retry_delay(e, attempt))
+            attempt += 1
+
+
+# --------------------------------------------------------------------------
+# Public Entry Points
+# --------------------------------------------------------------------------
+def call_llm(messages, api_key, model=DEFAULT_MODEL, max_tokens=4096, use_cache=True, on_delta=None, stage=None):
     """
     Sends a message history to the OpenAI API using the provided API key.
     Increased max_tokens to 4096 to support batch generation of multiple questions.
     Temperature increased to 0.9 for better diversity across questions.
+    Identical requests are answered from the on-disk cache; pass use_cache=False for fresh output.
+    Rate-limit and transient errors are retried with exponential backoff (RETRY_SETTINGS).
+    With on_delta, the completion is streamed and on_delta(text) is called for each delta
+    (once with the whole text on a cache hit); the full text is still returned.
+    With a router configured (configure_router), the request goes to the key and model
+    chosen for its stage ("stage1", "holistic", ...) instead of api_key / model.
+    """
+    if not api_key:
+        return "Error: API Key is missing. Please enter it in the sidebar."
+
+    try:
+        router = get_router()
+        if router is not None:
+            model = router.models_for(stage, model)[0]
+        request = build_request(messages, model, max_tokens)
+        key = _cache_key(request)
+        telemetry.annotate(model=model)
+
+        if use_cache:
+            cached = get_cache().get(key)
+            if cached is not None:
+                telemetry.annotate(response_cache="hit")
+                if on_delta:
+                    on_delta(cached)
+                return cached
+
+        if router is not None:
+            content, answered_by = _with_backoff(
+                lambda: _routed_completion(router, stage, request, on_delta), _failover(router, stage, model)
+            )
+            # Stored under the model that answered, so a failover answer is never served
+            # later as the primary model's
+            key = _cache_key(dict(request, model=answered_by))
+        elif on_delta:
+            client = get_client(api_key, model)
+            content = _with_backoff(lambda: _stream_completion(client, request, on_delta))
+        else:
+            client = get_client(api_key, model)
+            response = _with_backoff(lambda: client.chat.completions.create(**request))
+            content = _content(response)
+
+        if _cacheable(content):
+            get_cache().put(key, content)
+        return content
+
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+async def call_llm_async(messages, api_key, model=DEFAULT_MODEL, max_tokens=4096, use_cache=True, stage=None):
+    """
+    Async version of call_llm(), sharing the same request shape, cache, routing, error
+    convention and telemetry attributes (model, token counts, cache hits).
     """
     if not api_key:
         return "Error: API Key is missing. Please enter it in the sidebar."
 
     try:
-        client = OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": messages[0]},
-                {"role": "user", "content": messages[1]}
-            ],
-            temperature=0.9,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"}
-        )
-        return response.choices[0].message.content
-        
+        router = get_router()
+        if router is not None:
+            model = router.models_for(stage, model)[0]
+        request = build_request(messages, model, max_tokens)
+        key = _cache_key(request)
+        telemetry.annotate(model=model)
+
+        if use_cache:
+            cached = get_cache().get(key)
+            if cached is not None:
+                telemetry.annotate(response_cache="hit")
+                return cached
+
+        if router is not None:
+            content, answered_by = await _with_backoff_async(
+                lambda: _routed_completion_async(router, stage, request), _failover(router, stage, model)
+            )
+            key = _cache_key(dict(request, model=answered_by))
+        else:
+            client = get_async_client(api_key, model)
+            response = await _with_backoff_async(lambda: client.chat.completions.create(**request))
+            content = _content(response)
+
+        if _cacheable(content):
+            get_cache().put(key, content)
+        return content
+
     except Exception as e:
         return f"Error: {str(e)}"
@@ -0,0 +1,29 @@
+import threading
+
+# Process-wide counters, e.g. "llm.retries" or "repair.salvaged_items".
+# Read them with snapshot(); the Debug tab and the CLI report them after a batch.
+_counters = {}
+_lock = threading.Lock()
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot():
+    """
+    Returns a copy of every counter, sorted by name.
+    """
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def reset():
+    with _lock:
+        _counters.clear()
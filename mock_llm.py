@@ -0,0 +1,434 @@
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_PIECE_CHARS = 64
+
+
+class FakeLLM:
+    """
+    Offline stand-in for llm_service.call_llm, used for benchmarking without the network.
+    Sleeps for a simulated round trip, then returns canned JSON shaped like the real
+    response for whichever prompt it was given (holistic, options, stem or batch stages).
+    A fraction error_rate of calls fail the way call_llm does once its retries are
+    exhausted, with an "Error: ..." string.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.0, seed=None, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, messages, api_key, model="gpt-4-turbo-preview", max_tokens=4096, on_delta=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+
+        if failed:
+            if delay > 0:
+                time.sleep(delay)
+            return "Error: Simulated API error."
+
+        content = json.dumps(fake_response(messages[0], messages[1]), indent=2)
+
+        if on_delta is None:
+            if delay > 0:
+                time.sleep(delay)
+            return content
+
+        # Streaming: spread the delay over the deltas like a real token stream
+        pieces = [content[i:i + STREAM_PIECE_CHARS] for i in range(0, len(content), STREAM_PIECE_CHARS)]
+        for piece in pieces:
+            if delay > 0:
+                time.sleep(delay / len(pieces))
+            on_delta(piece)
+        return content
+
+
+def _find_ids(text, field):
+    """
+    Pulls the real ids for a field out of a prompt, skipping the "..." template placeholders.
+    """
+    ids = re.findall(r'"' + field + r'":\s*"([^"]*)"', text)
+    return [i for i in ids if i and "..." not in i]
+
+
+def fake_response(system_msg, user_msg):
+    """
+    Builds a canned response dict for a (system, user) prompt pair.
+    """
+    if '"distractors"' in system_msg:
+        return {"distractors": [
+            {
+                "Item Number": item_id,
+                "Distractor A": "went",
+                "Why A is Wrong": "Canned distractor.",
+                "Distractor B": "going",
+                "Why B is Wrong": "Canned distractor.",
+                "Distractor C": "goes",
+                "Why C is Wrong": "Canned distractor."
+            }
+            for item_id in _find_ids(user_msg, "Item Number")
+        ]}
+
+    if '"validations"' in system_msg:
+        return {"validations": [
+            {
+                "Item Number": item_id,
+                "Overall Quality": "Pass",
+                "Sentence Reconstruction Results": "Pass",
+                "Ambiguity Issues": [],
+                "Context Clue Assessment": "Strong",
+                "Assessment Focus Alignment": "Correct",
+                "Other Issues": [],
+                "Cross-Question Issues": [],
+                "Revision Recommendations": "None"
+            }
+            for item_id in _find_ids(user_msg, "Item Number")
+        ]}
+
+    if '"questions"' in system_msg:
+        return {"questions": [
+            {
+                "Item Number": job_id,
+                "Assessment Focus": "Canned focus",
+                "Complete Sentence": f"Yesterday we go to the market ({job_id}).",
+                "Correct Answer": "go",
+                "Context Clue Location": "Yesterday",
+                "Context Clue Explanation": "Canned explanation.",
+                "CEFR rating": "A2",
+                "Category": "Grammar"
+            }
+            for job_id in _find_ids(user_msg, "job_id")
+        ]}
+
+    if "Generate 4 answer choices" in user_msg:
+        return {
+            "Answer A": "go",
+            "Answer B": "went",
+            "Answer C": "going",
+            "Answer D": "goes",
+            "Correct Answer": "B"
+        }
+
+    item_ids = _find_ids(user_msg, "Item Number")
+    return {
+        "Item Number": item_ids[0] if item_ids else "",
+        "Assessment Focus": "Canned focus",
+        "Question Prompt": "Yesterday we ____ to the market.",
+        "Answer A": "go",
+        "Answer B": "went",
+        "Answer C": "going",
+        "Answer D": "goes",
+        "Correct Answer": "B",
+        "CEFR rating": "A2",
+        "Category": "Grammar"
+    }
+
+
+# --------------------------------------------------------------------------
+# Mock OpenAI HTTP Server
+# --------------------------------------------------------------------------
+BATCH_STATUSES = ("validating", "in_progress", "finalizing", "completed")
+
+
+def _completion_body(request_body, request_number):
+    messages = request_body.get("messages", [])
+    system_msg = messages[0]["content"] if messages else ""
+    user_msg = messages[1]["content"] if len(messages) > 1 else ""
+    content = json.dumps(fake_response(system_msg, user_msg), indent=2)
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    return {
+        "id": f"chatcmpl-mock-{request_number}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request_body.get("model", ""),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                  "total_tokens": prompt_tokens + len(content) // 4}
+    }
+
+
+def _stream_events(completion, include_usage):
+    """
+    The chat.completion.chunk events a streamed request for this completion would get.
+    """
+    content = completion["choices"][0]["message"]["content"]
+    head = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+            "model": completion["model"]}
+    events = [
+        dict(head, choices=[{"index": 0, "delta": {"role": "assistant", "content": content[i:i + STREAM_PIECE_CHARS]},
+                             "finish_reason": None}])
+        for i in range(0, len(content), STREAM_PIECE_CHARS)
+    ]
+    events.append(dict(head, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+    if include_usage:
+        events.append(dict(head, choices=[], usage=completion["usage"]))
+    return events
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Benchmarks open many connections at once; the default backlog of 5 drops some
+    request_queue_size = 256
+
+
+class MockOpenAIServer:
+    """
+    Local HTTP stand-in for the OpenAI Chat Completions, Files and Batch APIs, so the
+    real llm_service client path and bulk mode (batch_api) run end to end without the
+    network. Completions are fake_response() output.
+
+    Point a client at it with OpenAI(base_url=server.url) or OPENAI_BASE_URL.
+    Chat completions (streamed or not) take latency plus up to jitter seconds, and a
+    fraction error_rate of them fail with HTTP 500, which llm_service retries with
+    backoff. Each batch moves one status further (validating, in_progress, finalizing,
+    completed) every time it is retrieved, so polling is exercised too. Custom ids
+    listed in fail_ids come back in the error file instead.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, fail_ids=(), latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.fail_ids = set(fail_ids)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.completions = 0
+        self.errors = 0
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _HTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ----------------------------------------------------------------------
+    # Chat Completions
+    # ----------------------------------------------------------------------
+    def draw_completion(self):
+        """
+        (request number, delay, failed) for the next chat completion.
+        """
+        with self._lock:
+            self.completions += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return self.completions, delay, failed
+
+    # ----------------------------------------------------------------------
+    # Files and Batches
+    # ----------------------------------------------------------------------
+    def _new_id(self, prefix):
+        with self._lock:
+            return f"{prefix}-mock-{next(self._ids)}"
+
+    def add_file(self, content, filename, purpose):
+        file_id = self._new_id("file")
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "content": content
+        }
+        return self._public(self.files[file_id])
+
+    def create_batch(self, params):
+        lines = self.files[params["input_file_id"]]["content"].decode("utf-8").splitlines()
+        batch_id = self._new_id("batch")
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": params["endpoint"],
+            "input_file_id": params["input_file_id"],
+            "completion_window": params["completion_window"],
+            "status": BATCH_STATUSES[0],
+            "created_at": int(time.time()),
+            "metadata": params.get("metadata"),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": len([l for l in lines if l.strip()]), "completed": 0, "failed": 0}
+        }
+        return self.batches[batch_id]
+
+    def advance_batch(self, batch_id):
+        """
+        Moves a batch to its next status, writing its output files on completion.
+        """
+        batch = self.batches[batch_id]
+        if batch["status"] not in BATCH_STATUSES[:-1]:
+            return batch
+        batch["status"] = BATCH_STATUSES[BATCH_STATUSES.index(batch["status"]) + 1]
+        if batch["status"] != "completed":
+            return batch
+
+        outputs, errors = [], []
+        content = self.files[batch["input_file_id"]]["content"].decode("utf-8")
+        for number, line in enumerate(l for l in content.splitlines() if l.strip()):
+            request = json.loads(line)
+            if request["custom_id"] in self.fail_ids:
+                errors.append({"id": f"req-{number}", "custom_id": request["custom_id"], "response": {
+                    "status_code": 500, "body": {"error": {"message": "Mock failure"}}}, "error": None})
+            else:
+                outputs.append({"id": f"req-{number}", "custom_id": request["custom_id"], "response": {
+                    "status_code": 200, "body": _completion_body(request["body"], number)}, "error": None})
+
+        for records, field in ((outputs, "output_file_id"), (errors, "error_file_id")):
+            if records:
+                data = "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+                batch[field] = self.add_file(data, f"{batch_id}_{field}.jsonl", "batch_output")["id"]
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        batch["completed_at"] = int(time.time())
+        return batch
+
+    @staticmethod
+    def _public(file_record):
+        return {k: v for k, v in file_record.items() if k != "content"}
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _not_found(self):
+                self._send(404, {"error": {"message": f"No route for {self.command} {self.path}"}})
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _chat_completion(self):
+                request = json.loads(self._body())
+                number, delay, failed = mock.draw_completion()
+                if failed:
+                    time.sleep(delay)
+                    return self._send(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+
+                completion = _completion_body(request, number)
+                if not request.get("stream"):
+                    time.sleep(delay)
+                    return self._send(200, completion)
+
+                # No Content-Length: the event stream ends when the connection closes
+                include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+                events = _stream_events(completion, include_usage)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for event in events:
+                    time.sleep(delay / len(events))
+                    self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def do_POST(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts == ["v1", "chat", "completions"]:
+                    self._chat_completion()
+                elif parts == ["v1", "files"]:
+                    form = email.parser.BytesParser().parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + self._body()
+                    )
+                    fields = {part.get_param("name", header="content-disposition"): part for part in form.get_payload()}
+                    upload = fields["file"]
+                    self._send(200, mock.add_file(
+                        upload.get_payload(decode=True),
+                        upload.get_filename() or "upload.jsonl",
+                        fields["purpose"].get_payload(decode=True).decode("utf-8")
+                    ))
+                elif parts == ["v1", "batches"]:
+                    self._send(200, mock.create_batch(json.loads(self._body())))
+                elif parts[:2] == ["v1", "batches"] and len(parts) == 4 and parts[3] == "cancel":
+                    self._body()
+                    batch = mock.batches.get(parts[2])
+                    if batch is None:
+                        return self._not_found()
+                    batch["status"] = "cancelled"
+                    self._send(200, batch)
+                else:
+                    self._not_found()
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in mock.batches:
+                    self._send(200, mock.advance_batch(parts[2]))
+                elif parts[:2] == ["v1", "files"] and len(parts) >= 3 and parts[2] in mock.files:
+                    if parts[3:] == ["content"]:
+                        self._send(200, mock.files[parts[2]]["content"], "application/octet-stream")
+                    else:
+                        self._send(200, mock._public(mock.files[parts[2]]))
+                else:
+                    self._not_found()
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the mock OpenAI Chat Completions/Files/Batch API locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per chat completion")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of completions failing with HTTP 500")
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate
+    ).start()
+    print(f"Mock OpenAI API at {server.url} (set OPENAI_BASE_URL to use it); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import json
+import random
 import re
 
 def parse_response(raw_response):
@@ -79,3 +80,246 @@ def extract_array_from_response(data):
         return None, f"Response is a dict but doesn't contain an array. Keys: {list(data.keys())}"
 
     return None, f"Response is neither array nor dict. Type: {type(data)}"
+
+
+def parse_stage_items(raw_response, wrapper_key):
+    """
+    Parses one Sequential Batch stage response into its list of items.
+    Prefers the explicit wrapper key ("questions", "distractors", "validations")
+    and falls back to extract_array_from_response for other shapes.
+    Returns (items, error_message).
+    """
+    data, error = parse_response(raw_response)
+    if error:
+        return None, error
+
+    if isinstance(data, dict) and isinstance(data.get(wrapper_key), list):
+        return data[wrapper_key], None
+
+    return extract_array_from_response(data)
+
+
+def salvage_array_items(raw_response):
+    """
+    Recovers the complete items from a stage response that is not valid JSON, e.g. one
+    cut off at max_tokens mid-item: every object in the first array that closed before
+    the damage is returned, and the partial tail is dropped.
+    """
+    if not raw_response or raw_response.startswith("Error:"):
+        return []
+
+    parser = IncrementalArrayParser()
+    parser.feed(raw_response)
+    return [item for item in parser.items if isinstance(item, dict)]
+
+
+def align_by_item_number(job_ids, items):
+    """
+    Orders stage items to match job_ids using their "Item Number".
+    Items whose number matches no job (e.g. the model renumbered them "1", "2"...)
+    fill the remaining slots in the order they arrived and are relabelled with the job_id.
+    Returns a list the same length as job_ids, with None where no item is available.
+    """
+    aligned = [None] * len(job_ids)
+    positions = {job_id: i for i, job_id in enumerate(job_ids)}
+    leftovers = []
+
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        index = positions.get(str(item.get("Item Number", "")).strip())
+        if index is not None and aligned[index] is None:
+            aligned[index] = item
+        else:
+            leftovers.append(item)
+
+    for index in range(len(aligned)):
+        if aligned[index] is None and leftovers:
+            aligned[index] = dict(leftovers.pop(0), **{"Item Number": job_ids[index]})
+
+    return aligned
+
+
+BLANK = "____"
+
+# Straight and curly apostrophes are interchangeable ("didn't" / "didn’t")
+_APOSTROPHES = "'\u2019"
+
+
+def _answer_pattern(answer):
+    """
+    Whole-word, case-insensitive pattern for an answer: it may not start or end inside
+    a word (a hyphenated compound counts as one word), runs of whitespace match any
+    whitespace, and apostrophes match either form.
+    """
+    parts = []
+    for char in " ".join(answer.split()):
+        if char == " ":
+            parts.append(r"\s+")
+        elif char in _APOSTROPHES:
+            parts.append(f"[{_APOSTROPHES}]")
+        else:
+            parts.append(re.escape(char))
+    return re.compile(
+        r"(?<![\w" + _APOSTROPHES + r"])(?<!\w-)" + "".join(parts) + r"(?![\w" + _APOSTROPHES + r"])(?!-\w)",
+        re.IGNORECASE
+    )
+
+
+def answer_spans(sentence, answer):
+    """
+    (start, end) character spans of every whole-word occurrence of answer in sentence.
+
+    >>> answer_spans("She has a cat.", "a")
+    [(8, 9)]
+    >>> answer_spans("The dog saw another dog.", "dog")
+    [(4, 7), (20, 23)]
+    >>> answer_spans("I will be there.", "Will")
+    [(2, 6)]
+    >>> answer_spans("It's going   to rain.", "going to")
+    [(5, 15)]
+    >>> answer_spans("She didn’t come.", "didn't")
+    [(4, 10)]
+    >>> answer_spans("He isn't here.", "is")
+    []
+    >>> answer_spans("A well-known author.", "known")
+    []
+    >>> answer_spans("It costs $5.", "$5")
+    [(9, 11)]
+    >>> answer_spans("Nothing here.", "")
+    []
+    """
+    sentence, answer = str(sentence or ""), str(answer or "").strip()
+    if not answer:
+        return []
+    return [match.span() for match in _answer_pattern(answer).finditer(sentence)]
+
+
+def blank_answer(sentence, answer, blank=BLANK):
+    """
+    Replaces exactly one whole-word occurrence of answer with the blank, never a match
+    inside another word and whatever its case. When the answer occurs more than once
+    the first occurrence is blanked; validator flags such items.
+    Returns (question_prompt, occurrences); with no occurrence the sentence is unchanged.
+
+    >>> blank_answer("She has a cat.", "a")
+    ('She has ____ cat.', 1)
+    >>> blank_answer("Have you ever been to Paris?", "have")
+    ('____ you ever been to Paris?', 1)
+    >>> blank_answer("I have lived here since 2010.", "since")
+    ('I have lived here ____ 2010.', 1)
+    >>> blank_answer("The dog saw another dog.", "dog")
+    ('The ____ saw another dog.', 2)
+    >>> blank_answer("She went home.", "go")
+    ('She went home.', 0)
+    """
+    sentence = str(sentence or "")
+    spans = answer_spans(sentence, answer)
+    if not spans:
+        return sentence, 0
+    start, end = spans[0]
+    return sentence[:start] + blank + sentence[end:], len(spans)
+
+
+def assemble_sequential_questions(stage1_items, stage2_items):
+    """
+    Combines aligned Stage 1 (sentence + answer) and Stage 2 (distractors) items
+    into final questions: blanks the answer, shuffles the options and letters the key.
+    Pairs with a missing side are skipped.
+    """
+    questions = []
+    for stage1_data, stage2_data in zip(stage1_items, stage2_items):
+        if stage1_data is None or stage2_data is None:
+            continue
+
+        complete_sentence = stage1_data.get("Complete Sentence", "")
+        correct_answer = stage1_data.get("Correct Answer", "")
+        question_prompt, _ = blank_answer(complete_sentence, correct_answer)
+
+        options = [
+            stage2_data.get("Distractor A", ""),
+            stage2_data.get("Distractor B", ""),
+            stage2_data.get("Distractor C", ""),
+            correct_answer
+        ]
+        random.shuffle(options)
+        correct_letter = chr(65 + options.index(correct_answer))
+
+        questions.append({
+            "Item Number": stage1_data.get("Item Number", ""),
+            "Assessment Focus": stage1_data.get("Assessment Focus", ""),
+            "Question Prompt": question_prompt,
+            "Answer A": options[0],
+            "Answer B": options[1],
+            "Answer C": options[2],
+            "Answer D": options[3],
+            "Correct Answer": correct_letter,
+            "CEFR rating": stage1_data.get("CEFR rating", ""),
+            "Category": stage1_data.get("Category", "")
+        })
+    return questions
+
+
+class IncrementalArrayParser:
+    """
+    Incremental parser for streamed stage responses such as {"questions": [{...}, {...}]}.
+
+    feed() takes the next chunk of completion text and returns the objects from the
+    first array in the response that closed within that chunk, so each item can be used
+    as soon as its closing brace arrives instead of after the whole response.
+    Strings and escapes are tracked, so braces inside values do not confuse it.
+    """
+
+    def __init__(self):
+        self.items = []
+        self._buffer = []
+        self._position = 0
+        self._depth = 0
+        self._array_depth = None
+        self._array_closed = False
+        self._item_start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        self._buffer.append(text)
+        if len(self._buffer) > 1:
+            self._buffer = ["".join(self._buffer)]
+        buffer = self._buffer[0]
+
+        new_items = []
+        for index in range(self._position, len(buffer)):
+            char = buffer[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._array_depth is None and self._depth <= 2:
+                    self._array_depth = self._depth
+                elif char == "{" and not self._array_closed and self._array_depth is not None \
+                        and self._depth == self._array_depth + 1:
+                    self._item_start = index
+            elif char in "}]":
+                if char == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        new_items.append(json.loads(buffer[self._item_start:index + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif char == "]" and self._depth == self._array_depth:
+                    self._array_closed = True
+                self._depth -= 1
+
+        self._position = len(buffer)
+        self.items.extend(new_items)
+        return new_items
@@ -0,0 +1,550 @@
+"""
+Headless batch generation pipeline.
+
+generate_batch() runs a planned job list through any of the three strategies without
+Streamlit; the app and the command line are thin clients on top of it.
+
+Usage:
+    python pipeline.py spec.json --output questions.csv
+    python pipeline.py spec.json --output questions.jsonl --max-in-flight 16 --no-cache
+    python pipeline.py spec.json --output questions.csv --run-dir runs/overnight
+    python pipeline.py --resume runs/overnight --output questions.csv
+    python pipeline.py spec.json --output questions.csv --bulk --run-dir runs/bank_build
+    python pipeline.py spec.json --output questions.csv --telemetry spans.jsonl -v
+
+--bulk sends every request through the OpenAI Batch API (batch_api). Against the
+local mock server (python mock_llm.py, then OPENAI_BASE_URL=http://127.0.0.1:8765/v1)
+the whole flow runs without the network.
+
+The spec file is a JSON object, or a list of them for several batches in one run.
+Each object either lists its jobs explicitly:
+    {"strategy": "Holistic (1-Call)", "jobs": [{"job_id": "GA2-1", "type": "Grammar", ...}]}
+or gives the arguments for test_planner.create_job_list:
+    {"total_questions": 50, "q_type": "Grammar", "cefr_target": "B1",
+     "selected_focus_list": ["Conditionals (Type 1 & 2)"], "context_topic": "",
+     "generation_strategy": "Sequential Batch (3-Call)"}
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import pandas as pd
+import batch_api
+import dedup
+import example_bank
+import item_store
+import test_planner
+import llm_service
+import job_runner
+import checkpoint
+import metrics
+import telemetry
+import token_budget
+
+STRATEGIES = ("Sequential Batch (3-Call)", "Holistic (1-Call)", "Segmented (2-Call)")
+
+# How many times near-duplicate questions are regenerated before they are reported
+MAX_DEDUP_ROUNDS = 2
+
+
+# --------------------------------------------------------------------------
+# Inputs
+# --------------------------------------------------------------------------
+def load_example_banks(grammar_path="grammar_bank.csv", vocab_path="vocab_bank.csv", store=None):
+    """
+    Loads the few-shot example banks, dropping the unused GSE Score column, and
+    builds the example index the prompts draw from. With an item_store.ItemStore,
+    the items accepted in the Refinement Workshop are added to the banks.
+    """
+    df_g = pd.read_csv(grammar_path)
+    df_v = pd.read_csv(vocab_path)
+
+    if "GSE Score" in df_g.columns:
+        df_g = df_g.drop(columns=["GSE Score"])
+    if "GSE Score" in df_v.columns:
+        df_v = df_v.drop(columns=["GSE Score"])
+
+    example_banks = {"grammar": df_g, "vocab": df_v}
+
+    if store is not None:
+        accepted = pd.DataFrame(store.example_rows())
+        if "Category" in accepted.columns:
+            for bank_key, q_type in (("grammar", "grammar"), ("vocab", "vocabulary")):
+                extra = accepted[accepted["Category"].astype(str).str.strip().str.lower() == q_type]
+                if not extra.empty:
+                    bank = example_banks[bank_key].rename(columns=example_bank.normalise_column)
+                    example_banks[bank_key] = pd.concat([bank, extra[bank.columns.intersection(extra.columns)]],
+                                                        ignore_index=True)
+
+    example_banks["index"] = example_bank.ExampleIndex.from_banks(example_banks)
+    return example_banks
+
+
+def jobs_from_spec(spec):
+    """
+    Turns one spec object into (job_list, strategy).
+    """
+    if "jobs" in spec:
+        strategy = spec.get("strategy") or spec["jobs"][0].get("strategy")
+        job_list = [dict(job, strategy=strategy) for job in spec["jobs"]]
+    else:
+        job_list = test_planner.create_job_list(
+            total_questions=spec["total_questions"],
+            q_type=spec["q_type"],
+            cefr_target=spec["cefr_target"],
+            selected_focus_list=spec["selected_focus_list"],
+            context_topic=spec.get("context_topic", ""),
+            generation_strategy=spec["generation_strategy"]
+        )
+        strategy = spec["generation_strategy"]
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+    return job_list, strategy
+
+
+# --------------------------------------------------------------------------
+# Generation
+# --------------------------------------------------------------------------
+def open_run(run_dir, job_list, strategy, chunk_size=None):
+    """
+    Opens the checkpoint store in run_dir, creating it for this job list if it is new.
+    """
+    if os.path.exists(os.path.join(run_dir, checkpoint.MANIFEST_FILE)):
+        return checkpoint.RunStore.open(run_dir)
+    return checkpoint.RunStore.create(run_dir, job_list, strategy, {"chunk_size": chunk_size})
+
+
+def generate_batch(job_list, strategy, example_banks, api_key, llm=None, max_in_flight=job_runner.DEFAULT_MAX_IN_FLIGHT,
+                   chunk_size=None, use_cache=True, on_progress=None, on_item=None, on_question=None, log=None,
+                   run_dir=None, store=None, dedup_threshold=dedup.DEFAULT_THRESHOLD, cancel=None,
+                   batch_overview=None):
+    """
+    Generates questions for a planned job list with the given strategy.
+
+    Returns a dict with:
+        "questions": final question dicts in job order (shuffled options, lettered key)
+        "stage1" / "stage2" / "stage3": Sequential Batch stage items (empty otherwise)
+        "chunks": per-chunk states with raw responses (Sequential Batch only)
+        "errors": list of {"scope": ..., "error": ...} for failed jobs or chunks
+        "duplicates": questions still near-duplicated after regeneration
+
+    on_progress(completed, total, message), on_item(stage_name, item) and
+    on_question(question) are called from the calling thread; on_question gets each
+    final question as soon as its job (or Sequential Batch chunk) is done, before
+    near-duplicate regeneration. log(line) receives the debug trace.
+    With run_dir, every stage result is checkpointed there; calling again with the
+    same run_dir (or resume_batch) re-issues only the stages that failed or never ran.
+    With an item_store.ItemStore, accepted questions (all but those Stage 3 marked
+    "Requires Revision") are added to the item bank.
+    Questions that near-duplicate an earlier one in the batch, or an item already in
+    the bank, are regenerated on their own (dedup_threshold=None turns this off); any
+    still duplicated are listed in result["duplicates"].
+    When called inside telemetry.collect(), the run's spans are also written to
+    run_dir/telemetry.jsonl.
+    Setting the threading.Event cancel stops further LLM calls: unsent stages fail with
+    "Error: Cancelled.", the questions finished so far are returned, and resuming the
+    run re-issues the rest.
+    batch_overview overrides the Sequential Batch summary of the other chunks' topics
+    (test_planner.describe_other_chunks), for jobs generated apart from their batch.
+    Holistic and Segmented questions are numbered with their job_id.
+    """
+    started = time.time()
+    log = log or (lambda line: None)
+    custom_llm = llm
+    llm = llm or functools.partial(llm_service.call_llm, use_cache=use_cache)
+    if cancel is not None:
+        llm = job_runner.cancellable(llm, cancel)
+
+    if strategy == "Sequential Batch (3-Call)":
+        chunk_size = chunk_size or token_budget.plan_chunk_size()
+
+    checkpoint_store = None
+    if run_dir:
+        checkpoint_store = open_run(run_dir, job_list, strategy, chunk_size)
+        # A resumed run must keep its original chunk boundaries
+        chunk_size = checkpoint_store.manifest["settings"].get("chunk_size") or chunk_size
+        log(f"Checkpointing to {run_dir} ({checkpoint_store.summary()['completed_units']} stage results already saved)")
+
+    result = {
+        "questions": [],
+        "stage1": [],
+        "stage2": [],
+        "stage3": [],
+        "chunks": [],
+        "errors": [],
+        "duplicates": [],
+        "run_dir": run_dir
+    }
+
+    if strategy == "Sequential Batch (3-Call)":
+        chunk_count = len(test_planner.chunk_job_list(job_list, chunk_size))
+
+        log("=" * 80)
+        log("SEQUENTIAL BATCH MODE - STARTING")
+        log(f"Batch size: {len(job_list)} questions")
+        log(f"Chunks: {chunk_count} (max {chunk_size} questions each)")
+        log("=" * 80)
+
+        def report_chunk(completed, total, jobs, chunk_result):
+            if on_question:
+                for question in chunk_result["questions"]:
+                    on_question(question)
+            if on_progress:
+                on_progress(completed, total, f"Completed chunk {completed} of {total} (3 stages each)...")
+
+        batch_result = job_runner.run_sequential_batch(
+            job_list,
+            example_banks,
+            api_key,
+            llm=llm,
+            max_in_flight=max_in_flight,
+            chunk_size=chunk_size,
+            on_progress=report_chunk,
+            on_item=on_item,
+            checkpoint=checkpoint_store,
+            batch_overview=batch_overview
+        )
+
+        for chunk_result in batch_result["chunks"]:
+            chunk_number = chunk_result["chunk_index"] + 1
+            log(f"\n--- CHUNK {chunk_number}: {len(chunk_result['jobs'])} jobs ---")
+            for line in chunk_result["logs"]:
+                log(line)
+            if chunk_result["error"]:
+                log(f"CHUNK {chunk_number} ERROR: {chunk_result['error']}")
+                result["errors"].append({"scope": f"Chunk {chunk_number}", "error": chunk_result["error"]})
+                continue
+
+            unrecovered = [
+                job["job_id"] for job, s1, s2 in zip(chunk_result["jobs"], chunk_result["stage1"], chunk_result["stage2"])
+                if s1 is None or s2 is None
+            ]
+            if unrecovered:
+                result["errors"].append({
+                    "scope": f"Chunk {chunk_number}",
+                    "error": f"No question for {', '.join(unrecovered)} after {job_runner.MAX_REPAIR_ATTEMPTS} repair attempts"
+                })
+
+        log("\n--- FINAL ASSEMBLY ---")
+        for question in batch_result["questions"]:
+            log(f"Assembled question: {question['Item Number']}")
+        log(f"\nTOTAL QUESTIONS ASSEMBLED: {len(batch_result['questions'])}")
+
+        for key in ("questions", "stage1", "stage2", "stage3", "chunks"):
+            result[key] = batch_result[key]
+
+    else:
+        # Holistic / Segmented: independent jobs, run with bounded concurrency
+        run_job = job_runner.get_job_fn(strategy, example_banks, api_key, llm=llm, checkpoint=checkpoint_store)
+
+        def job_fn(job):
+            # A one-question call may leave out or renumber "Item Number"; the job knows it
+            question_data, error = run_job(job)
+            if isinstance(question_data, dict):
+                question_data = dict(question_data, **{"Item Number": job["job_id"]})
+            return question_data, error
+
+        def report_job(completed, total, job, job_result):
+            question_data, error = job_result
+            if on_question and not error:
+                on_question(question_data)
+            if on_progress:
+                on_progress(completed, total, f"Completed question {completed} of {total} ({job['job_id']})...")
+
+        log(f"{strategy.upper()} - {len(job_list)} jobs, {max_in_flight} in parallel")
+        job_results = job_runner.run_jobs_concurrently(job_list, job_fn, max_in_flight=max_in_flight, on_progress=report_job)
+
+        for job, (question_data, error) in zip(job_list, job_results):
+            if error:
+                log(f"Job {job['job_id']} FAILED: {error}")
+                result["errors"].append({"scope": f"Job {job['job_id']}", "error": error})
+            else:
+                result["questions"].append(question_data)
+
+        log(f"\nTOTAL QUESTIONS GENERATED: {len(result['questions'])}")
+
+    if dedup_threshold and result["questions"]:
+        overview = None
+        if strategy == "Sequential Batch (3-Call)":
+            # The regenerated jobs steer away from the whole batch, not just each other
+            overview = test_planner.describe_other_chunks(test_planner.chunk_job_list(job_list, chunk_size))
+
+        def regenerate(jobs):
+            return generate_batch(jobs, strategy, example_banks, api_key, llm=custom_llm, max_in_flight=max_in_flight,
+                                  chunk_size=chunk_size, use_cache=False, log=log, dedup_threshold=None, cancel=cancel,
+                                  batch_overview=overview)
+
+        bank = dedup.get_bank_index(store, dedup_threshold) if store is not None else None
+        remove_duplicates(result, job_list, regenerate, bank, dedup_threshold, log)
+
+    if checkpoint_store:
+        checkpoint_store.finish(len(result["questions"]), len(result["errors"]))
+    trace = telemetry.current_trace()
+    if run_dir and trace is not None:
+        trace.export_jsonl(os.path.join(run_dir, telemetry.TRACE_FILE), since=started)
+    if store is not None and result["questions"]:
+        ingest_questions(store, result, job_list, strategy, log)
+    token_budget.get_history().save()
+    return result
+
+
+def remove_duplicates(result, job_list, regenerate, bank_index=None, threshold=dedup.DEFAULT_THRESHOLD, log=None):
+    """
+    Regenerates only the jobs whose questions near-duplicate an earlier question of the
+    batch or an item in bank_index, up to MAX_DEDUP_ROUNDS times, and swaps the new
+    questions (and their stage items) into result in place; the retries' errors are
+    added to result["errors"].
+    regenerate(jobs) must return a generate_batch result for just those jobs.
+    """
+    log = log or (lambda line: None)
+    jobs_by_id = {job["job_id"]: job for job in job_list}
+    duplicates = dedup.find_duplicates(result["questions"], bank_index, threshold)
+
+    for round_number in range(1, MAX_DEDUP_ROUNDS + 1):
+        if not duplicates:
+            break
+
+        duplicate_ids = [str(result["questions"][position].get("Item Number", "")) for position in duplicates]
+        metrics.increment("dedup.duplicates", len(duplicate_ids))
+        log(f"Near-duplicates (round {round_number}): {', '.join(duplicate_ids)}; regenerating them")
+
+        retry = regenerate([jobs_by_id[job_id] for job_id in duplicate_ids if job_id in jobs_by_id])
+        for error in retry["errors"]:
+            log(f"Regeneration FAILED for {error['scope']}: {error['error']}")
+            result["errors"].append({"scope": f"{error['scope']} (regenerating)", "error": error["error"]})
+        for key in ("questions", "stage1", "stage2", "stage3"):
+            replacements = {item.get("Item Number"): item for item in retry[key]}
+            result[key] = [replacements.get(item.get("Item Number"), item) for item in result[key]]
+        metrics.increment("dedup.regenerated", len(retry["questions"]))
+        # Checked again after every round, so what is reported is the final questions' state
+        duplicates = dedup.find_duplicates(result["questions"], bank_index, threshold)
+
+    result["duplicates"] = [
+        {
+            "Item Number": result["questions"][position].get("Item Number", ""),
+            "duplicate_of": f"{source} {key}" if source == "batch" else "item bank",
+            "similarity": round(score, 2)
+        }
+        for position, ((source, key), score) in duplicates.items()
+    ]
+    for duplicate in result["duplicates"]:
+        log(f"Still a near-duplicate after {MAX_DEDUP_ROUNDS} rounds: {duplicate['Item Number']} "
+            f"({duplicate['duplicate_of']}, similarity {duplicate['similarity']})")
+
+
+def ingest_questions(store, result, job_list, strategy, log=None):
+    """
+    Adds a generate_batch result's accepted questions to the item bank.
+    """
+    statuses = {v.get("Item Number"): v.get("Overall Quality", "") for v in result["stage3"]}
+    accepted = [q for q in result["questions"] if statuses.get(q.get("Item Number")) != "Requires Revision"]
+    run_id = os.path.basename(os.path.normpath(result["run_dir"])) if result["run_dir"] else None
+    inserted, skipped = store.ingest(accepted, "generator", jobs=job_list, strategy=strategy, run_id=run_id,
+                                     statuses=statuses)
+    if log:
+        log(f"Item bank: added {inserted} questions ({skipped} already stored, "
+            f"{len(result['questions']) - len(accepted)} flagged for revision)")
+
+
+def estimate_batch(job_list, strategy, example_banks, chunk_size=None):
+    """
+    Pre-flight token and cost estimate for generate_batch with the same arguments.
+    """
+    return token_budget.estimate_batch(job_list, strategy, example_banks, chunk_size)
+
+
+def format_estimate(estimate):
+    return (
+        f"~{estimate['calls']} calls, ~{estimate['input_tokens']:,} input + "
+        f"~{estimate['output_tokens']:,} output tokens, ~${estimate['cost']:.2f}"
+    )
+
+
+def format_span_row(row):
+    """
+    One line of a telemetry.summarise() row for the CLI.
+    """
+    text = (f"{row['span']:<8} {row['stage'] or '-':<10} n={row['count']:<5} errors={row['errors']:<3} "
+            f"p50={row['p50_s']:.3f}s p95={row['p95_s']:.3f}s")
+    if row["mean_queue_wait_s"] is not None:
+        text += f" queue={row['mean_queue_wait_s']:.3f}s"
+    if row["mean_ttft_s"] is not None:
+        text += f" ttft={row['mean_ttft_s']:.3f}s"
+    if row["prompt_tokens"] or row["completion_tokens"]:
+        text += (f" tokens={row['prompt_tokens']}/{row['completion_tokens']} "
+                 f"(cached {row['cached_tokens']}) ${row.get('cost_usd', 0):.4f}")
+    return text
+
+
+def resume_batch(run_dir, example_banks, api_key, **kwargs):
+    """
+    Re-runs a checkpointed batch from its run directory, skipping completed stages.
+    Accepts the same keyword arguments as generate_batch.
+    """
+    store = checkpoint.RunStore.open(run_dir)
+    return generate_batch(
+        store.manifest["job_list"],
+        store.manifest["strategy"],
+        example_banks,
+        api_key,
+        run_dir=run_dir,
+        **kwargs
+    )
+
+
+# --------------------------------------------------------------------------
+# Outputs
+# --------------------------------------------------------------------------
+def write_questions(questions, path):
+    """
+    Writes questions to CSV, or to JSONL when the path ends in .jsonl.
+    """
+    if path.lower().endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for question in questions:
+                f.write(json.dumps(question, ensure_ascii=False) + "\n")
+    else:
+        pd.DataFrame(questions).to_csv(path, index=False)
+
+
+# --------------------------------------------------------------------------
+# Command Line
+# --------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate test questions without the Streamlit app.")
+    parser.add_argument("spec", nargs="?", help="JSON job spec file (object or list of objects)")
+    parser.add_argument("--output", "-o", required=True, help="Output path (.csv or .jsonl)")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"),
+                        help="Defaults to the OPENAI_API_KEY environment variable")
+    parser.add_argument("--api-keys", default=os.environ.get("OPENAI_API_KEYS"),
+                        help="Comma-separated keys to route requests across (defaults to OPENAI_API_KEYS)")
+    parser.add_argument("--stage-model", action="append", default=[], metavar="STAGE=MODEL[,MODEL]",
+                        help="Models for a stage when routing, e.g. stage2=gpt-4o-mini,gpt-4-turbo-preview")
+    parser.add_argument("--max-in-flight", type=int, default=job_runner.DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--run-dir", help="Checkpoint every stage result under this directory")
+    parser.add_argument("--resume", metavar="RUN_DIR",
+                        help="Resume the checkpointed batches in RUN_DIR instead of reading a spec")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Send the requests through the OpenAI Batch API (slow, half price); implies checkpointing")
+    parser.add_argument("--poll-interval", type=float, default=batch_api.DEFAULT_POLL_INTERVAL,
+                        help="Seconds between Batch API status checks in --bulk mode")
+    parser.add_argument("--item-bank", nargs="?", const=item_store.DEFAULT_STORE_PATH,
+                        help="Add accepted questions to this item bank (default path if no value)")
+    parser.add_argument("--telemetry", metavar="PATH", help="Write every timing/token span to this JSONL file")
+    parser.add_argument("--otel", action="store_true", help="Also send the spans to OpenTelemetry")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print the debug trace")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("No API key: pass --api-key or set OPENAI_API_KEY.")
+    if bool(args.spec) == bool(args.resume):
+        parser.error("Pass either a spec file or --resume RUN_DIR.")
+
+    stage_models = None
+    if args.stage_model:
+        stage_models = dict(llm_service.DEFAULT_STAGE_MODELS)
+        for entry in args.stage_model:
+            stage, _, models = entry.partition("=")
+            if not models:
+                parser.error(f"--stage-model expects STAGE=MODEL, got {entry!r}")
+            stage_models[stage.strip()] = tuple(m.strip() for m in models.split(",") if m.strip())
+    api_keys = [args.api_key] + [k.strip() for k in (args.api_keys or "").split(",") if k.strip()]
+    if len(set(api_keys)) > 1 or stage_models:
+        llm_service.configure_router(api_keys, stage_models)
+    if args.otel and not telemetry.enable_opentelemetry():
+        parser.error("--otel needs the opentelemetry-api package (and an SDK/exporter to send anywhere).")
+
+    with telemetry.collect() as trace:
+        return _run_batches(args, trace)
+
+
+def _run_batches(args, trace):
+    """
+    Plans and generates every batch of a command-line run, recording spans into trace.
+    """
+    # Each batch becomes (job_list, strategy, run_dir)
+    batches = []
+    if args.resume:
+        run_dirs = [run["run_dir"] for run in checkpoint.list_runs(args.resume)]
+        if os.path.exists(os.path.join(args.resume, checkpoint.MANIFEST_FILE)):
+            run_dirs = [args.resume]
+        for run_dir in sorted(run_dirs):
+            run_store = checkpoint.RunStore.open(run_dir)
+            batches.append((run_store.manifest["job_list"], run_store.manifest["strategy"], run_dir))
+    else:
+        with open(args.spec, encoding="utf-8") as f:
+            specs = json.load(f)
+        if isinstance(specs, dict):
+            specs = [specs]
+        for spec_index, spec in enumerate(specs):
+            with telemetry.span("plan") as planning:
+                job_list, strategy = jobs_from_spec(spec)
+                planning.set(jobs=len(job_list), strategy=strategy)
+            run_dir = os.path.join(args.run_dir, f"batch_{spec_index + 1:03d}") if args.run_dir else None
+            batches.append((job_list, strategy, run_dir))
+
+    store = item_store.ItemStore(args.item_bank) if args.item_bank else None
+    example_banks = load_example_banks(store=store)
+    log = (lambda line: print(line, file=sys.stderr)) if args.verbose else None
+
+    def show_progress(completed, total, message):
+        print(message, file=sys.stderr)
+
+    all_questions = []
+    failures = 0
+    for batch_index, (job_list, strategy, run_dir) in enumerate(batches):
+        print(f"Batch {batch_index + 1}/{len(batches)}: {len(job_list)} jobs, {strategy}", file=sys.stderr)
+        estimate = estimate_batch(job_list, strategy, example_banks, args.chunk_size)
+        print(f"Estimate: {format_estimate(estimate)}", file=sys.stderr)
+
+        llm, max_in_flight = None, args.max_in_flight
+        if args.bulk:
+            run_dir = run_dir or checkpoint.new_run_dir(label="bulk")
+            llm = batch_api.BatchCollector(
+                llm_service.get_client(args.api_key), run_dir, poll_interval=args.poll_interval,
+                log=lambda line: print(line, file=sys.stderr)
+            )
+            max_in_flight = min(max(len(job_list), 1), batch_api.BULK_MAX_IN_FLIGHT)
+
+        result = generate_batch(
+            job_list,
+            strategy,
+            example_banks,
+            args.api_key,
+            llm=llm,
+            max_in_flight=max_in_flight,
+            chunk_size=args.chunk_size,
+            use_cache=not args.no_cache,
+            on_progress=show_progress,
+            log=log,
+            run_dir=run_dir,
+            store=store
+        )
+        for error in result["errors"]:
+            print(f"{error['scope']} failed: {error['error']}", file=sys.stderr)
+        for duplicate in result["duplicates"]:
+            print(f"{duplicate['Item Number']} is a near-duplicate of {duplicate['duplicate_of']}", file=sys.stderr)
+
+        all_questions.extend(result["questions"])
+        failures += len(result["errors"])
+
+    with telemetry.span("export", path=args.output):
+        write_questions(all_questions, args.output)
+    print(f"Wrote {len(all_questions)} questions to {args.output} ({failures} failures)", file=sys.stderr)
+    if args.telemetry:
+        print(f"Wrote {trace.export_jsonl(args.telemetry)} telemetry spans to {args.telemetry}", file=sys.stderr)
+    if args.verbose:
+        for name, value in metrics.snapshot().items():
+            print(f"  {name}: {value}", file=sys.stderr)
+        for row in trace.summary(token_budget.MODEL_LIMITS):
+            print(f"  {format_span_row(row)}", file=sys.stderr)
+    return 0 if all_questions else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,136 +1,48 @@
+import functools
 import json
 import pandas as pd
+import example_bank
+import output_formatter
+
+_encode_string = json.encoder.encode_basestring_ascii
 
 
 # --------------------------------------------------------------------------
 # Helper: Get Examples
 # --------------------------------------------------------------------------
-def get_few_shot_examples(job, example_banks):
+def get_few_shot_examples(job, example_banks, seed=example_bank.DEFAULT_SEED):
     """
-    Retrieves 2-3 examples from the CSV based on CEFR and Type.
-    Robustly handles column name mismatches (e.g., extra spaces).
+    Retrieves the 2 examples nearest to the job's focus and topic (same type, preferring
+    its CEFR level) from the pre-serialised example index. Any shortfall is a draw
+    seeded per job, so rebuilding a prompt gives the same examples.
     """
-    bank = example_banks.get(job['type'].lower())
-    if bank is None or bank.empty: 
-        return ""
-    
-    bank.columns = [c.strip() for c in bank.columns]
-    
-    if 'CEFR rating' in bank.columns:
-        relevant = bank[bank['CEFR rating'].astype(str).str.strip() == str(job['cefr']).strip()]
-    else:
-        relevant = bank
+    return example_bank.get_index(example_banks).examples_for(job, seed=seed)
 
-    if len(relevant) >= 2:
-        samples = relevant.sample(2)
-    elif len(bank) >= 2:
-        samples = bank.sample(2) 
-    else:
-        return "" 
-
-    output = ""
-    for _, row in samples.iterrows():
-        ex_dict = {
-            "Question Prompt": row.get("Question Prompt", "N/A"),
-            "Answer A": row.get("Answer A", "N/A"),
-            "Answer B": row.get("Answer B", "N/A"),
-            "Answer C": row.get("Answer C", "N/A"),
-            "Answer D": row.get("Answer D", "N/A"),
-            "Correct Answer": row.get("Correct Answer", "N/A")
-        }
-        output += "### EXAMPLE:\n" + json.dumps(ex_dict) + "\n\n"
-    return output
-
-
-# --------------------------------------------------------------------------
-# Strategy: Sequential BATCH MODE (3-Call) - SPLIT ARCHITECTURE
-# --------------------------------------------------------------------------
 
-def create_sequential_batch_stage1_prompt(job_list, example_banks):
+def get_batch_few_shot_examples(job_list, example_banks, seed=example_bank.DEFAULT_SEED):
     """
-    Generates complete sentences with correct answers and context clues for ALL jobs at once.
-    ENHANCED: Includes multi-word phrase splitting strategy and distinguishes between 
-    grammatical versus semantic constraint requirements.
+    Like get_few_shot_examples, but picks the 2 examples closest to the whole batch
+    (all its focuses and topics) in one vectorised lookup.
     """
-    examples = get_few_shot_examples(job_list[0], example_banks) if job_list else ""
-    
-    system_msg = f"""You are an expert ELT content creator. You will generate exactly {len(job_list)} complete test questions in a single JSON response. 
+    return example_bank.get_index(example_banks).examples_for_batch(job_list, seed=seed)
 
-CRITICAL: Your entire response must be a JSON object with a "questions" key containing an array of exactly {len(job_list)} question objects. Do not generate fewer questions than requested."""
-    
-    # Build the batch specification
-    job_specs = []
-    has_grammar_distinction = False
-    has_vocabulary = False
-    
-    for job in job_list:
-        raw_context = job.get('context', 'General')
-        main_topic = raw_context
-        micro_style = "general conversation"
-        
-        if " (Style: " in raw_context:
-            try:
-                parts = raw_context.split(" (Style: ")
-                main_topic = parts[0]
-                micro_style = parts[1].replace(")", "")
-            except:
-                pass
-        
-        job_specs.append({
-            "job_id": job['job_id'],
-            "cefr": job['cefr'],
-            "type": job['type'],
-            "focus": job['focus'],
-            "topic": main_topic,
-            "style": micro_style
-        })
-        
-        if job['type'] == 'Grammar' and 'vs' in job['focus'].lower():
-            has_grammar_distinction = True
-        if job['type'] == 'Vocabulary':
-            has_vocabulary = True
-    
-    # Determine appropriate constraint instruction
-    constraint_instruction = ""
-    
-    if has_grammar_distinction:
-        constraint_instruction += """
-GRAMMATICAL EXCLUSIVITY RULE (for grammar distinction questions):
-When the Assessment Focus contains "vs" (e.g., "going to vs will", "Past Simple vs Present Perfect"), 
-the Complete Sentence MUST include a GRAMMATICAL SIGNAL that makes only the correct answer structurally valid.
-
-Examples of grammatical signals:
-- Time markers: "yesterday" forces Past Simple, eliminates Present Perfect
-- Evidence phrases: "Look at those clouds" forces "going to", eliminates "will"
-- Hypothetical markers: "If I were you" forces Type 2 conditional, eliminates Type 1
-- Duration markers: "for five years" forces Present Perfect, eliminates Past Simple
-- Definiteness markers: "already" forces Present Perfect, eliminates Past Simple
-
-The distractors should be GRAMMATICALLY INCOMPATIBLE with the sentence structure, not merely semantically weaker.
-"""
-    
-    if has_vocabulary:
-        constraint_instruction += """
-SEMANTIC EXCLUSIVITY RULE (for vocabulary questions):
-The Complete Sentence must contain SEMANTIC CONTEXT CLUES that make only the correct answer logically appropriate.
 
-Context clue strategies by level:
-- A1-A2: Category membership, clear antonyms, basic collocations (verb-noun pairings)
-- B1-B2: Connotation distinctions, phrasal verb meanings, word form requirements, collocation violations
-- C1: Precise semantic distinctions, idiomatic expressions, academic collocations
+# --------------------------------------------------------------------------
+# Strategy: Sequential BATCH MODE (3-Call) - SPLIT ARCHITECTURE
+# --------------------------------------------------------------------------
+# Each batch prompt is a byte-identical static prefix (system message and instruction
+# block, built once at import) followed by the per-batch data: item count, job or
+# stage items, overview and examples. Keeping every variable part at the end lets the
+# provider's prompt-prefix cache reuse the instructions across calls and runs.
 
-The distractors should be SEMANTICALLY INCOMPATIBLE or IDIOMATICALLY WRONG with the context, even if grammatically valid.
-"""
-    
-    user_msg = f"""
-TASK: Create exactly {len(job_list)} complete, original test questions from scratch.
+STAGE1_SYSTEM = """You are an expert ELT content creator. You will generate one complete test question for every job specification you are given, all in a single JSON response.
 
-You must generate ALL {len(job_list)} questions in this single response. Each question specification below MUST have a corresponding question in your output.
+CRITICAL: Your entire response must be a JSON object with a "questions" key containing an array with exactly one question object per job specification. Do not generate fewer questions than requested."""
 
-JOB SPECIFICATIONS (one question for each):
-{json.dumps(job_specs, indent=2)}
+STAGE1_INSTRUCTIONS = """
+TASK: Create complete, original test questions from scratch, one for each job specification given at the end of this message.
 
-{constraint_instruction}
+You must generate ALL of the questions in this single response. Each question specification MUST have a corresponding question in your output.
 
 GENERATION INSTRUCTIONS FOR EACH QUESTION:
 
@@ -155,9 +67,9 @@ GENERATION INSTRUCTIONS FOR EACH QUESTION:
 10. **LOGICAL COHERENCE CHECK:** Review your complete sentence to ensure it is semantically coherent and factually plausible. Avoid nonsensical combinations such as "The meeting was cancelled so we put it off until next month" where the actions contradict each other.
 
 MANDATORY OUTPUT FORMAT:
-{{
+{
   "questions": [
-    {{
+    {
       "Item Number": "...",
       "Assessment Focus": "...",
       "Complete Sentence": "...[sentence with answer visible]...",
@@ -166,8 +78,8 @@ MANDATORY OUTPUT FORMAT:
       "Context Clue Explanation": "...[why this eliminates alternatives]...",
       "CEFR rating": "...",
       "Category": "..."
-    }},
-    {{
+    },
+    {
       "Item Number": "...",
       "Assessment Focus": "...",
       "Complete Sentence": "...",
@@ -176,31 +88,164 @@ MANDATORY OUTPUT FORMAT:
       "Context Clue Explanation": "...",
       "CEFR rating": "...",
       "Category": "..."
-    }}
-    ... (continue until you have exactly {len(job_list)} question objects)
+    }
+    ... (continue until you have one question object per job specification)
   ]
-}}
+}
 
-VERIFICATION: Count your question objects before submitting. You must have exactly {len(job_list)} items in the "questions" array.
+VERIFICATION: Count your question objects before submitting. The "questions" array must hold exactly as many items as there are job specifications.
+"""
 
-STYLE REFERENCE (format guide only - do not copy scenarios):
-{examples}
+GRAMMAR_EXCLUSIVITY_RULE = """
+GRAMMATICAL EXCLUSIVITY RULE (for grammar distinction questions):
+When the Assessment Focus contains "vs" (e.g., "going to vs will", "Past Simple vs Present Perfect"),
+the Complete Sentence MUST include a GRAMMATICAL SIGNAL that makes only the correct answer structurally valid.
+
+Examples of grammatical signals:
+- Time markers: "yesterday" forces Past Simple, eliminates Present Perfect
+- Evidence phrases: "Look at those clouds" forces "going to", eliminates "will"
+- Hypothetical markers: "If I were you" forces Type 2 conditional, eliminates Type 1
+- Duration markers: "for five years" forces Present Perfect, eliminates Past Simple
+- Definiteness markers: "already" forces Present Perfect, eliminates Past Simple
+
+The distractors should be GRAMMATICALLY INCOMPATIBLE with the sentence structure, not merely semantically weaker.
 """
-    return system_msg, user_msg
 
+SEMANTIC_EXCLUSIVITY_RULE = """
+SEMANTIC EXCLUSIVITY RULE (for vocabulary questions):
+The Complete Sentence must contain SEMANTIC CONTEXT CLUES that make only the correct answer logically appropriate.
 
-def create_sequential_batch_stage2_grammar_prompt(job_list, stage1_outputs):
+Context clue strategies by level:
+- A1-A2: Category membership, clear antonyms, basic collocations (verb-noun pairings)
+- B1-B2: Connotation distinctions, phrasal verb meanings, word form requirements, collocation violations
+- C1: Precise semantic distinctions, idiomatic expressions, academic collocations
+
+The distractors should be SEMANTICALLY INCOMPATIBLE or IDIOMATICALLY WRONG with the context, even if grammatically valid.
+"""
+
+
+_SCALAR_TYPES = (str, int, float, type(None))
+
+
+def _flat_object(item, pad):
     """
-    Generates distractors for GRAMMAR questions only.
-    Focused exclusively on grammatical incorrectness requirements and structural constraints.
+    One dict of scalars laid out as json.dumps(..., indent=2) would at depth pad, or
+    None if it holds anything else.
     """
-    system_msg = f"""You are an expert ELT test designer specializing in grammar assessment. You will generate distractors for exactly {len(job_list)} grammar questions in a single JSON response with a "distractors" key."""
-    
-    user_msg = f"""
-TASK: Generate 3 distractors for ALL {len(job_list)} GRAMMAR questions.
+    if not isinstance(item, dict):
+        return None
+    if not item:
+        return "{}"
+    fields = []
+    for key, value in item.items():
+        if not isinstance(key, str) or not isinstance(value, _SCALAR_TYPES):
+            return None
+        encoded = _encode_string(value) if isinstance(value, str) else json.dumps(value)
+        fields.append(f"{pad}  {_encode_string(key)}: {encoded}")
+    return "{\n" + ",\n".join(fields) + f"\n{pad}}}"
+
+
+def _json_block(value):
+    """
+    json.dumps(value, indent=2), byte for byte. With indent set, json falls back to its
+    pure-Python encoder, which dominated building the batch prompts; a dict or list of
+    flat dicts (what the stages pass around) is laid out here with the C string
+    encoder instead. Anything nested still goes through json.dumps.
+    """
+    if isinstance(value, list):
+        blocks = [_flat_object(item, "  ") for item in value]
+        if value and None not in blocks:
+            return "[\n  " + ",\n  ".join(blocks) + "\n]"
+    else:
+        block = _flat_object(value, "")
+        if block is not None:
+            return block
+    return json.dumps(value, indent=2)
 
-INPUT FROM STAGE 1 (Complete sentences with correct answers):
-{json.dumps(stage1_outputs, indent=2)}
+
+@functools.lru_cache(maxsize=4096)
+def _parse_context(raw_context):
+    """
+    Splits a job context "Topic (Style: style)" into (topic, style), once per distinct context.
+    """
+    main_topic = raw_context
+    micro_style = "general conversation"
+    if " (Style: " in raw_context:
+        try:
+            parts = raw_context.split(" (Style: ")
+            main_topic = parts[0]
+            micro_style = parts[1].replace(")", "")
+        except:
+            pass
+    return main_topic, micro_style
+
+
+def create_sequential_batch_stage1_prompt(job_list, example_banks, batch_overview=""):
+    """
+    Generates complete sentences with correct answers and context clues for ALL jobs at once.
+    ENHANCED: Includes multi-word phrase splitting strategy and distinguishes between
+    grammatical versus semantic constraint requirements.
+    When a large batch is split into chunks, batch_overview lists what the other
+    chunks cover so scenarios are not repeated across the parallel calls.
+    """
+    examples = get_batch_few_shot_examples(job_list, example_banks)
+
+    # Build the batch specification
+    job_specs = []
+    has_grammar_distinction = False
+    has_vocabulary = False
+
+    for job in job_list:
+        main_topic, micro_style = _parse_context(job.get('context', 'General'))
+
+        job_specs.append({
+            "job_id": job['job_id'],
+            "cefr": job['cefr'],
+            "type": job['type'],
+            "focus": job['focus'],
+            "topic": main_topic,
+            "style": micro_style
+        })
+
+        if job['type'] == 'Grammar' and 'vs' in job['focus'].lower():
+            has_grammar_distinction = True
+        if job['type'] == 'Vocabulary':
+            has_vocabulary = True
+
+    # Determine appropriate constraint instruction
+    constraint_instruction = ""
+    if has_grammar_distinction:
+        constraint_instruction += GRAMMAR_EXCLUSIVITY_RULE
+    if has_vocabulary:
+        constraint_instruction += SEMANTIC_EXCLUSIVITY_RULE
+
+    overview_instruction = ""
+    if batch_overview:
+        overview_instruction = f"""
+BATCH CONTEXT (ANTI-REPETITION ACROSS PARTS):
+These questions are one part of a larger batch. The other parts are being written separately and cover the topic / focus pairs below.
+Choose scenarios, characters, settings and target words that are clearly different from what those parts would typically produce.
+{batch_overview}
+"""
+
+    user_msg = STAGE1_INSTRUCTIONS + f"""
+THIS BATCH: exactly {len(job_list)} questions, one per job specification below.
+
+JOB SPECIFICATIONS (one question for each):
+{_json_block(job_specs)}
+{overview_instruction}
+{constraint_instruction}
+
+STYLE REFERENCE (format guide only - do not copy scenarios):
+{examples}
+"""
+    return STAGE1_SYSTEM, user_msg
+
+
+STAGE2_GRAMMAR_SYSTEM = """You are an expert ELT test designer specializing in grammar assessment. You will generate distractors for every grammar question you are given in a single JSON response with a "distractors" key."""
+
+STAGE2_GRAMMAR_INSTRUCTIONS = """
+TASK: Generate 3 distractors for ALL of the GRAMMAR questions given as Stage 1 input at the end of this message.
 
 SENTENCE-LEVEL VALIDATION PROCEDURE:
 
@@ -241,9 +286,9 @@ STRUCTURAL RULES:
 6. **ANTI-REPETITION:** Avoid using identical distractor words across multiple questions in this batch unless required by the Assessment Focus.
 
 MANDATORY OUTPUT FORMAT:
-{{
+{
   "distractors": [
-    {{
+    {
       "Item Number": "...",
       "Distractor A": "...[max 3 words]...",
       "Why A is Wrong": "...[Explain the grammatical violation created]...",
@@ -251,32 +296,40 @@ MANDATORY OUTPUT FORMAT:
       "Why B is Wrong": "...[Explain the grammatical violation created]...",
       "Distractor C": "...[max 3 words]...",
       "Why C is Wrong": "...[Explain the grammatical violation created]..."
-    }},
-    ... (exactly {len(job_list)} distractor sets)
+    },
+    ... (one distractor set per Stage 1 question)
   ]
-}}
+}
 
 VERIFICATION CHECKLIST:
-1. Have you generated exactly {len(job_list)} distractor sets?
+1. Have you generated one distractor set for every Stage 1 question?
 2. For EACH distractor, have you confirmed it produces a grammatically INCORRECT sentence?
 3. For distinction questions, have you included at least one distractor testing the stated contrast?
 4. Have you explained the specific grammatical violation for each distractor?
 """
-    return system_msg, user_msg
 
 
-def create_sequential_batch_stage2_vocabulary_prompt(job_list, stage1_outputs):
+def _stage2_batch_data(job_list, stage1_outputs):
+    return f"""
+THIS BATCH: exactly {len(job_list)} distractor sets, one per question below.
+
+INPUT FROM STAGE 1 (Complete sentences with correct answers):
+{_json_block(stage1_outputs)}
+"""
+
+
+def create_sequential_batch_stage2_grammar_prompt(job_list, stage1_outputs):
     """
-    Generates distractors for VOCABULARY questions only.
-    Focused exclusively on semantic incompatibility while maintaining grammatical correctness.
+    Generates distractors for GRAMMAR questions only.
+    Focused exclusively on grammatical incorrectness requirements and structural constraints.
     """
-    system_msg = f"""You are an expert ELT test designer specializing in vocabulary assessment. You will generate distractors for exactly {len(job_list)} vocabulary questions in a single JSON response with a "distractors" key."""
-    
-    user_msg = f"""
-TASK: Generate 3 distractors for ALL {len(job_list)} VOCABULARY questions.
+    return STAGE2_GRAMMAR_SYSTEM, STAGE2_GRAMMAR_INSTRUCTIONS + _stage2_batch_data(job_list, stage1_outputs)
 
-INPUT FROM STAGE 1 (Complete sentences with correct answers):
-{json.dumps(stage1_outputs, indent=2)}
+
+STAGE2_VOCABULARY_SYSTEM = """You are an expert ELT test designer specializing in vocabulary assessment. You will generate distractors for every vocabulary question you are given in a single JSON response with a "distractors" key."""
+
+STAGE2_VOCABULARY_INSTRUCTIONS = """
+TASK: Generate 3 distractors for ALL of the VOCABULARY questions given as Stage 1 input at the end of this message.
 
 SENTENCE-LEVEL VALIDATION PROCEDURE:
 
@@ -337,9 +390,9 @@ STRUCTURAL RULES:
 6. **ANTI-REPETITION:** Avoid using identical distractor words across multiple questions in this batch.
 
 MANDATORY OUTPUT FORMAT:
-{{
+{
   "distractors": [
-    {{
+    {
       "Item Number": "...",
       "Distractor A": "...[max 3 words]...",
       "Why A is Wrong": "...[Explain semantic incompatibility and confirm grammatical validity]...",
@@ -347,54 +400,32 @@ MANDATORY OUTPUT FORMAT:
       "Why B is Wrong": "...[Explain semantic incompatibility and confirm grammatical validity]...",
       "Distractor C": "...[max 3 words]...",
       "Why C is Wrong": "...[Explain semantic incompatibility and confirm grammatical validity]..."
-    }},
-    ... (exactly {len(job_list)} distractor sets)
+    },
+    ... (one distractor set per Stage 1 question)
   ]
-}}
+}
 
 VERIFICATION CHECKLIST:
-1. Have you generated exactly {len(job_list)} distractor sets?
+1. Have you generated one distractor set for every Stage 1 question?
 2. For EACH distractor, have you confirmed it produces a grammatically CORRECT sentence?
 3. For EACH distractor, have you confirmed it is semantically incompatible with the context?
 4. For higher-level words, have you included lexically matched or phonetically similar distractors?
 5. For verb collocations, have you tested against the full sentence structure?
 """
-    return system_msg, user_msg
 
 
-def create_sequential_batch_stage3_prompt(job_list, stage1_outputs, stage2_outputs):
+def create_sequential_batch_stage2_vocabulary_prompt(job_list, stage1_outputs):
     """
-    Quality validation for ALL questions at once, can identify cross-question issues.
-    ENHANCED: Specifically validates sentence-level grammatical correctness testing and 
-    distinguishes between grammar versus vocabulary distractor requirements.
+    Generates distractors for VOCABULARY questions only.
+    Focused exclusively on semantic incompatibility while maintaining grammatical correctness.
     """
-    system_msg = f"""You are an independent quality assurance expert for language testing. You will evaluate exactly {len(job_list)} questions and return your assessments in a JSON object with a "validations" key."""
-    
-    # Construct complete questions for review
-    complete_questions = []
-    for i, (job, s1, s2) in enumerate(zip(job_list, stage1_outputs, stage2_outputs)):
-        complete_sentence = s1.get("Complete Sentence", "")
-        correct_answer = s1.get("Correct Answer", "")
-        question_prompt = complete_sentence.replace(correct_answer, "____")
-        
-        complete_questions.append({
-            "Item Number": s1.get("Item Number", ""),
-            "Assessment Focus": s1.get("Assessment Focus", ""),
-            "Category": s1.get("Category", ""),
-            "Question Prompt": question_prompt,
-            "Correct Answer": correct_answer,
-            "Distractor 1": s2.get("Distractor A", ""),
-            "Distractor 2": s2.get("Distractor B", ""),
-            "Distractor 3": s2.get("Distractor C", ""),
-            "Context Clue": s1.get("Context Clue Location", ""),
-            "CEFR": job['cefr']
-        })
-    
-    user_msg = f"""
-TASK: Evaluate ALL {len(job_list)} complete question items for quality issues.
+    return STAGE2_VOCABULARY_SYSTEM, STAGE2_VOCABULARY_INSTRUCTIONS + _stage2_batch_data(job_list, stage1_outputs)
 
-COMPLETE QUESTIONS BATCH:
-{json.dumps(complete_questions, indent=2)}
+
+STAGE3_SYSTEM = """You are an independent quality assurance expert for language testing. You will evaluate every question you are given and return your assessments in a JSON object with a "validations" key."""
+
+STAGE3_INSTRUCTIONS = """
+TASK: Evaluate ALL of the complete question items given at the end of this message for quality issues.
 
 VALIDATION PROCEDURE FOR EACH QUESTION:
 
@@ -436,9 +467,9 @@ EVALUATION CRITERIA:
 7. **CROSS-QUESTION CHECK:** Are there repeated themes or excessive similarity between questions?
 
 MANDATORY OUTPUT FORMAT:
-{{
+{
   "validations": [
-    {{
+    {
       "Item Number": "...",
       "Overall Quality": "Pass" or "Requires Revision",
       "Sentence Reconstruction Results": "Pass/Fail - identify which distractors fail and why",
@@ -448,14 +479,48 @@ MANDATORY OUTPUT FORMAT:
       "Other Issues": ["list violations of criteria 5-6"],
       "Cross-Question Issues": ["note similarities to other questions"],
       "Revision Recommendations": "Specific guidance with replacement suggestions or 'None'"
-    }},
-    ... (exactly {len(job_list)} validation reports)
+    },
+    ... (one validation report per question)
   ]
-}}
+}
 
-VERIFICATION: Provide exactly {len(job_list)} validation reports with complete sentence reconstruction analysis.
+VERIFICATION: Provide one validation report, with complete sentence reconstruction analysis, for every question in the batch.
 """
-    return system_msg, user_msg
+
+
+def create_sequential_batch_stage3_prompt(job_list, stage1_outputs, stage2_outputs):
+    """
+    Quality validation for ALL questions at once, can identify cross-question issues.
+    ENHANCED: Specifically validates sentence-level grammatical correctness testing and
+    distinguishes between grammar versus vocabulary distractor requirements.
+    """
+    # Construct complete questions for review
+    complete_questions = []
+    for i, (job, s1, s2) in enumerate(zip(job_list, stage1_outputs, stage2_outputs)):
+        complete_sentence = s1.get("Complete Sentence", "")
+        correct_answer = s1.get("Correct Answer", "")
+        question_prompt, _ = output_formatter.blank_answer(complete_sentence, correct_answer)
+
+        complete_questions.append({
+            "Item Number": s1.get("Item Number", ""),
+            "Assessment Focus": s1.get("Assessment Focus", ""),
+            "Category": s1.get("Category", ""),
+            "Question Prompt": question_prompt,
+            "Correct Answer": correct_answer,
+            "Distractor 1": s2.get("Distractor A", ""),
+            "Distractor 2": s2.get("Distractor B", ""),
+            "Distractor 3": s2.get("Distractor C", ""),
+            "Context Clue": s1.get("Context Clue Location", ""),
+            "CEFR": job['cefr']
+        })
+
+    user_msg = STAGE3_INSTRUCTIONS + f"""
+THIS BATCH: exactly {len(job_list)} validation reports, one per question below.
+
+COMPLETE QUESTIONS BATCH:
+{_json_block(complete_questions)}
+"""
+    return STAGE3_SYSTEM, user_msg
 
 
 # --------------------------------------------------------------------------
@@ -466,17 +531,7 @@ def create_sequential_stage1_prompt(job, example_banks):
     examples = get_few_shot_examples(job, example_banks)
     system_msg = "You are an expert ELT content creator. Output ONLY valid JSON."
     
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
-    micro_style = "general conversation"
-    
-    if " (Style: " in raw_context:
-        try:
-            parts = raw_context.split(" (Style: ")
-            main_topic = parts[0]
-            micro_style = parts[1].replace(")", "")
-        except:
-            pass
+    main_topic, micro_style = _parse_context(job.get('context', 'General'))
     
     constraint_text = ""
     if job['type'] == 'Grammar' and 'vs' in job.get('focus', '').lower():
@@ -538,7 +593,7 @@ For example, if testing future forms, all options must be future forms (will, go
 TASK: Generate 3 distractors for a {job['cefr']} {job['type']} question.
 
 INPUT FROM STAGE 1:
-{json.dumps(stage1_output, indent=2)}
+{_json_block(stage1_output)}
 
 {alignment_note}
 
@@ -570,7 +625,7 @@ def create_sequential_stage3_prompt(job, stage1_output, stage2_output):
     complete_sentence = stage1_output.get("Complete Sentence", "")
     correct_answer = stage1_output.get("Correct Answer", "")
     context_clue = stage1_output.get("Context Clue Location", "")
-    question_prompt = complete_sentence.replace(correct_answer, "____")
+    question_prompt, _ = output_formatter.blank_answer(complete_sentence, correct_answer)
     assessment_focus = stage1_output.get("Assessment Focus", "")
     
     distractors = [
@@ -614,17 +669,7 @@ def create_holistic_prompt(job, example_banks):
     examples = get_few_shot_examples(job, example_banks)
     system_msg = "You are an expert ELT content creator. Output ONLY valid JSON."
     
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
-    micro_style = "general conversation"
-
-    if " (Style: " in raw_context:
-        try:
-            parts = raw_context.split(" (Style: ")
-            main_topic = parts[0]
-            micro_style = parts[1].replace(")", "")
-        except:
-            pass
+    main_topic, micro_style = _parse_context(job.get('context', 'General'))
 
     user_msg = f"""
 TASK: Generate a {job['cefr']} {job['type']} question.
@@ -664,13 +709,7 @@ REPLICATE THIS STYLE:
 def create_options_prompt(job, example_banks):
     system_msg = "You are an expert ELT test designer. Output ONLY valid JSON."
     
-    raw_context = job.get('context', 'General')
-    main_topic = raw_context
-    if " (Style: " in raw_context:
-        try:
-            main_topic = raw_context.split(" (Style: ")[0]
-        except:
-            pass
+    main_topic, _ = _parse_context(job.get('context', 'General'))
 
     user_msg = f"""
 TASK: Generate 4 answer choices for a {job['cefr']} {job['type']} question.
@@ -699,13 +738,7 @@ Output Format:
 def create_stem_prompt(job, options_json_string):
     system_msg = "You are an expert ELT writer. Output ONLY valid JSON."
     
-    raw_context = job.get('context', 'General')
-    micro_style = "general conversation"
-    if " (Style: " in raw_context:
-        try:
-            micro_style = raw_context.split(" (Style: ")[1].replace(")", "")
-        except:
-            pass
+    _, micro_style = _parse_context(job.get('context', 'General'))
     
     user_msg = f"""
 TASK: Write a question stem for these options.
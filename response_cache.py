@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".llm_cache", "responses.sqlite3")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def make_key(system_msg, user_msg, model, max_tokens, **extra):
+    """
+    Content-addressed cache key: SHA-256 of the full request.
+    Any extra request parameters (temperature, response_format...) are part of the key.
+    """
+    payload = {
+        "system": system_msg,
+        "user": user_msg,
+        "model": model,
+        "max_tokens": max_tokens,
+        "extra": extra
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of raw LLM responses with TTL and size-bounded LRU eviction.
+
+    Hits are served with a single primary-key lookup. Last-access times are buffered
+    in memory and written back on the next put(), so a hit never waits on a disk write.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self._entries = count
+        self._bytes = total
+
+    def get(self, key):
+        """
+        Returns the cached response string, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at, size = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._touched.pop(key, None)
+                self._entries -= 1
+                self._bytes -= size
+                self.misses += 1
+                return None
+
+            self._touched[key] = now
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("BEGIN")
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            if old is None:
+                self._entries += 1
+            else:
+                self._bytes -= old[0]
+            self._bytes += size
+            self._evict()
+            self._conn.execute("COMMIT")
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        """
+        Drops expired entries, then least-recently-used ones until within both limits.
+        """
+        if self.ttl_seconds:
+            cutoff = time.time() - self.ttl_seconds
+            expired = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (cutoff,)
+            ).fetchone()
+            if expired[0]:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+                self._entries -= expired[0]
+                self._bytes -= expired[1]
+
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            overflow = max(self._entries - self.max_entries, 1)
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT ?", (overflow,)
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k, _ in rows])
+            self._entries -= len(rows)
+            self._bytes -= sum(size for _, size in rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": self._entries,
+                "bytes": self._bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._touched.clear()
+            self._entries = 0
+            self._bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.close()
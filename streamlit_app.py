@@ -1,12 +1,26 @@
 import streamlit as st
 import pandas as pd
-import random
 import json
+import os
 import time
+import uuid
 import test_planner
-import prompt_engineer
 import llm_service
-import output_formatter
+import job_runner
+import pipeline
+import checkpoint
+import metrics
+import item_store
+import telemetry
+import token_budget
+import debug_log
+import job_queue
+
+# Debug Logs tab entries shown per page
+DEBUG_LOG_PAGE_SIZE = 200
+
+# Seconds between refreshes of a running batch's live table
+LIVE_REFRESH_SECONDS = 1.0
 
 # -----------------------------------------------------------------
 # App Configuration & Styling
@@ -23,6 +37,23 @@ try:
 except Exception:
     st.error("❌ OpenAI API Key not found in Secrets. Please add it to your Streamlit Cloud settings.")
     st.stop()
+
+# Optional: more keys (OPENAI_API_KEYS), per-stage models (STAGE_MODELS) and the
+# account's rate limits per key and model (RATE_LIMIT_RPM / RATE_LIMIT_TPM) turn on request routing
+try:
+    routing_keys = [user_api_key] + list(st.secrets.get("OPENAI_API_KEYS", []))
+    routing_models = st.secrets.get("STAGE_MODELS")
+    routing_rpm = st.secrets.get("RATE_LIMIT_RPM")
+    routing_tpm = st.secrets.get("RATE_LIMIT_TPM")
+except Exception:
+    routing_keys, routing_models, routing_rpm, routing_tpm = [user_api_key], None, None, None
+if llm_service.get_router() is None and (len(set(routing_keys)) > 1 or routing_models or routing_rpm or routing_tpm):
+    llm_service.configure_router(
+        routing_keys,
+        {stage: tuple(models) for stage, models in dict(routing_models).items()} if routing_models else None,
+        routing_rpm,
+        routing_tpm
+    )
     
 # Custom CSS (same as original)
 st.markdown("""
@@ -174,15 +205,7 @@ st.markdown("""
 @st.cache_data
 def load_example_banks():
     try:
-        df_g = pd.read_csv("grammar_bank.csv")
-        df_v = pd.read_csv("vocab_bank.csv")
-        
-        if "GSE Score" in df_g.columns:
-            df_g = df_g.drop(columns=["GSE Score"])
-        if "GSE Score" in df_v.columns:
-            df_v = df_v.drop(columns=["GSE Score"])
-            
-        return {"grammar": df_g, "vocab": df_v}
+        return pipeline.load_example_banks(store=item_store.get_store())
     except FileNotFoundError:
         st.error("Error: Example bank CSVs not found.")
         return None
@@ -190,6 +213,20 @@ def load_example_banks():
         st.error(f"Error loading CSVs: {e}")
         return None
 
+@st.cache_resource
+def get_job_queue():
+    """
+    The queue shared by every session. Without a separate `python job_queue.py serve`
+    pool running, this process starts its own worker threads (once). They share the
+    router's rate limits, and load the (cached) example banks for every job, so banks
+    reloaded after a Workshop change are used from the next job on.
+    """
+    queue = job_queue.get_queue()
+    if queue.active_workers() == 0 and load_example_banks() is not None:
+        job_queue.start_workers(queue, load_example_banks, user_api_key, rpm=routing_rpm, tpm=routing_tpm,
+                                store=item_store.get_store())
+    return queue
+
 # -----------------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------------
@@ -321,8 +358,166 @@ if 'sequential_stage2_data' not in st.session_state:
     st.session_state.sequential_stage2_data = None
 if 'sequential_stage3_data' not in st.session_state:
     st.session_state.sequential_stage3_data = None
-if 'debug_logs' not in st.session_state:
-    st.session_state.debug_logs = []
+if 'debug_log' not in st.session_state:
+    # Bounded per session; raw responses and other large text stay on disk until viewed
+    st.session_state.debug_log = debug_log.DebugLog()
+if 'trace' not in st.session_state:
+    st.session_state.trace = None
+if 'live_job' not in st.session_state:
+    st.session_state.live_job = None
+if 'batch_result' not in st.session_state:
+    st.session_state.batch_result = None
+if 'planned_batch' not in st.session_state:
+    st.session_state.planned_batch = None
+if 'user_id' not in st.session_state:
+    # Per-user limits in the job queue apply to this browser session
+    st.session_state.user_id = uuid.uuid4().hex[:8]
+
+def save_to_item_bank(edited_df):
+    """
+    Stores reviewed Workshop rows in the item bank as accepted items, which also
+    makes them available as few-shot examples.
+    """
+    questions = edited_df.fillna("").to_dict("records")
+    inserted, skipped = item_store.get_store().ingest(
+        questions,
+        "workshop",
+        strategy=st.session_state.get("last_batch_strategy"),
+        statuses={str(q.get("Item Number", "")): "accepted" for q in questions},
+        update_existing=True
+    )
+    load_example_banks.clear()
+    st.success(f"Accepted {inserted} items into the item bank ({skipped} unchanged).")
+
+def finish_live_job(job):
+    """
+    Brings a finished background batch into the session: its result for the Generator
+    and Workshop, the worker's debug log and raw responses for the Debug tab, and its
+    timing/token spans.
+    """
+    result = get_job_queue().results(job["id"])
+    result["errors"] = result["errors"] or job["errors"]
+    result["status"] = job["status"]
+    result["label"] = st.session_state.live_job["label"]
+    st.session_state.batch_result = result
+    st.session_state.live_job = None
+    st.session_state.last_run_dir = job["run_dir"]
+
+    log = st.session_state.debug_log
+    log_path = os.path.join(job["run_dir"], job_queue.LOG_FILE)
+    if os.path.exists(log_path):
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    log(line.rstrip("\n"))
+    if os.path.exists(os.path.join(job["run_dir"], checkpoint.MANIFEST_FILE)):
+        # Raw responses go to the Debug Logs tab, on disk until opened there
+        for record in checkpoint.RunStore.open(job["run_dir"]).records():
+            log.attach(
+                f"{record['unit']} raw LLM response",
+                record["raw"] or record["error"] or "",
+                level="DEBUG" if record["status"] == "ok" else "WARNING"
+            )
+    if result["stage1"]:
+        log.attach(
+            f"Stage 1 extracted data ({len(result['stage1'])} questions)",
+            json.dumps(result["stage1"], indent=2, ensure_ascii=False)
+        )
+    trace_path = os.path.join(job["run_dir"], telemetry.TRACE_FILE)
+    if os.path.exists(trace_path):
+        st.session_state.trace = telemetry.Trace.load_jsonl(trace_path)
+
+    if result["questions"]:
+        st.session_state.last_batch = pd.DataFrame(result["questions"])
+        st.session_state.last_batch_strategy = job["strategy"]
+        if job["strategy"] == "Sequential Batch (3-Call)":
+            for stage in ("stage1", "stage2", "stage3"):
+                st.session_state[f"sequential_{stage}_data"] = pd.DataFrame(result[stage]) if result[stage] else None
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def show_live_job():
+    """
+    Live view of this session's running batch. It refreshes on its own, adding each
+    question to the table as its job (or chunk) finishes, while the rest of the page
+    stays usable; Cancel stops the run and keeps the questions finished so far.
+    """
+    live = st.session_state.live_job
+    queue = get_job_queue()
+    job = queue.get(live["id"])
+    positions = {row.get("Item Number"): i for i, row in enumerate(live["rows"])}
+    for seq, question in queue.items(live["id"], live["seq"]):
+        live["seq"] = seq
+        # A requeued job emits the questions it resumes with again: replace, don't repeat
+        number = question.get("Item Number")
+        position = positions.get(number) if number is not None else None
+        if position is None:
+            positions[number] = len(live["rows"])
+            live["rows"].append(question)
+        else:
+            live["rows"][position] = question
+
+    if job["status"] in job_queue.FINISHED_STATUSES:
+        finish_live_job(job)
+        st.rerun()
+
+    st.subheader(f"Generating {job['total']} questions (job #{job['id']})")
+    if job["status"] == "queued":
+        st.info("Waiting for a free worker...")
+    col_progress, col_cancel = st.columns([4, 1])
+    with col_progress:
+        st.progress(min(job["completed"] / job["total"], 1.0) if job["total"] else 0.0)
+        st.caption(f"{len(live['rows'])} questions ready — {job['message'] or ''}")
+    with col_cancel:
+        if job["cancel_requested"]:
+            st.caption("Cancelling...")
+        elif st.button("Cancel", key="cancel_live_job"):
+            queue.cancel(live["id"])
+
+    if live["rows"]:
+        st.dataframe(pd.DataFrame(live["rows"]), use_container_width=True)
+    with st.expander("Planned Job List"):
+        st.dataframe(pd.DataFrame(live["job_list"]))
+
+
+def planned_batch(example_banks, strategy, **planning):
+    """
+    The job list Generate will submit and its pre-flight estimate. Both are made once
+    per set of planning inputs, so reruns from other widgets reuse them instead of
+    re-planning and re-counting every prompt; a new plan is drawn after each submission.
+    """
+    key = (strategy, tuple(sorted((name, str(value)) for name, value in planning.items())))
+    plan = st.session_state.planned_batch
+    if plan is None or plan["key"] != key:
+        job_list = test_planner.create_job_list(generation_strategy=strategy, **planning)
+        plan = {"key": key, "job_list": job_list, "estimate": pipeline.estimate_batch(job_list, strategy, example_banks)}
+        st.session_state.planned_batch = plan
+    return plan
+
+
+def show_batch_result(result):
+    for error in result["errors"]:
+        st.error(f"{error['scope']} failed: {error['error']}")
+
+    for duplicate in result["duplicates"]:
+        st.warning(
+            f"{duplicate['Item Number']} is still a near-duplicate of {duplicate['duplicate_of']} "
+            f"(similarity {duplicate['similarity']}) after regeneration."
+        )
+
+    if result["status"] == "cancelled":
+        st.warning(f"Cancelled: kept the {len(result['questions'])} questions finished before cancelling.")
+    if result["questions"]:
+        st.success(f"Successfully generated {len(result['questions'])} questions!")
+        final_df = pd.DataFrame(result["questions"])
+        st.dataframe(final_df)
+        st.download_button(
+            label="📥 Download Questions as CSV",
+            data=final_df.to_csv(index=False).encode('utf-8'),
+            file_name=f"{result['label']}.csv",
+            mime="text/csv",
+        )
+        st.caption("Raw LLM responses for each stage are in the Debug Logs tab.")
 
 # -----------------------------------------------------------------
 # Main UI
@@ -385,6 +580,22 @@ with tab1:
             index=2,
             key="batch_size"
         )
+
+        max_in_flight = st.slider(
+            "Max Parallel Requests",
+            min_value=1,
+            max_value=16,
+            value=job_runner.DEFAULT_MAX_IN_FLIGHT,
+            help="Holistic and Segmented jobs are independent, so up to this many are sent to the API at once.",
+            key="max_in_flight"
+        )
+
+        bypass_cache = st.checkbox(
+            "Bypass response cache",
+            value=False,
+            help="Always call the API, even when an identical prompt has been answered before.",
+            key="bypass_cache"
+        )
     
     st.divider()
 
@@ -398,304 +609,127 @@ with tab1:
     with st.expander(f"View suggested topics for {current_cefr}..."):
         suggestions = get_topic_suggestions(current_cefr)
         st.info(" - " + "\n - ".join(suggestions))
+
+    plan = None
+    if selected_focus:
+        plan = planned_batch(
+            example_banks,
+            strategy,
+            total_questions=batch_size,
+            q_type=q_type,
+            cefr_target=cefr,
+            selected_focus_list=selected_focus,
+            context_topic=context_topic if context_topic else "General"
+        )
+        st.caption(f"Pre-flight estimate: {pipeline.format_estimate(plan['estimate'])}")
     
     st.divider()
 
     if st.button("Generate Batch", type="primary", use_container_width=True):
         if not selected_focus:
             st.error("Please select at least one 'Assessment Focus'.")
+        elif not user_api_key:
+            st.error("⛔ No API Key provided.")
         else:
-            # Clear previous debug logs
-            st.session_state.debug_logs = []
-            
-            with st.spinner(f"Generating {batch_size} questions..."):
-                try:
-                    job_list = test_planner.create_job_list(
-                        total_questions=batch_size,
-                        q_type=q_type,
-                        cefr_target=cefr,
-                        selected_focus_list=selected_focus,
-                        context_topic=context_topic if context_topic else "General",
-                        generation_strategy=strategy 
-                    )
-                    
-                    st.success(f"Planner created {len(job_list)} jobs!")
-                    st.subheader("Planned Job List:")
-                    st.dataframe(pd.DataFrame(job_list))
-                    
-                    if not user_api_key:
-                        st.error("⛔ No API Key provided.")
-                    else:
-                        generated_questions = []
-                        stage1_data_list = []
-                        stage2_data_list = []
-                        stage3_data_list = []
-                        
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-
-                        for index, job in enumerate(job_list):
-                            status_text.text(f"Generating question {index + 1} of {len(job_list)}...")
-                            
-                            if job['strategy'] == "Sequential Batch (3-Call)":
-                                # BATCH MODE: Process entire batch in 3 calls
-                                if index == 0:  # Only execute on first iteration
-                                    st.session_state.debug_logs.append("="*80)
-                                    st.session_state.debug_logs.append("SEQUENTIAL BATCH MODE - STARTING")
-                                    st.session_state.debug_logs.append(f"Batch size: {len(job_list)} questions")
-                                    st.session_state.debug_logs.append("="*80)
-                                    
-                                    status_text.text(f"Stage 1: Generating all stems with context clues...")
-                                    
-                                    # Stage 1: ALL stems at once
-                                    st.session_state.debug_logs.append("\n--- STAGE 1: PROMPT GENERATION ---")
-                                    sys_msg_1, user_msg_1 = prompt_engineer.create_sequential_batch_stage1_prompt(job_list, example_banks)
-                                    st.session_state.debug_logs.append(f"System message length: {len(sys_msg_1)} chars")
-                                    st.session_state.debug_logs.append(f"User message length: {len(user_msg_1)} chars")
-                                    
-                                    st.session_state.debug_logs.append("\n--- STAGE 1: API CALL ---")
-                                    raw_stage1 = llm_service.call_llm([sys_msg_1, user_msg_1], user_api_key)
-                                    st.session_state.debug_logs.append(f"Raw response length: {len(raw_stage1)} chars")
-                                    st.session_state.debug_logs.append(f"Raw response preview (first 500 chars):\n{raw_stage1[:500]}")
-                                    
-                                    # Create expandable debug section for Stage 1
-                                    with st.expander("🔍 DEBUG: Stage 1 Raw Response", expanded=True):
-                                        st.text_area("Complete Raw LLM Response", raw_stage1, height=300, key="debug_stage1_raw")
-                                        st.caption(f"Response length: {len(raw_stage1)} characters")
-                                    
-                                    st.session_state.debug_logs.append("\n--- STAGE 1: PARSING ---")
-                                    stage1_data, stage1_error = output_formatter.parse_response(raw_stage1)
-                                    
-                                    if stage1_error:
-                                        st.session_state.debug_logs.append(f"PARSING ERROR: {stage1_error}")
-                                        st.error(f"Batch failed at Stage 1 Parsing: {stage1_error}")
-                                        with st.expander("🔍 DEBUG: Stage 1 Parsing Error Details", expanded=True):
-                                            st.error(f"Error: {stage1_error}")
-                                            st.write("Raw response type:", type(raw_stage1))
-                                            st.write("Response starts with:", raw_stage1[:100] if raw_stage1 else "Empty")
-                                        break
-                                    
-                                    st.session_state.debug_logs.append(f"Parsed data type: {type(stage1_data)}")
-                                    st.session_state.debug_logs.append(f"Parsed data structure: {json.dumps(stage1_data, indent=2)[:500]}...")
-                                    
-                                    # Extract array from response - handle new wrapper format
-                                    st.session_state.debug_logs.append("\n--- STAGE 1: ARRAY EXTRACTION ---")
-                                    
-                                    # New format has explicit "questions" key
-                                    if isinstance(stage1_data, dict) and "questions" in stage1_data:
-                                        stage1_data_list = stage1_data["questions"]
-                                        st.session_state.debug_logs.append(f"Extracted from 'questions' key: {len(stage1_data_list)} items")
-                                    else:
-                                        # Fallback to original extraction logic
-                                        stage1_data_list, extract_error = output_formatter.extract_array_from_response(stage1_data)
-                                        
-                                        if extract_error:
-                                            st.session_state.debug_logs.append(f"EXTRACTION ERROR: {extract_error}")
-                                            st.error(f"Stage 1 array extraction failed: {extract_error}")
-                                            with st.expander("🔍 DEBUG: Stage 1 Array Extraction Error", expanded=True):
-                                                st.error(f"Error: {extract_error}")
-                                                st.write("Parsed data structure:", stage1_data)
-                                                st.write("Data type:", type(stage1_data))
-                                                if isinstance(stage1_data, dict):
-                                                    st.write("Dictionary keys:", list(stage1_data.keys()))
-                                            break
-                                    
-                                    st.session_state.debug_logs.append(f"Extracted {len(stage1_data_list)} items from Stage 1")
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 1 Extracted Data", expanded=False):
-                                        st.write(f"Successfully extracted {len(stage1_data_list)} questions")
-                                        st.json(stage1_data_list)
-                                    
-                                    # ===== STAGE 2 WITH ROUTING - THIS IS THE KEY CHANGE =====
-                                    status_text.text(f"Stage 2: Generating all distractors...")
-                                    st.session_state.debug_logs.append("\n--- STAGE 2: PROMPT GENERATION ---")
-                                    
-                                    # Determine question type from first job (batch is homogeneous)
-                                    question_type = job_list[0]['type']
-                                    st.session_state.debug_logs.append(f"Question type detected: {question_type}")
-                                    
-                                    # Route to appropriate Stage 2 function
-                                    if question_type == 'Grammar':
-                                        st.session_state.debug_logs.append("Routing to grammar-specific Stage 2 function")
-                                        sys_msg_2, user_msg_2 = prompt_engineer.create_sequential_batch_stage2_grammar_prompt(
-                                            job_list, 
-                                            stage1_data_list
-                                        )
-                                    elif question_type == 'Vocabulary':
-                                        st.session_state.debug_logs.append("Routing to vocabulary-specific Stage 2 function")
-                                        sys_msg_2, user_msg_2 = prompt_engineer.create_sequential_batch_stage2_vocabulary_prompt(
-                                            job_list, 
-                                            stage1_data_list
-                                        )
-                                    else:
-                                        st.error(f"Unknown question type: {question_type}")
-                                        break
-                                    # ===== END OF ROUTING CHANGE =====
-                                    
-                                    st.session_state.debug_logs.append(f"User message length: {len(user_msg_2)} chars")
-                                    
-                                    st.session_state.debug_logs.append("\n--- STAGE 2: API CALL ---")
-                                    raw_stage2 = llm_service.call_llm([sys_msg_2, user_msg_2], user_api_key)
-                                    st.session_state.debug_logs.append(f"Raw response length: {len(raw_stage2)} chars")
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 2 Raw Response", expanded=False):
-                                        st.text_area("Complete Raw LLM Response", raw_stage2, height=300, key="debug_stage2_raw")
-                                    
-                                    stage2_data, stage2_error = output_formatter.parse_response(raw_stage2)
-                                    if stage2_error:
-                                        st.session_state.debug_logs.append(f"STAGE 2 PARSING ERROR: {stage2_error}")
-                                        st.error(f"Batch failed at Stage 2: {stage2_error}")
-                                        break
-                                    
-                                    # Handle new wrapper format with "distractors" key
-                                    if isinstance(stage2_data, dict) and "distractors" in stage2_data:
-                                        stage2_data_list = stage2_data["distractors"]
-                                        st.session_state.debug_logs.append(f"Extracted from 'distractors' key: {len(stage2_data_list)} items")
-                                    else:
-                                        stage2_data_list, extract_error = output_formatter.extract_array_from_response(stage2_data)
-                                        if extract_error:
-                                            st.session_state.debug_logs.append(f"STAGE 2 EXTRACTION ERROR: {extract_error}")
-                                            st.error(f"Stage 2 array extraction failed: {extract_error}")
-                                            with st.expander("🔍 DEBUG: Stage 2 Extraction Error", expanded=True):
-                                                st.write("Error:", extract_error)
-                                                st.json(stage2_data)
-                                            break
-                                    
-                                    st.session_state.debug_logs.append(f"Extracted {len(stage2_data_list)} items from Stage 2")
-                                    
-                                    # Stage 3
-                                    status_text.text(f"Stage 3: Quality validation...")
-                                    st.session_state.debug_logs.append("\n--- STAGE 3: QUALITY VALIDATION ---")
-                                    
-                                    sys_msg_3, user_msg_3 = prompt_engineer.create_sequential_batch_stage3_prompt(job_list, stage1_data_list, stage2_data_list)
-                                    raw_stage3 = llm_service.call_llm([sys_msg_3, user_msg_3], user_api_key)
-                                    
-                                    with st.expander("🔍 DEBUG: Stage 3 Raw Response", expanded=False):
-                                        st.text_area("Complete Raw LLM Response", raw_stage3, height=300, key="debug_stage3_raw")
-                                    
-                                    stage3_data, stage3_error = output_formatter.parse_response(raw_stage3)
-                                    if stage3_error:
-                                        st.session_state.debug_logs.append(f"STAGE 3 PARSING ERROR: {stage3_error}")
-                                        st.error(f"Batch failed at Stage 3: {stage3_error}")
-                                        break
-                                    
-                                    # Handle new wrapper format with "validations" key
-                                    if isinstance(stage3_data, dict) and "validations" in stage3_data:
-                                        stage3_data_list = stage3_data["validations"]
-                                        st.session_state.debug_logs.append(f"Extracted from 'validations' key: {len(stage3_data_list)} items")
-                                    else:
-                                        stage3_data_list, extract_error = output_formatter.extract_array_from_response(stage3_data)
-                                        if extract_error:
-                                            st.session_state.debug_logs.append(f"STAGE 3 EXTRACTION ERROR: {extract_error}")
-                                            st.error(f"Stage 3 array extraction failed: {extract_error}")
-                                            break
-                                    
-                                    st.session_state.debug_logs.append(f"Extracted {len(stage3_data_list)} items from Stage 3")
-                                    
-                                    # Construct final questions
-                                    st.session_state.debug_logs.append("\n--- FINAL ASSEMBLY ---")
-                                    for i in range(len(stage1_data_list)):
-                                        if i < len(stage2_data_list):
-                                            stage1_data = stage1_data_list[i]
-                                            stage2_data = stage2_data_list[i]
-                                            
-                                            complete_sentence = stage1_data.get("Complete Sentence", "")
-                                            correct_answer = stage1_data.get("Correct Answer", "")
-                                            question_prompt = complete_sentence.replace(correct_answer, "____")
-                                            
-                                            options = [
-                                                stage2_data.get("Distractor A", ""),
-                                                stage2_data.get("Distractor B", ""),
-                                                stage2_data.get("Distractor C", ""),
-                                                correct_answer
-                                            ]
-                                            random.shuffle(options)
-                                            correct_letter = chr(65 + options.index(correct_answer))
-                                            
-                                            final_question = {
-                                                "Item Number": stage1_data.get("Item Number", ""),
-                                                "Assessment Focus": stage1_data.get("Assessment Focus", ""),
-                                                "Question Prompt": question_prompt,
-                                                "Answer A": options[0],
-                                                "Answer B": options[1],
-                                                "Answer C": options[2],
-                                                "Answer D": options[3],
-                                                "Correct Answer": correct_letter,
-                                                "CEFR rating": stage1_data.get("CEFR rating", ""),
-                                                "Category": stage1_data.get("Category", "")
-                                            }
-                                            generated_questions.append(final_question)
-                                            st.session_state.debug_logs.append(f"Assembled question {i+1}: {stage1_data.get('Item Number', '')}")
-                                    
-                                    st.session_state.debug_logs.append(f"\nTOTAL QUESTIONS ASSEMBLED: {len(generated_questions)}")
-                                    break
-                                
-                            elif job['strategy'] == "Segmented (2-Call)":
-                                sys_msg_1, user_msg_1 = prompt_engineer.create_options_prompt(job, example_banks)
-                                raw_options = llm_service.call_llm([sys_msg_1, user_msg_1], user_api_key)
-                                options_data, options_error = output_formatter.parse_response(raw_options)
-                                
-                                if options_error:
-                                    st.error(f"Job {job['job_id']} Failed at Options stage: {options_error}")
-                                    continue
-                                
-                                options_json_string = json.dumps(options_data)
-                                sys_msg_2, user_msg_2 = prompt_engineer.create_stem_prompt(job, options_json_string)
-                                raw_response = llm_service.call_llm([sys_msg_2, user_msg_2], user_api_key)
-                                question_data, error = output_formatter.parse_response(raw_response)
-                                
-                                if error:
-                                    st.error(f"Job {job['job_id']} Failed: {error}")
-                                else:
-                                    generated_questions.append(question_data)
-                                    
-                            else:  # Holistic
-                                sys_msg, user_msg = prompt_engineer.create_holistic_prompt(job, example_banks)
-                                raw_response = llm_service.call_llm([sys_msg, user_msg], user_api_key)
-                                question_data, error = output_formatter.parse_response(raw_response)
-                                
-                                if error:
-                                    st.error(f"Job {job['job_id']} Failed: {error}")
-                                else:
-                                    generated_questions.append(question_data)
-
-                            progress_bar.progress((index + 1) / len(job_list))
-                        
-                        progress_bar.empty()
-                        status_text.empty()
-                        
-                        if generated_questions:
-                            st.success(f"Successfully generated {len(generated_questions)} questions!")
-                            
-                            final_df = pd.DataFrame(generated_questions)
-                            st.dataframe(final_df)
-                            
-                            # Store in session state
-                            st.session_state.last_batch = final_df
-                            st.session_state.last_batch_strategy = strategy
-                            
-                            if strategy == "Sequential Batch (3-Call)":
-                                st.session_state.sequential_stage1_data = pd.DataFrame(stage1_data_list) if stage1_data_list else None
-                                st.session_state.sequential_stage2_data = pd.DataFrame(stage2_data_list) if stage2_data_list else None
-                                st.session_state.sequential_stage3_data = pd.DataFrame(stage3_data_list) if stage3_data_list else None
-                            
-                            csv = final_df.to_csv(index=False).encode('utf-8')
-                            st.download_button(
-                                label="📥 Download Questions as CSV",
-                                data=csv,
-                                file_name=f"generated_test_{cefr}_{batch_size}q.csv",
-                                mime="text/csv",
-                            )
-                    
-                except Exception as e:
-                    st.session_state.debug_logs.append(f"\nCRITICAL EXCEPTION: {str(e)}")
-                    st.session_state.debug_logs.append(f"Exception type: {type(e).__name__}")
-                    import traceback
-                    st.session_state.debug_logs.append(f"Traceback:\n{traceback.format_exc()}")
-                    st.error(f"Error: {e}")
-                    with st.expander("🔍 DEBUG: Exception Details", expanded=True):
-                        st.error(str(e))
-                        st.code(traceback.format_exc())
+            # Clear previous debug logs; the batch runs on the shared worker pool, checkpointed
+            # so an interrupted run resumes, and its questions stream into the live table below
+            st.session_state.debug_log.clear()
+            # The plan the estimate was made for; the next batch gets a fresh one
+            job_list = plan["job_list"]
+            st.session_state.planned_batch = None
+            live_job_id = get_job_queue().submit(
+                job_list, strategy, st.session_state.user_id, max_in_flight=max_in_flight, use_cache=not bypass_cache
+            )
+            st.session_state.debug_log.info(f"Planner created {len(job_list)} jobs; queued as job #{live_job_id}")
+            st.session_state.batch_result = None
+            st.session_state.live_job = {
+                "id": live_job_id,
+                "label": f"generated_test_{cefr}_{batch_size}q",
+                "job_list": job_list,
+                "seq": 0,
+                "rows": []
+            }
+
+    if st.session_state.live_job:
+        show_live_job()
+    elif st.session_state.batch_result:
+        show_batch_result(st.session_state.batch_result)
+
+    my_jobs = get_job_queue().jobs(st.session_state.user_id, limit=10)
+    if my_jobs:
+        with st.expander(f"Background Jobs ({sum(j['status'] in ('queued', 'running') for j in my_jobs)} active)",
+                         expanded=True):
+            queue_stats = get_job_queue().stats()
+            st.caption(
+                f"Shared queue: {queue_stats['queued']} waiting, {queue_stats['running']} running "
+                f"on {queue_stats['workers']} workers"
+            )
+            for job in my_jobs:
+                col_info, col_action = st.columns([4, 1])
+                with col_info:
+                    st.write(f"**#{job['id']}** {job['strategy']} — {job['status']}: {job['message'] or ''}")
+                    if job["status"] == "running" and job["total"]:
+                        st.progress(min(job["completed"] / job["total"], 1.0))
+                with col_action:
+                    if job["status"] in ("queued", "running"):
+                        if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                            get_job_queue().cancel(job["id"])
+                            st.rerun()
+                    elif job["questions"]:
+                        queued_df = pd.DataFrame(get_job_queue().results(job["id"])["questions"])
+                        st.download_button(
+                            label="📥 CSV",
+                            data=queued_df.to_csv(index=False).encode('utf-8'),
+                            file_name=f"queued_job_{job['id']}_{len(queued_df)}q.csv",
+                            mime="text/csv",
+                            key=f"download_job_{job['id']}"
+                        )
+            if st.button("Refresh", key="refresh_jobs"):
+                st.rerun()
+
+    unfinished_runs = [run for run in checkpoint.list_runs() if run.get("status") != "complete"]
+    if unfinished_runs:
+        with st.expander(f"Resume an interrupted run ({len(unfinished_runs)} unfinished)"):
+            st.caption("Only the stages that failed or never ran are sent to the API again.")
+            run_labels = {
+                run["run_dir"]: f"{run['run_dir']} — {len(run['job_list'])} jobs, {run['strategy']}, {run['status']}"
+                for run in unfinished_runs
+            }
+            resume_dir = st.selectbox("Run", list(run_labels), format_func=run_labels.get, key="resume_run_dir")
+
+            if st.button("Resume Run"):
+                if not user_api_key:
+                    st.error("⛔ No API Key provided.")
+                else:
+                    st.session_state.debug_log.clear()
+                    with st.spinner("Resuming run..."), telemetry.collect() as trace:
+                        st.session_state.trace = trace
+                        batch_result = pipeline.resume_batch(
+                            resume_dir,
+                            example_banks,
+                            user_api_key,
+                            max_in_flight=max_in_flight,
+                            use_cache=not bypass_cache,
+                            log=st.session_state.debug_log,
+                            store=item_store.get_store()
+                        )
+
+                    for error in batch_result["errors"]:
+                        st.error(f"{error['scope']} failed: {error['error']}")
+
+                    if batch_result["questions"]:
+                        st.success(f"Run now has {len(batch_result['questions'])} questions.")
+                        final_df = pd.DataFrame(batch_result["questions"])
+                        st.dataframe(final_df)
+                        st.session_state.last_batch = final_df
+                        st.session_state.last_run_dir = resume_dir
+                        st.download_button(
+                            label="📥 Download Questions as CSV",
+                            data=final_df.to_csv(index=False).encode('utf-8'),
+                            file_name=f"resumed_{len(final_df)}q.csv",
+                            mime="text/csv",
+                            key="download_resumed"
+                        )
 
 
 # =============================
@@ -709,7 +743,7 @@ with tab2:
     
     input_source = st.radio(
         "Choose your batch source:",
-        ("Recent batch from Generator", "Upload CSV file", "Manual text input"),
+        ("Recent batch from Generator", "Item bank", "Upload CSV file", "Manual text input"),
         key="input_source"
     )
     
@@ -726,6 +760,27 @@ with tab2:
         else:
             st.warning("No recent batch found. Please generate a batch in the Generator tab first.")
     
+    elif input_source == "Item bank":
+        store = item_store.get_store()
+        bank_col1, bank_col2, bank_col3 = st.columns(3)
+        with bank_col1:
+            bank_type = st.selectbox("Type", ["Any", "Grammar", "Vocabulary"], key="bank_type")
+        with bank_col2:
+            bank_cefr = st.selectbox("CEFR", ["Any", "A1", "A2", "B1", "B2", "C1"], key="bank_cefr")
+        with bank_col3:
+            bank_limit = st.number_input("Max items", min_value=10, max_value=5000, value=200, step=10, key="bank_limit")
+
+        bank_filters = {
+            "type": None if bank_type == "Any" else bank_type,
+            "cefr": None if bank_cefr == "Any" else bank_cefr
+        }
+        st.caption(f"{store.count(**bank_filters)} matching items in the bank ({store.count()} total)")
+        bank_items = store.query(limit=int(bank_limit), **bank_filters)
+        if bank_items:
+            working_batch = pd.DataFrame(bank_items)
+        else:
+            st.warning("No items in the bank match these filters.")
+
     elif input_source == "Upload CSV file":
         uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
         if uploaded_file is not None:
@@ -824,6 +879,9 @@ with tab2:
                 mime="text/csv",
                 key="download_final"
             )
+
+            if st.button("✅ Accept into Item Bank", key="accept_final"):
+                save_to_item_bank(edited_final)
         
         else:
             st.subheader("📝 Simple Edit Mode")
@@ -845,22 +903,93 @@ with tab2:
                 key="download_edited"
             )
 
+            if st.button("✅ Accept into Item Bank", key="accept_edited"):
+                save_to_item_bank(edited_batch)
+
 # =============================
 # TAB 3: DEBUG LOGS
 # =============================
 with tab3:
     st.header("🐛 Debug Logs")
     st.caption("Complete execution trace for troubleshooting")
+
+    cache_stats = llm_service.get_cache().stats()
+    st.caption(
+        f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024:.0f} KB)"
+    )
+
+    counters = metrics.snapshot()
+    if counters:
+        st.caption("Retries & repairs: " + ", ".join(f"{name} {value}" for name, value in counters.items()))
+
+    trace = st.session_state.trace
+    spans = trace.spans() if trace is not None else []
+    if spans:
+        st.subheader("Latency & Cost by Stage")
+        breakdown = pd.DataFrame(telemetry.summarise(spans, token_budget.MODEL_LIMITS))
+        st.dataframe(breakdown, use_container_width=True, hide_index=True)
+        st.caption(
+            f"{len(spans)} spans, {breakdown['prompt_tokens'].sum()} prompt tokens "
+            f"({breakdown['cached_tokens'].sum()} cached), {breakdown['completion_tokens'].sum()} completion tokens, "
+            f"about ${breakdown['cost_usd'].sum():.4f}"
+            + (f"; {trace.dropped} oldest spans dropped" if trace.dropped else "")
+        )
+        st.download_button(
+            label="📥 Download Telemetry (JSONL)",
+            data=trace.to_jsonl().encode('utf-8'),
+            file_name=f"telemetry_{time.strftime('%Y%m%d_%H%M%S')}.jsonl",
+            mime="application/jsonl",
+        )
     
-    if st.session_state.debug_logs:
-        debug_text = "\n".join(st.session_state.debug_logs)
-        st.text_area("Execution Log", debug_text, height=600, key="debug_log_display")
-        
+    log_store = st.session_state.debug_log
+    if log_store.count():
+        st.subheader("Execution Log")
+        col_level, col_page = st.columns(2)
+        with col_level:
+            min_level = st.selectbox("Minimum level", debug_log.LEVELS, key="debug_log_level")
+        total = log_store.count(min_level)
+        page_count = max(1, -(-total // DEBUG_LOG_PAGE_SIZE))
+        with col_page:
+            page = st.number_input(f"Page (of {page_count}, newest last)", 1, page_count, page_count)
+
+        entries = log_store.entries(min_level, (page - 1) * DEBUG_LOG_PAGE_SIZE, DEBUG_LOG_PAGE_SIZE)
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Time": time.strftime("%H:%M:%S", time.localtime(e["time"])),
+                    "Level": e["level"],
+                    "Message": e["message"],
+                    "Payload": f"{e['payload']['bytes'] / 1024:.1f} KB" if e["payload"] else ""
+                }
+                for e in entries
+            ]),
+            use_container_width=True,
+            hide_index=True,
+            height=400
+        )
+        st.caption(
+            f"{total} entries at {min_level} or above"
+            + (f"; {log_store.dropped} oldest entries dropped" if log_store.dropped else "")
+        )
+
+        # Payloads are read from disk only when picked, one page at a time
+        payloads = [e["payload"] for e in entries if e["payload"]]
+        if payloads:
+            labels = {i: f"{p['label']} ({p['bytes'] / 1024:.1f} KB)" for i, p in enumerate(payloads)}
+            choice = st.selectbox("Payload on this page", [None] + list(labels),
+                                  format_func=lambda i: "—" if i is None else labels[i], key="debug_payload")
+            if choice is not None:
+                payload = payloads[choice]
+                payload_page = 1
+                if payload["pages"] > 1:
+                    payload_page = st.number_input(f"Payload page (of {payload['pages']})", 1, payload["pages"], 1)
+                st.code(debug_log.read_payload(payload, payload_page - 1), language=None)
+
         # Download debug logs
-        log_data = debug_text.encode('utf-8')
         st.download_button(
             label="📥 Download Debug Logs",
-            data=log_data,
+            data=log_store.to_text(min_level).encode('utf-8'),
             file_name=f"debug_log_{time.strftime('%Y%m%d_%H%M%S')}.txt",
             mime="text/plain",
         )
@@ -868,5 +997,5 @@ with tab3:
         st.info("No debug logs available. Generate a batch to see execution details.")
     
     if st.button("Clear Debug Logs"):
-        st.session_state.debug_logs = []
+        st.session_state.debug_log.clear()
         st.rerun()
@@ -0,0 +1,321 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+TRACE_FILE = "telemetry.jsonl"
+
+# Spans a trace keeps; older ones are dropped first, so a long run cannot grow memory without bound
+MAX_SPANS = 20000
+
+# Share of the input price the provider charges for prompt tokens served from its prefix cache
+CACHED_INPUT_PRICE_FACTOR = 0.5
+
+# Numeric attributes summed per stage by summarise()
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+_current_trace = contextvars.ContextVar("telemetry_trace", default=None)
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+_otel_tracer = None
+
+
+# --------------------------------------------------------------------------
+# Spans and Traces
+# --------------------------------------------------------------------------
+class Span:
+    """
+    One timed step of a run ("plan", "prompt", "llm", "parse", "extract", "assemble",
+    ...) with free-form attributes: the stage it belongs to, token counts from the
+    API's usage field, queue wait, time to first token, errors.
+    """
+
+    def __init__(self, name, trace=None, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        self.status = "ok"
+        self.start = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+        self._otel = None
+        if _otel_tracer is not None:
+            context = otel_trace.set_span_in_context(parent._otel) if parent and parent._otel else None
+            self._otel = _otel_tracer.start_span(name, context=context, start_time=time.time_ns())
+
+    def set(self, **attributes):
+        self.attributes.update((k, v) for k, v in attributes.items() if v is not None)
+
+    def add(self, name, amount):
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def fail(self, error):
+        self.status = "error"
+        self.attributes["error"] = str(error)
+
+    def finish(self):
+        self.duration = self.elapsed()
+        if self._otel is not None:
+            self._otel.set_attributes({
+                k: v for k, v in self.attributes.items() if isinstance(v, (str, bool, int, float))
+            })
+            if self.status == "error":
+                self._otel.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, self.attributes.get("error")))
+            self._otel.end()
+        if self.trace is not None:
+            self.trace.record(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id if self.trace is not None else None,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+
+class _NullSpan:
+    """
+    Stands in for a span while nothing is being recorded.
+    """
+    attributes = {}
+
+    def elapsed(self):
+        return 0.0
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name, amount):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    The finished spans of one run, in the order they finished. Thread-safe; keeps the
+    newest max_spans spans and counts the ones it had to drop.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.trace_id = uuid.uuid4().hex
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span.to_dict())
+            if len(self._spans) > self.max_spans:
+                excess = len(self._spans) - self.max_spans
+                del self._spans[:excess]
+                self.dropped += excess
+
+    def spans(self, since=None):
+        """
+        Span dicts, optionally only those started at or after the epoch time since.
+        """
+        with self._lock:
+            spans = list(self._spans)
+        return spans if since is None else [s for s in spans if s["start"] >= since]
+
+    def export_jsonl(self, path, since=None):
+        """
+        Writes the spans to path, one JSON object per line. Returns the number written.
+        """
+        spans = self.spans(since)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    @classmethod
+    def load_jsonl(cls, path, max_spans=MAX_SPANS):
+        """
+        A Trace holding the spans export_jsonl() wrote to path, e.g. by another process.
+        """
+        trace = cls(max_spans)
+        with open(path, encoding="utf-8") as f:
+            trace._spans = [json.loads(line) for line in f if line.strip()][-max_spans:]
+        return trace
+
+    def to_jsonl(self):
+        return "".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in self.spans())
+
+    def summary(self, prices=None):
+        return summarise(self.spans(), prices)
+
+
+# --------------------------------------------------------------------------
+# Recording
+# --------------------------------------------------------------------------
+def activate(trace):
+    """
+    Makes trace the one spans are recorded into in this context. Returns a token for
+    deactivate(); prefer collect() where a with-block fits.
+    """
+    return _current_trace.set(trace)
+
+
+def deactivate(token):
+    _current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def collect(trace=None):
+    """
+    Records the spans opened inside the block (on this thread, and on threads started
+    through bind()) into trace, or a new Trace, which it yields.
+    """
+    trace = trace or Trace()
+    token = activate(trace)
+    try:
+        yield trace
+    finally:
+        deactivate(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Times the block as a child of the current span. Yields the span so the block can
+    add attributes; an exception marks it failed and propagates. Without an active
+    trace or OpenTelemetry this does nothing but yield NULL_SPAN.
+    """
+    trace = _current_trace.get()
+    if trace is None and _otel_tracer is None:
+        yield NULL_SPAN
+        return
+
+    current = Span(name, trace, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+def annotate(**attributes):
+    """
+    Sets attributes on the current span, if any.
+    """
+    (_current_span.get() or NULL_SPAN).set(**attributes)
+
+
+def add(name, amount):
+    """
+    Adds amount to a numeric attribute of the current span, if any.
+    """
+    (_current_span.get() or NULL_SPAN).add(name, amount)
+
+
+def bind(fn):
+    """
+    Wraps fn to run in a copy of the calling context, so spans it opens on a worker
+    thread join the caller's trace under the caller's current span. Bind once per
+    thread or task: one copy cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def enable_opentelemetry(tracer_provider=None):
+    """
+    Also sends every span to OpenTelemetry, through tracer_provider or the global one
+    (configure its exporter as usual, e.g. with opentelemetry-instrument and the
+    OTEL_* environment variables). Returns False if opentelemetry is not installed.
+    """
+    global _otel_tracer
+    if otel_trace is None:
+        return False
+    _otel_tracer = otel_trace.get_tracer("elt_generator", tracer_provider=tracer_provider)
+    return True
+
+
+# --------------------------------------------------------------------------
+# Summary
+# --------------------------------------------------------------------------
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarise(spans, prices=None):
+    """
+    One row per (span name, stage): count, errors, p50/p95/total seconds, mean queue
+    wait and time to first token where recorded, summed token counts and, with
+    prices ({model: {"input_cost", "output_cost"}} in USD per 1M tokens, like
+    token_budget.MODEL_LIMITS), the cost of the calls.
+    """
+    groups = {}
+    for s in spans:
+        attributes = s.get("attributes") or {}
+        groups.setdefault((s["name"], attributes.get("stage", "")), []).append(s)
+
+    rows = []
+    for (name, stage), group in sorted(groups.items()):
+        durations = sorted(s["duration"] or 0.0 for s in group)
+        row = {
+            "span": name,
+            "stage": stage,
+            "count": len(group),
+            "errors": sum(1 for s in group if s["status"] == "error"),
+            "p50_s": _percentile(durations, 0.5),
+            "p95_s": _percentile(durations, 0.95),
+            "total_s": sum(durations)
+        }
+        for field in ("queue_wait", "ttft"):
+            values = [s["attributes"][field] for s in group if field in s["attributes"]]
+            row[f"mean_{field}_s"] = sum(values) / len(values) if values else None
+        for field in TOKEN_FIELDS:
+            row[field] = sum(s["attributes"].get(field, 0) for s in group)
+
+        if prices is not None:
+            cost = 0.0
+            for s in group:
+                attributes = s["attributes"]
+                price = prices.get(attributes.get("model"))
+                if not price:
+                    continue
+                cached = attributes.get("cached_tokens", 0)
+                uncached = attributes.get("prompt_tokens", 0) - cached
+                cost += (uncached * price["input_cost"]
+                         + cached * price["input_cost"] * CACHED_INPUT_PRICE_FACTOR
+                         + attributes.get("completion_tokens", 0) * price["output_cost"]) / 1_000_000
+            row["cost_usd"] = cost
+        rows.append(row)
+    return rows
@@ -55,3 +55,67 @@ def create_job_list(
         job_list.append(job)
         
     return job_list
+
+
+# Rough completion size per item for each Sequential Batch stage (tokens).
+# Stage 2 and 3 carry a written justification per option, so they are the largest.
+STAGE_OUTPUT_TOKENS_PER_ITEM = {
+    "stage1": 170,
+    "stage2": 220,
+    "stage3": 230
+}
+
+
+def plan_chunk_size(max_output_tokens=4096, tokens_per_item=None, safety_margin=0.8, overhead_tokens=50):
+    """
+    Works out how many jobs fit in one Sequential Batch call without the
+    largest stage's output running past max_output_tokens.
+    """
+    if tokens_per_item is None:
+        tokens_per_item = max(STAGE_OUTPUT_TOKENS_PER_ITEM.values())
+
+    budget = max_output_tokens * safety_margin - overhead_tokens
+    return max(1, int(budget // tokens_per_item))
+
+
+def chunk_job_list(job_list, chunk_size):
+    """
+    Splits the job list into evenly sized chunks of at most chunk_size jobs,
+    preserving job order (e.g. 50 jobs at size 14 -> 13, 13, 12, 12).
+    """
+    if not job_list:
+        return []
+
+    chunk_count = -(-len(job_list) // max(1, chunk_size))
+    base, extra = divmod(len(job_list), chunk_count)
+
+    chunks = []
+    start = 0
+    for i in range(chunk_count):
+        size = base + (1 if i < extra else 0)
+        chunks.append(job_list[start:start + size])
+        start += size
+    return chunks
+
+
+def describe_other_chunks(chunks, chunk_index=None):
+    """
+    Summarises the topic/focus pairs assigned to the other chunks of a split batch.
+    Each chunk's Stage 1 prompt carries this so it can steer away from scenarios
+    the parallel calls are likely to produce. With chunk_index None every chunk is
+    listed, for a call made apart from all of them (regenerating near-duplicates).
+    """
+    if len(chunks) <= 1 and chunk_index is not None:
+        return ""
+
+    lines = []
+    for i, chunk in enumerate(chunks):
+        if i == chunk_index:
+            continue
+        pairs = []
+        for job in chunk:
+            pair = f"{job['context']} / {job['focus']}"
+            if pair not in pairs:
+                pairs.append(pair)
+        lines.append(f"- Part {i + 1}: " + "; ".join(pairs))
+    return "\n".join(lines)
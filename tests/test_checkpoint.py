@@ -0,0 +1,95 @@
+import os
+import pytest
+import checkpoint
+import mock_llm
+import pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JOBS = [
+    {"job_id": f"J{i}", "type": "Grammar", "cefr": "B1", "focus": "Present perfect", "context": "Work - email"}
+    for i in range(1, 5)
+]
+
+
+@pytest.fixture
+def banks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return pipeline.load_example_banks(os.path.join(ROOT, "grammar_bank.csv"), os.path.join(ROOT, "vocab_bank.csv"))
+
+
+class FailingFor:
+    """
+    Wraps FakeLLM, failing every call whose user prompt mentions one of the given ids.
+    """
+
+    def __init__(self, failing=()):
+        self.fake = mock_llm.FakeLLM(latency=0)
+        self.failing = set(failing)
+        self.prompts = []
+
+    def __call__(self, messages, *args, **kwargs):
+        self.prompts.append(messages[1])
+        if any(job_id in messages[1] for job_id in self.failing):
+            return "Error: Simulated API error."
+        return self.fake(messages, *args, **kwargs)
+
+
+def run(banks, llm, run_dir, strategy="Holistic (1-Call)"):
+    return pipeline.generate_batch(JOBS, strategy, banks, "sk-test", llm=llm, run_dir=run_dir,
+                                   use_cache=False, dedup_threshold=None)
+
+
+def test_resume_reissues_only_the_failed_jobs(banks, tmp_path):
+    run_dir = os.path.join(tmp_path, "run")
+    first = run(banks, FailingFor({"J3"}), run_dir)
+
+    assert len(first["errors"]) == 1
+    assert sorted(q["Item Number"] for q in first["questions"]) == ["J1", "J2", "J4"]
+    assert checkpoint.RunStore.open(run_dir).summary() == {"completed_units": 3, "failed_units": 1}
+
+    llm = FailingFor()
+    resumed = pipeline.resume_batch(run_dir, banks, "sk-test", llm=llm, use_cache=False, dedup_threshold=None)
+
+    assert resumed["errors"] == []
+    assert [q["Item Number"] for q in resumed["questions"]] == ["J1", "J2", "J3", "J4"]
+    assert len(llm.prompts) == 1 and "J3" in llm.prompts[0]
+    store = checkpoint.RunStore.open(run_dir)
+    assert store.summary() == {"completed_units": 4, "failed_units": 0}
+    assert store.manifest["status"] == "complete"
+
+
+def test_resume_of_a_finished_run_makes_no_calls(banks, tmp_path):
+    run_dir = os.path.join(tmp_path, "run")
+    first = run(banks, FailingFor(), run_dir)
+
+    llm = FailingFor()
+    resumed = pipeline.resume_batch(run_dir, banks, "sk-test", llm=llm, use_cache=False, dedup_threshold=None)
+
+    assert llm.prompts == []
+    assert [q["Item Number"] for q in resumed["questions"]] == [q["Item Number"] for q in first["questions"]]
+
+
+def test_sequential_resume_starts_again_at_the_failed_stage(banks, tmp_path):
+    run_dir = os.path.join(tmp_path, "run")
+    fake = mock_llm.FakeLLM(latency=0)
+
+    def no_stage2(messages, *args, **kwargs):
+        if '"distractors"' in messages[0]:
+            return "Error: Simulated API error."
+        return fake(messages, *args, **kwargs)
+
+    first = run(banks, no_stage2, run_dir, "Sequential Batch (3-Call)")
+
+    assert first["errors"] == [{"scope": "Chunk 1", "error": "Stage 2 failed: Error: Simulated API error."}]
+    units = [(r["unit"], r["status"]) for r in checkpoint.RunStore.open(run_dir).records()]
+    assert units == [("chunk-0/stage1", "ok"), ("chunk-0/stage2", "failed")]
+
+    llm = FailingFor()
+    resumed = pipeline.resume_batch(run_dir, banks, "sk-test", llm=llm, use_cache=False, dedup_threshold=None)
+
+    assert resumed["errors"] == []
+    assert [q["Item Number"] for q in resumed["questions"]] == ["J1", "J2", "J3", "J4"]
+    # Stage 1 is read back from the checkpoint, so only stages 2 and 3 are requested
+    assert len(llm.prompts) == 2
+    assert checkpoint.RunStore.open(run_dir).summary() == {"completed_units": 3, "failed_units": 0}
@@ -0,0 +1,72 @@
+import pytest
+import dedup
+
+TOWN = "She has lived in this small town near the river since she was a child."
+VILLAGE = "She has lived in this small village near the river since she was a child."
+MEETING = "The meeting was moved to Friday because the manager is travelling."
+
+
+def sentence(number, text):
+    return {"Item Number": number, "Complete Sentence": text}
+
+
+def test_identical_sentences_are_duplicates():
+    duplicates = dedup.find_duplicates([sentence("J1", TOWN), sentence("J2", TOWN)])
+
+    assert duplicates == {1: (("batch", "J1"), 1.0)}
+
+
+def test_unrelated_sentences_are_not_duplicates():
+    assert dedup.find_duplicates([sentence("J1", TOWN), sentence("J2", MEETING)], threshold=0.3) == {}
+
+
+@pytest.mark.parametrize("threshold, flagged", [(0.5, True), (0.6, True), (0.9, False), (1.0, False)])
+def test_one_changed_word_is_flagged_below_its_similarity(threshold, flagged):
+    duplicates = dedup.find_duplicates([sentence("J1", TOWN), sentence("J2", VILLAGE)], threshold=threshold)
+
+    assert (1 in duplicates) is flagged
+    if flagged:
+        (source, key), similarity = duplicates[1]
+        assert (source, key) == ("batch", "J1")
+        assert threshold <= similarity < 1.0
+
+
+def test_questions_are_compared_with_their_answer_filled_in():
+    question = {
+        "Item Number": "J2",
+        "Question Prompt": "SHE HAS LIVED in this small town, near the river, ____ she was a child!",
+        "Correct Answer": "B",
+        "Answer B": "since"
+    }
+
+    assert dedup.find_duplicates([sentence("J1", TOWN), question]) == {1: (("batch", "J1"), 1.0)}
+
+
+def test_only_the_first_of_repeated_items_is_kept():
+    items = [sentence("J1", TOWN), sentence("J2", TOWN), sentence("J3", TOWN)]
+
+    duplicates = dedup.find_duplicates(items)
+
+    assert sorted(duplicates) == [1, 2]
+    assert all(key == ("batch", "J1") for key, _ in duplicates.values())
+
+
+def test_items_already_in_the_bank_are_duplicates():
+    bank = dedup.NearDuplicateIndex(0.6)
+    bank.add("stored-hash", dedup.signature(dedup.item_text(sentence("S1", TOWN))))
+
+    duplicates = dedup.find_duplicates([sentence("J1", MEETING), sentence("J2", VILLAGE)], bank, 0.6)
+
+    assert list(duplicates) == [1]
+    assert duplicates[1][0] == ("bank", "stored-hash")
+
+
+def test_a_bank_duplicate_is_not_indexed_for_later_items():
+    bank = dedup.NearDuplicateIndex()
+    bank.add("stored-hash", dedup.signature(dedup.item_text(sentence("S1", TOWN))))
+
+    duplicates = dedup.find_duplicates([sentence("J1", TOWN), sentence("J2", TOWN)], bank)
+
+    # J1 was itself a duplicate, so J2 is matched against the bank rather than J1
+    assert duplicates[0][0] == ("bank", "stored-hash")
+    assert duplicates[1][0] == ("bank", "stored-hash")
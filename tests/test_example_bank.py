@@ -0,0 +1,28 @@
+import os
+import pickle
+import threading
+import pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_banks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return pipeline.load_example_banks(
+        os.path.join(ROOT, "grammar_bank.csv"), os.path.join(ROOT, "vocab_bank.csv")
+    )
+
+
+def test_loaded_banks_pickle(tmp_path, monkeypatch):
+    # streamlit_app caches the banks with st.cache_data, which pickles them
+    banks = load_banks(tmp_path, monkeypatch)
+    job = {"job_id": "J1", "type": "Grammar", "cefr": "B1", "focus": "Present perfect", "context": ""}
+    expected = banks["index"].nearest(job)
+
+    restored = pickle.loads(pickle.dumps(banks))
+
+    index = restored["index"]
+    assert index._nearest == {}
+    assert isinstance(index._nearest_lock, type(threading.Lock()))
+    assert index.nearest(job) == expected
+    assert index.examples_for(job) == banks["index"].examples_for(job)
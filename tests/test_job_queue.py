@@ -0,0 +1,193 @@
+import os
+import types
+import pytest
+import job_queue
+import llm_service
+import mock_llm
+import pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JOBS = [
+    {"job_id": f"J{i}", "type": "Grammar", "cefr": "B1", "focus": "Present perfect", "context": "Work - email"}
+    for i in range(1, 4)
+]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_queue, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return job_queue.JobQueue(os.path.join(tmp_path, "queue.sqlite3"), os.path.join(tmp_path, "runs"))
+
+
+def stall(queue, clock):
+    """
+    Lets every running job's heartbeat go stale and requeues them.
+    """
+    clock[0] += job_queue.STALE_SECONDS + 1
+    return queue.requeue_stale()
+
+
+# --------------------------------------------------------------------------
+# Claiming
+# --------------------------------------------------------------------------
+def test_claim_takes_the_oldest_queued_job(queue):
+    first = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.submit(JOBS, "Holistic (1-Call)", "ana")
+
+    job = queue.claim("w1", max_per_user=2)
+
+    assert job["id"] == first
+    assert job["status"] == "running"
+    assert job["worker"] == "w1"
+    assert job["attempts"] == 1
+    assert queue.claim("w2", max_per_user=2)["id"] == first + 1
+    assert queue.claim("w3", max_per_user=2) is None
+
+
+def test_claim_keeps_each_user_to_max_per_user(queue):
+    queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    bo = queue.submit(JOBS, "Holistic (1-Call)", "bo")
+
+    assert queue.claim("w1")["user"] == "ana"
+    # ana already has one running job, so the later job of bo goes first
+    assert queue.claim("w2")["id"] == bo
+    assert queue.claim("w3") is None
+
+
+def test_cancel_a_queued_job_at_once_and_a_running_one_at_its_heartbeat(queue):
+    queued = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    running = queue.submit(JOBS, "Holistic (1-Call)", "bo")
+    queue.claim("w1")
+    queue.claim("w2")
+    waiting = queue.submit(JOBS, "Holistic (1-Call)", "cy")
+
+    assert queue.cancel(waiting)
+    assert queue.get(waiting)["status"] == "cancelled"
+    assert queue.claim("w3") is None
+
+    assert queue.cancel(running)
+    assert queue.heartbeat("w2", running) is True
+    assert queue.heartbeat("w1", queued) is False
+
+
+# --------------------------------------------------------------------------
+# Requeueing Stale Jobs
+# --------------------------------------------------------------------------
+def test_a_job_whose_worker_went_quiet_is_requeued(queue, clock):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.claim("w1")
+
+    clock[0] += job_queue.STALE_SECONDS - 1
+    assert queue.requeue_stale() == 0
+    assert stall(queue, clock) == 1
+
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["worker"] is None
+    assert queue.claim("w2")["attempts"] == 2
+
+
+def test_heartbeats_keep_a_job_claimed(queue, clock):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.claim("w1")
+
+    for _ in range(3):
+        clock[0] += job_queue.STALE_SECONDS / 2
+        queue.heartbeat("w1", job_id)
+        assert queue.requeue_stale() == 0
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_a_job_fails_after_max_attempts(queue, clock):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    for attempt in range(job_queue.MAX_ATTEMPTS):
+        assert queue.claim(f"w{attempt}")["attempts"] == attempt + 1
+        stall(queue, clock)
+
+    assert queue.get(job_id)["status"] == "failed"
+    assert queue.claim("w9") is None
+
+
+def test_live_items_keep_their_seq_across_a_requeue(queue, clock):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.claim("w1")
+    queue.add_item(job_id, {"Item Number": "J1"}, "w1")
+    seen = queue.items(job_id)
+    assert seen == [(1, {"Item Number": "J1"})]
+
+    stall(queue, clock)
+    queue.claim("w2")
+    queue.add_item(job_id, {"Item Number": "J1"}, "w2")
+    queue.add_item(job_id, {"Item Number": "J2"}, "w2")
+
+    assert queue.items(job_id, after=seen[-1][0]) == [(2, {"Item Number": "J1"}), (3, {"Item Number": "J2"})]
+
+
+# --------------------------------------------------------------------------
+# Ownership
+# --------------------------------------------------------------------------
+def test_a_stalled_worker_can_no_longer_write_to_its_old_job(queue, clock):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    queue.claim("w1")
+    stall(queue, clock)
+    queue.claim("w2")
+
+    queue.add_item(job_id, {"Item Number": "late"}, "w1")
+    queue.progress(job_id, 3, 3, "late", "w1")
+
+    assert queue.heartbeat("w1", job_id) is True
+    assert queue.finish(job_id, "done", "w1", 3) is False
+    assert not queue.owns("w1", job_id)
+    job = queue.get(job_id)
+    assert (job["status"], job["completed"], job["worker"]) == ("running", 0, "w2")
+    assert queue.items(job_id) == []
+
+    assert queue.owns("w2", job_id)
+    queue.add_item(job_id, {"Item Number": "J1"}, "w2")
+    assert queue.finish(job_id, "done", "w2", 1) is True
+    assert queue.get(job_id)["status"] == "done"
+    # The result file has the questions now
+    assert queue.items(job_id) == []
+
+
+# --------------------------------------------------------------------------
+# Running Jobs
+# --------------------------------------------------------------------------
+def test_run_job_generates_and_records_the_result(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fake = mock_llm.FakeLLM(latency=0)
+    monkeypatch.setattr(llm_service, "call_llm", fake)
+    banks = pipeline.load_example_banks(os.path.join(ROOT, "grammar_bank.csv"), os.path.join(ROOT, "vocab_bank.csv"))
+    seen = []
+    monkeypatch.setattr(queue, "add_item", lambda job_id, question, worker_id: seen.append(question["Item Number"]))
+
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana", use_cache=False)
+    job = queue.claim("w1")
+    job_queue.run_job(queue, job, "w1", lambda: banks, "sk-test")
+
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["questions"] == len(JOBS)
+    assert sorted(seen) == ["J1", "J2", "J3"]
+    result = queue.results(job_id)
+    assert [q["Item Number"] for q in result["questions"]] == ["J1", "J2", "J3"]
+    assert fake.calls >= len(JOBS)
+
+
+def test_run_job_fails_the_job_when_the_banks_cannot_be_loaded(queue):
+    job_id = queue.submit(JOBS, "Holistic (1-Call)", "ana")
+    job = queue.claim("w1")
+
+    job_queue.run_job(queue, job, "w1", lambda: None, "sk-test")
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "could not be loaded" in job["errors"][0]["error"]
@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+import job_runner
+
+
+def slow_stage(state, emit):
+    time.sleep(0.005)
+    emit(state["n"])
+    return dict(state, seen=state.get("seen", 0) + 1)
+
+
+STAGES = [("Stage 1", slow_stage, 2), ("Stage 2", slow_stage, 3), ("Stage 3", slow_stage, 1)]
+
+
+def wait_for_threads(count, timeout=2.0):
+    deadline = time.time() + timeout
+    while threading.active_count() > count and time.time() < deadline:
+        time.sleep(0.01)
+    return threading.active_count()
+
+
+def test_staged_pipeline_returns_states_in_input_order():
+    results = job_runner.run_staged_pipeline([{"n": i} for i in range(20)], STAGES, queue_size=1)
+
+    assert [state["n"] for state in results] == list(range(20))
+    assert all(state["seen"] == 3 for state in results)
+
+
+def test_staged_pipeline_skips_later_stages_after_an_error():
+    def failing(state, emit):
+        raise ValueError("bad item")
+
+    results = job_runner.run_staged_pipeline([{"n": 0}], [("Stage 1", failing, 1)] + STAGES[1:])
+
+    assert results[0]["error"] == "Unexpected error in Stage 1: bad item"
+    assert "seen" not in results[0]
+
+
+@pytest.mark.parametrize("callback", ["on_result", "on_event"])
+def test_staged_pipeline_stops_its_threads_when_a_callback_raises(callback):
+    before = threading.active_count()
+
+    def boom(*args):
+        raise RuntimeError("callback failed")
+
+    with pytest.raises(RuntimeError, match="callback failed"):
+        job_runner.run_staged_pipeline([{"n": i} for i in range(50)], STAGES, queue_size=1, **{callback: boom})
+
+    assert wait_for_threads(before) == before
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import httpx
+import pytest
+from openai import AsyncOpenAI, OpenAI
+import llm_service
+import mock_llm
+import response_cache
+
+PRIMARY = "primary-model"
+FALLBACK = "fallback-model"
+MESSAGES = ("You write grammar distractors.", "Write distractors for these items.")
+
+
+class FakeAPI:
+    """
+    Chat Completions over httpx.MockTransport: models in rate_limited answer 429,
+    the rest answer with mock_llm's fake completion.
+    """
+
+    def __init__(self, rate_limited=()):
+        self.rate_limited = set(rate_limited)
+        self.requests = []
+
+    def handle(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body["model"])
+        if body["model"] in self.rate_limited:
+            return httpx.Response(429, headers={"retry-after": "30"},
+                                  json={"error": {"message": "Rate limit reached", "type": "rate_limit_error"}})
+        return httpx.Response(200, json=mock_llm._completion_body(body, len(self.requests)))
+
+    def client(self, api_key, model=None):
+        return OpenAI(api_key=api_key, max_retries=0, base_url="http://api.test/v1",
+                      http_client=httpx.Client(transport=httpx.MockTransport(self.handle)))
+
+    def async_client(self, api_key, model=None):
+        return AsyncOpenAI(api_key=api_key, max_retries=0, base_url="http://api.test/v1",
+                           http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = response_cache.ResponseCache(os.path.join(tmp_path, "responses.sqlite3"))
+    monkeypatch.setattr(llm_service, "_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeAPI()
+    monkeypatch.setattr(llm_service, "get_client", api.client)
+    monkeypatch.setattr(llm_service, "get_async_client", api.async_client)
+    monkeypatch.setattr(llm_service, "_router", None)
+    llm_service.configure_router(["sk-test"], {"stage2": (PRIMARY, FALLBACK)})
+    return api
+
+
+def cache_key(model):
+    return llm_service._cache_key(llm_service.build_request(MESSAGES, model, 4096))
+
+
+def test_an_answer_from_the_primary_model_is_cached_under_it(api, cache):
+    first = llm_service.call_llm(MESSAGES, "sk-test", stage="stage2")
+    again = llm_service.call_llm(MESSAGES, "sk-test", stage="stage2")
+
+    assert not first.startswith("Error:")
+    assert again == first
+    assert api.requests == [PRIMARY]
+    assert cache.get(cache_key(PRIMARY)) == first
+
+
+def test_a_failover_answer_is_cached_under_the_model_that_answered(api, cache):
+    api.rate_limited.add(PRIMARY)
+
+    content = llm_service.call_llm(MESSAGES, "sk-test", stage="stage2")
+
+    assert not content.startswith("Error:")
+    assert api.requests == [PRIMARY, FALLBACK]
+    assert cache.get(cache_key(PRIMARY)) is None
+    assert cache.get(cache_key(FALLBACK)) == content
+
+
+def test_a_failover_answer_is_not_served_later_as_the_primary_models(api, cache):
+    api.rate_limited.add(PRIMARY)
+    llm_service.call_llm(MESSAGES, "sk-test", stage="stage2")
+    api.rate_limited.clear()
+    for endpoint in llm_service.get_router().endpoints.values():
+        endpoint.blocked_until = 0.0
+
+    llm_service.call_llm(MESSAGES, "sk-test", stage="stage2")
+
+    # The primary model is asked again rather than answered from the fallback's entry
+    assert api.requests == [PRIMARY, FALLBACK, PRIMARY]
+
+
+def test_an_async_failover_answer_is_cached_under_the_model_that_answered(api, cache):
+    api.rate_limited.add(PRIMARY)
+
+    content = asyncio.run(llm_service.call_llm_async(MESSAGES, "sk-test", stage="stage2"))
+
+    assert not content.startswith("Error:")
+    assert api.requests == [PRIMARY, FALLBACK]
+    assert cache.get(cache_key(PRIMARY)) is None
+    assert cache.get(cache_key(FALLBACK)) == content
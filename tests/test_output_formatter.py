@@ -0,0 +1,119 @@
+import json
+import pytest
+import output_formatter
+import prompt_engineer
+from output_formatter import BLANK, answer_spans, blank_answer
+
+
+@pytest.mark.parametrize("sentence, answer, expected", [
+    # Inside a longer word
+    ("She has a cat.", "a", ("She has ____ cat.", 1)),
+    ("Another day, another dollar.", "other", ("Another day, another dollar.", 0)),
+    ("I have lived here since 2010.", "live", ("I have lived here since 2010.", 0)),
+    ("He isn't here.", "is", ("He isn't here.", 0)),
+    # Case
+    ("Have you ever been to Paris?", "have", ("____ you ever been to Paris?", 1)),
+    ("Look out below.", "Look Out", ("____ below.", 1)),
+    ("I WILL be there.", "will", ("I ____ be there.", 1)),
+    # Multiword
+    ("He gave up, finally.", "gave up", ("He ____, finally.", 1)),
+    ("It's going   to rain.", "going to", ("It's ____ rain.", 1)),
+    ("It's going\nto rain.", " going  to ", ("It's ____ rain.", 1)),
+    ("He gave it up.", "gave up", ("He gave it up.", 0)),
+    # Apostrophes
+    ("I can't go.", "can't", ("I ____ go.", 1)),
+    ("She didn’t come.", "didn't", ("She ____ come.", 1)),
+    ("She didn't come.", "didn’t", ("She ____ come.", 1)),
+    ("I can't go.", "can", ("I can't go.", 0)),
+    ("Anna's bag is here.", "Anna", ("Anna's bag is here.", 0)),
+    ("They play rock 'n' roll.", "'n'", ("They play rock ____ roll.", 1)),
+    # Hyphens
+    ("She is a well-known author.", "well-known", ("She is a ____ author.", 1)),
+    ("She is a well-known author.", "known", ("She is a well-known author.", 0)),
+    ("She is a well-known author.", "well", ("She is a well-known author.", 0)),
+    ("It was good - very good.", "very", ("It was good - ____ good.", 1)),
+    # Trailing punctuation
+    ("Stop!", "stop", ("____!", 1)),
+    ("Is this it?", "it", ("Is this ____?", 1)),
+    ("We met on Monday, not Tuesday.", "Monday", ("We met on ____, not Tuesday.", 1)),
+    ("He said \"yes\".", "yes", ("He said \"____\".", 1)),
+    ("It costs $5.", "$5", ("It costs ____.", 1)),
+    # Repeated occurrences: the first is blanked, all are counted
+    ("The dog saw another dog.", "dog", ("The ____ saw another dog.", 2)),
+    ("Dogs like dogs and DOGS.", "dogs", ("____ like dogs and DOGS.", 3)),
+    # No match
+    ("She went home.", "go", ("She went home.", 0)),
+    ("She went home.", "", ("She went home.", 0)),
+    ("", "home", ("", 0)),
+    (None, None, ("", 0)),
+])
+def test_blank_answer(sentence, answer, expected):
+    assert blank_answer(sentence, answer) == expected
+
+
+def test_answer_spans_cover_every_occurrence():
+    sentence = "The dog saw another dog."
+    spans = answer_spans(sentence, "DOG")
+    assert spans == [(4, 7), (20, 23)]
+    assert [sentence[start:end] for start, end in spans] == ["dog", "dog"]
+
+
+def test_answer_is_matched_literally():
+    # Regex characters in an answer are not a pattern
+    assert blank_answer("Is it a.b or axb?", "a.b") == ("Is it ____ or axb?", 1)
+    assert blank_answer("Try (again) later.", "(again)") == ("Try ____ later.", 1)
+
+
+def test_custom_blank():
+    assert blank_answer("She has a cat.", "cat", blank="[...]") == ("She has a [...].", 1)
+
+
+def stage_items(sentence, answer):
+    stage1 = {
+        "Item Number": "J1",
+        "Assessment Focus": "Present perfect",
+        "Category": "Grammar",
+        "Complete Sentence": sentence,
+        "Correct Answer": answer,
+        "Context Clue Location": "since"
+    }
+    stage2 = {"Item Number": "J1", "Distractor A": "live", "Distractor B": "lives", "Distractor C": "living"}
+    return stage1, stage2
+
+
+def test_batch_stage3_prompt_shows_the_blanked_question():
+    job = {"job_id": "J1", "cefr": "B1"}
+    stage1, stage2 = stage_items("I have lived here since 2010.", "have lived")
+
+    _, user_msg = prompt_engineer.create_sequential_batch_stage3_prompt([job], [stage1], [stage2])
+
+    questions = json.loads(user_msg.split("COMPLETE QUESTIONS BATCH:", 1)[1])
+    assert questions[0]["Question Prompt"] == f"I {BLANK} here since 2010."
+    assert questions[0]["Correct Answer"] == "have lived"
+
+
+def test_batch_stage3_prompt_keeps_an_unmatched_sentence_whole():
+    job = {"job_id": "J1", "cefr": "B1"}
+    stage1, stage2 = stage_items("She is a well-known author.", "known")
+
+    _, user_msg = prompt_engineer.create_sequential_batch_stage3_prompt([job], [stage1], [stage2])
+
+    questions = json.loads(user_msg.split("COMPLETE QUESTIONS BATCH:", 1)[1])
+    assert questions[0]["Question Prompt"] == "She is a well-known author."
+
+
+def test_single_stage3_prompt_blanks_the_answer():
+    job = {"job_id": "J1", "cefr": "B1"}
+    stage1, stage2 = stage_items("Have you ever been to Paris?", "have")
+
+    _, user_msg = prompt_engineer.create_sequential_stage3_prompt(job, stage1, stage2)
+
+    assert f"Question: {BLANK} you ever been to Paris?" in user_msg
+
+
+def test_assembled_question_uses_the_same_blanking():
+    stage1, stage2 = stage_items("The dog saw another dog.", "dog")
+
+    question = output_formatter.assemble_sequential_questions([stage1], [stage2])[0]
+
+    assert question["Question Prompt"] == f"The {BLANK} saw another dog."
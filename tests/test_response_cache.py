@@ -0,0 +1,95 @@
+import os
+import types
+import pytest
+import response_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def open_cache(tmp_path, **limits):
+    return response_cache.ResponseCache(os.path.join(tmp_path, "responses.sqlite3"), **limits)
+
+
+def test_hit_and_miss(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.put("a", '{"x": 1}')
+
+    assert cache.get("a") == '{"x": 1}'
+    assert cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 8}
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    cache.put("a", "old")
+
+    clock[0] += 59
+    assert cache.get("a") == "old"
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_dropped_on_put(tmp_path, clock):
+    cache = open_cache(tmp_path, ttl_seconds=60)
+    cache.put("a", "old")
+    clock[0] += 61
+    cache.put("b", "new")
+
+    assert cache.stats()["entries"] == 1
+    assert cache.get("b") == "new"
+
+
+def test_least_recently_used_entry_is_evicted_first(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=2)
+    cache.put("a", "1")
+    clock[0] += 1
+    cache.put("b", "2")
+    clock[0] += 1
+    assert cache.get("a") == "1"  # a is now more recent than b
+
+    clock[0] += 1
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["entries"] == 2
+
+
+def test_size_limit_evicts_until_within_bytes(tmp_path, clock):
+    cache = open_cache(tmp_path, max_bytes=10)
+    for i, key in enumerate("abc"):
+        clock[0] += 1
+        cache.put(key, "x" * 4)
+
+    assert cache.stats()["bytes"] <= 10
+    assert cache.get("a") is None
+    assert cache.get("c") == "xxxx"
+
+
+def test_replacing_an_entry_keeps_the_counts(tmp_path, clock):
+    cache = open_cache(tmp_path)
+    cache.put("a", "1234")
+    cache.put("a", "12")
+
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 2
+
+
+def test_counts_survive_reopening(tmp_path, clock):
+    cache = open_cache(tmp_path, max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.close()
+
+    reopened = open_cache(tmp_path, max_entries=2)
+    clock[0] += 1
+    reopened.put("c", "3")
+
+    assert reopened.stats()["entries"] == 2
@@ -0,0 +1,262 @@
+import json
+import math
+import os
+import threading
+import llm_service
+import prompt_engineer
+import test_planner
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_HISTORY_PATH = os.path.join(".llm_cache", "token_history.json")
+
+# Context window, output cap and list price (USD per 1M tokens) per model.
+MODEL_LIMITS = {
+    "gpt-4-turbo-preview": {"context": 128000, "max_output": 4096, "input_cost": 10.0, "output_cost": 30.0},
+    "gpt-4-turbo": {"context": 128000, "max_output": 4096, "input_cost": 10.0, "output_cost": 30.0},
+    "gpt-4o": {"context": 128000, "max_output": 16384, "input_cost": 2.5, "output_cost": 10.0},
+    "gpt-4o-mini": {"context": 128000, "max_output": 16384, "input_cost": 0.15, "output_cost": 0.6}
+}
+DEFAULT_LIMITS = MODEL_LIMITS["gpt-4-turbo-preview"]
+
+# Output tokens per item before any history has been observed. The batch stages
+# share test_planner's figures; the per-job calls produce one item each.
+DEFAULT_TOKENS_PER_ITEM = dict(
+    test_planner.STAGE_OUTPUT_TOKENS_PER_ITEM,
+    holistic=260,
+    options=80,
+    stem=260
+)
+
+MIN_MAX_TOKENS = 256
+OUTPUT_HEADROOM = 1.25
+OUTPUT_OVERHEAD_TOKENS = 50
+HISTORY_SAMPLES = 50
+
+_encodings = {}
+_history = None
+_history_lock = threading.Lock()
+
+
+# --------------------------------------------------------------------------
+# Token Counting
+# --------------------------------------------------------------------------
+def _encoding(model):
+    """
+    The tiktoken encoding for a model, or None if tiktoken is missing or its encoding
+    files cannot be loaded (they are downloaded on first use).
+    """
+    if model not in _encodings:
+        encoding = None
+        if tiktoken is not None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                try:
+                    encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    encoding = None
+            except Exception:
+                encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, model=llm_service.DEFAULT_MODEL):
+    """
+    Counts tokens with tiktoken when it is available, else estimates ~4 characters per token.
+    """
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model=llm_service.DEFAULT_MODEL):
+    """
+    Prompt tokens for a [system, user] message pair, including the chat framing.
+    """
+    return sum(count_tokens(message, model) + 4 for message in messages) + 3
+
+
+def model_limits(model):
+    return MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+
+
+# --------------------------------------------------------------------------
+# Observed Output History
+# --------------------------------------------------------------------------
+class OutputHistory:
+    """
+    Recent output tokens per item for each stage ("stage1", "holistic", ...), kept on
+    disk so the estimates improve across runs. Only the last HISTORY_SAMPLES
+    observations per stage are kept.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.samples = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.samples = json.load(f)
+            except (OSError, ValueError):
+                self.samples = {}
+
+    def record(self, stage, item_count, output_tokens):
+        if item_count <= 0 or output_tokens <= 0:
+            return
+        with self._lock:
+            samples = self.samples.setdefault(stage, [])
+            samples.append(output_tokens / item_count)
+            del samples[:-HISTORY_SAMPLES]
+
+    def tokens_per_item(self, stage):
+        """
+        90th-percentile observed output tokens per item, or the default with no history.
+        """
+        with self._lock:
+            samples = sorted(self.samples.get(stage, []))
+        if not samples:
+            return DEFAULT_TOKENS_PER_ITEM.get(stage, max(DEFAULT_TOKENS_PER_ITEM.values()))
+        return samples[int(0.9 * (len(samples) - 1))]
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self.samples)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def get_history():
+    """
+    Returns the process-wide output history, loading it on first use.
+    """
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                _history = OutputHistory()
+    return _history
+
+
+# --------------------------------------------------------------------------
+# Budgets
+# --------------------------------------------------------------------------
+def estimate_output_tokens(stage, item_count):
+    per_item = get_history().tokens_per_item(stage)
+    return int(per_item * max(1, item_count) * OUTPUT_HEADROOM) + OUTPUT_OVERHEAD_TOKENS
+
+
+def stage_models(stage, model=llm_service.DEFAULT_MODEL):
+    """
+    Models a stage's calls can be answered by, the one tried first leading: the
+    router's models for the stage when one is configured, else just model.
+    """
+    router = llm_service.get_router()
+    return router.models_for(stage, model) if router is not None else (model,)
+
+
+def plan_max_tokens(messages, stage, item_count, model=None):
+    """
+    max_tokens for one call: the predicted output for item_count items plus headroom,
+    rounded up to a multiple of MIN_MAX_TOKENS and capped by the model's output limit
+    and whatever the prompt leaves of its context window.
+    Without model, the limits are those of the models the router may send the stage
+    to; the smallest applies, so a failover call is never asked for more than it allows.
+    """
+    models = (model,) if model else stage_models(stage)
+    max_output = min(model_limits(m)["max_output"] for m in models)
+    context = min(model_limits(m)["context"] for m in models)
+    wanted = estimate_output_tokens(stage, item_count)
+    wanted = MIN_MAX_TOKENS * math.ceil(wanted / MIN_MAX_TOKENS)
+    room = context - count_message_tokens(messages, models[0])
+    return max(MIN_MAX_TOKENS, min(wanted, max_output, room))
+
+
+def record_output(stage, item_count, raw_response, model=None):
+    get_history().record(stage, item_count, count_tokens(raw_response, model or stage_models(stage)[0]))
+
+
+def plan_chunk_size(model=llm_service.DEFAULT_MODEL):
+    """
+    Sequential Batch chunk size from the observed per-item output of the largest
+    stage, so a chunk's calls are split before they would run past the output limit.
+    """
+    history = get_history()
+    tokens_per_item = max(history.tokens_per_item(stage) for stage in test_planner.STAGE_OUTPUT_TOKENS_PER_ITEM)
+    return test_planner.plan_chunk_size(
+        max_output_tokens=model_limits(model)["max_output"],
+        tokens_per_item=tokens_per_item
+    )
+
+
+# --------------------------------------------------------------------------
+# Pre-flight Estimates
+# --------------------------------------------------------------------------
+def _placeholder_items(jobs, fields):
+    return [dict({field: "" for field in fields}, **{"Item Number": job["job_id"]}) for job in jobs]
+
+
+def estimate_batch(job_list, strategy, example_banks, chunk_size=None, model=llm_service.DEFAULT_MODEL):
+    """
+    Pre-flight estimate for a planned batch, before any call is made.
+    Prompts are built with prompt_engineer and counted; outputs are predicted from
+    history, and later stages' prompts are charged for the earlier output they embed.
+    Returns {"calls", "input_tokens", "output_tokens", "cost"}.
+    """
+    calls = []
+
+    def add(messages, stage, item_count, embedded_output=0):
+        calls.append((count_message_tokens(messages, model) + embedded_output,
+                      estimate_output_tokens(stage, item_count)))
+
+    if strategy == "Sequential Batch (3-Call)":
+        chunk_size = chunk_size or plan_chunk_size(model)
+        chunks = test_planner.chunk_job_list(job_list, chunk_size)
+        for i, chunk in enumerate(chunks):
+            overview = test_planner.describe_other_chunks(chunks, i)
+            stage1 = _placeholder_items(chunk, ["Complete Sentence", "Correct Answer"])
+            stage2 = _placeholder_items(chunk, ["Distractor A", "Distractor B", "Distractor C"])
+            stage1_tokens = estimate_output_tokens("stage1", len(chunk))
+            stage2_tokens = estimate_output_tokens("stage2", len(chunk))
+
+            add(prompt_engineer.create_sequential_batch_stage1_prompt(chunk, example_banks, overview),
+                "stage1", len(chunk))
+            if chunk[0]["type"] == "Vocabulary":
+                stage2_prompt = prompt_engineer.create_sequential_batch_stage2_vocabulary_prompt(chunk, stage1)
+            else:
+                stage2_prompt = prompt_engineer.create_sequential_batch_stage2_grammar_prompt(chunk, stage1)
+            add(stage2_prompt, "stage2", len(chunk), stage1_tokens)
+            add(prompt_engineer.create_sequential_batch_stage3_prompt(chunk, stage1, stage2),
+                "stage3", len(chunk), stage1_tokens + stage2_tokens)
+    else:
+        for job in job_list:
+            if strategy == "Segmented (2-Call)":
+                add(prompt_engineer.create_options_prompt(job, example_banks), "options", 1)
+                add(prompt_engineer.create_stem_prompt(job, "{}"), "stem", 1, estimate_output_tokens("options", 1))
+            else:
+                add(prompt_engineer.create_holistic_prompt(job, example_banks), "holistic", 1)
+
+    limits = model_limits(model)
+    input_tokens = sum(c[0] for c in calls)
+    output_tokens = sum(c[1] for c in calls)
+    return {
+        "calls": len(calls),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": (input_tokens * limits["input_cost"] + output_tokens * limits["output_cost"]) / 1_000_000
+    }
@@ -0,0 +1,120 @@
+import re
+import pandas as pd
+import output_formatter
+
+# Options the Stage 2 prompts allow ("...[max 3 words]...")
+MAX_OPTION_WORDS = 3
+
+OPTION_FIELDS = ("Correct Answer", "Distractor A", "Distractor B", "Distractor C")
+
+# Function words an answer may share with its stem without giving it away
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have he her his i in is it its my of on or "
+    "our she that the their they this to was we were with you your".split()
+)
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Check name -> (message, decided locally). Items failing a decided check are marked
+# "Requires Revision" without an LLM call; the others are a matter of judgement, so the
+# item still goes to the Stage 3 LLM with the finding attached to its report.
+CHECKS = {
+    "missing_fields": ("Sentence, answer or a distractor is empty", True),
+    "duplicate_options": ("Two or more options are identical", True),
+    "answer_in_distractors": ("The correct answer also appears as a distractor", True),
+    "long_options": (f"An option is longer than {MAX_OPTION_WORDS} words", True),
+    "no_blank": ("The correct answer does not occur as a whole word in the sentence, so no blank can be made", True),
+    "several_blanks": ("The correct answer occurs more than once in the sentence, so the blank is ambiguous", True),
+    "answer_in_stem": ("A word of the correct answer is repeated elsewhere in the stem", False)
+}
+
+
+def _words(text):
+    return [w.strip("'") for w in WORD_PATTERN.findall(text.lower()) if w.strip("'")]
+
+
+def check_items(stage1_items, stage2_items):
+    """
+    Runs every rule in CHECKS over aligned Stage 1 / Stage 2 items at once.
+    Returns a DataFrame with one row per item pair and one boolean column per check
+    (True = the check failed), indexed like the inputs.
+    """
+    frame = pd.DataFrame({
+        "Complete Sentence": [str((s1 or {}).get("Complete Sentence") or "").strip() for s1 in stage1_items],
+        "Correct Answer": [str((s1 or {}).get("Correct Answer") or "").strip() for s1 in stage1_items],
+        "Distractor A": [str((s2 or {}).get("Distractor A") or "").strip() for s2 in stage2_items],
+        "Distractor B": [str((s2 or {}).get("Distractor B") or "").strip() for s2 in stage2_items],
+        "Distractor C": [str((s2 or {}).get("Distractor C") or "").strip() for s2 in stage2_items]
+    })
+    options = frame[list(OPTION_FIELDS)]
+    normalised = options.apply(lambda column: column.str.lower().str.split().str.join(" "))
+
+    results = pd.DataFrame(index=frame.index)
+    results["missing_fields"] = frame.eq("").any(axis=1)
+    results["duplicate_options"] = normalised.nunique(axis=1) < len(OPTION_FIELDS)
+    results["answer_in_distractors"] = (
+        normalised[list(OPTION_FIELDS[1:])].eq(normalised["Correct Answer"], axis=0).any(axis=1)
+        & normalised["Correct Answer"].ne("")
+    )
+    results["long_options"] = options.apply(lambda column: column.str.split().str.len()).gt(MAX_OPTION_WORDS).any(axis=1)
+
+    # The same whole-word blanking as final assembly, so what is checked is what ships
+    answers = frame["Correct Answer"].tolist()
+    blanked = [output_formatter.blank_answer(s, a) for s, a in zip(frame["Complete Sentence"], answers)]
+    blanks = pd.Series([n for _, n in blanked], index=frame.index)
+    results["no_blank"] = blanks.eq(0) & frame["Correct Answer"].ne("")
+    results["several_blanks"] = blanks.gt(1)
+
+    results["answer_in_stem"] = [
+        bool((set(_words(a)) - STOPWORDS) & set(_words(stem))) if n == 1 else False
+        for (stem, n), a in zip(blanked, answers)
+    ]
+    return results[list(CHECKS)]
+
+
+def pre_validate(stage1_items, stage2_items):
+    """
+    Local pre-validation of a batch ahead of the Stage 3 LLM call.
+    Returns one (failures, notes) pair of message lists per item: items with failures
+    are decided locally, items with only notes still need the LLM's judgement.
+    """
+    results = check_items(stage1_items, stage2_items)
+    outcomes = []
+    for row in results.itertuples(index=False):
+        failures, notes = [], []
+        for name, failed in zip(results.columns, row):
+            if failed:
+                message, decided = CHECKS[name]
+                (failures if decided else notes).append(message)
+        outcomes.append((failures, notes))
+    return outcomes
+
+
+def rejection_report(item_number, failures, notes=()):
+    """
+    A Stage 3 validation record for an item rejected by the local checks, shaped like
+    the LLM's reports so the two can be shown and stored together.
+    """
+    return {
+        "Item Number": item_number,
+        "Overall Quality": "Requires Revision",
+        "Sentence Reconstruction Results": "Not run - failed local pre-validation",
+        "Ambiguity Issues": [],
+        "Context Clue Assessment": "",
+        "Assessment Focus Alignment": "",
+        "Other Issues": list(failures) + list(notes),
+        "Cross-Question Issues": [],
+        "Revision Recommendations": "Fix the issues listed under Other Issues and regenerate.",
+        "Validated By": "rules"
+    }
+
+
+def add_notes(validation, notes):
+    """
+    Attaches the local checks' judgement notes to an LLM validation record.
+    """
+    if not notes:
+        return validation
+    validation = dict(validation)
+    other = validation.get("Other Issues") or []
+    validation["Other Issues"] = (other if isinstance(other, list) else [other]) + list(notes)
+    return validation